@@ -0,0 +1,142 @@
+"""
+Cold-start import cost of every registered tool, measured with `python -X importtime`.
+
+    python benchmarks/bench_cold_start.py [--runs 3] [--scale 1.0]
+
+Exits non-zero when a tool goes over its import budget or imports a module it
+must not (e.g. `analyze` pulling in pdf2docx), so CI can use it as a gate.
+tests/test_cold_start.py runs the same checks in the test suite: the imports
+always, the budgets with `pytest --cold-start`.
+"""
+import os
+import io
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ENGINE_DIR, 'main.py')
+sys.path.insert(0, ENGINE_DIR)
+
+from core.registry import TOOLS
+from benchmarks.samples import ensure_samples
+
+# Import-time budgets in ms (best of --runs). Roughly 2x what a dev laptop measures;
+# bump deliberately when a tool genuinely needs a heavier dependency.
+BUDGET_MS = {
+    'test': 60,
+    'analyze': 300,
+    'preview': 300,
+    'merge': 300,
+    'split': 300,
+    'compress': 300,
+    # Trial-encodes images, so numpy and PIL load on top of fitz (~330 ms here, the same
+    # as compress on an image PDF; the compress row above times a text-only one)
+    'estimate': 500,
+    'image-to-pdf': 300,
+    'pdf-to-image': 300,
+    'pdf-to-word': 600,
+    'protect': 400,
+}
+
+LIGHT = ['pdf2docx', 'PIL', 'pypdf', 'PyPDF2']
+FORBIDDEN = {
+    'test': LIGHT + ['fitz', 'pymupdf'],
+    'analyze': LIGHT,
+    'preview': LIGHT,
+}
+
+def _tool_args(tool, samples, tmp):
+    mixed = os.path.join(samples, 'mixed.pdf')
+    text = os.path.join(samples, 'text_only.pdf')
+    out_pdf = os.path.join(tmp, f'{tool}.pdf')
+    if tool == 'test':
+        return []
+    if tool in ('analyze', 'preview', 'estimate'):
+        return ['--inputs', mixed]
+    if tool == 'merge':
+        return ['--inputs', mixed, text, '--output', out_pdf]
+    if tool == 'split':
+        return ['--inputs', mixed, '--output', out_pdf, '--params', json.dumps({"range": "1"})]
+    if tool == 'compress':
+        return ['--inputs', text, '--output', out_pdf]
+    if tool == 'image-to-pdf':
+        from PIL import Image
+        image = os.path.join(tmp, 'page.jpg')
+        Image.new('RGB', (200, 300), 'white').save(image)
+        return ['--inputs', image, '--output', out_pdf]
+    if tool == 'pdf-to-image':
+        out_dir = os.path.join(tmp, 'images')
+        os.makedirs(out_dir, exist_ok=True)
+        return ['--inputs', text, '--output', out_dir, '--params', json.dumps({"dpi": 36, "pages": "1"})]
+    if tool == 'pdf-to-word':
+        return ['--inputs', text, '--output', os.path.join(tmp, 'out.docx'), '--params', json.dumps({"pages": "1"})]
+    if tool == 'protect':
+        return ['--inputs', text, '--output', out_pdf, '--params', json.dumps({"user_password": "x"})]
+    return None
+
+def parse_importtime(stderr):
+    """Total import time (ms) and the set of imported module names from -X importtime output"""
+    total_us = 0
+    modules = set()
+    for line in io.StringIO(stderr):
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        modules.add(name.strip())
+        # Top-level imports have exactly one space before the name; nested ones are indented further
+        if not name[1:].startswith(' '):
+            total_us += int(cumulative)
+    return total_us / 1000.0, modules
+
+def measure(tool, argv, runs):
+    best = None
+    modules = set()
+    # Cache off: a hit answers before the tool's lazy imports, so every run after the first would time nothing
+    env = {**os.environ, 'PDF_ENGINE_CACHE': '0'}
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', MAIN, tool] + argv,
+                              capture_output=True, text=True, env=env)
+        ms, modules = parse_importtime(proc.stderr)
+        best = ms if best is None else min(best, ms)
+    return best, modules
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-tool cold-start import benchmark')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply budgets (slow CI machines)')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="bench_cold_") as tmp:
+        samples = os.path.join(tmp, 'samples')
+        ensure_samples(samples)
+        for tool in TOOLS:
+            argv = _tool_args(tool, samples, tmp)
+            if argv is None:
+                print(f"{tool:<14} (no sample invocation, skipped)")
+                continue
+
+            ms, modules = measure(tool, argv, args.runs)
+            budget = BUDGET_MS.get(tool)
+            limit = budget * args.scale if budget else None
+            status = 'ok'
+            if limit is not None and ms > limit:
+                status = 'OVER BUDGET'
+                failures.append(f"{tool}: {ms:.0f} ms > {limit:.0f} ms")
+            leaked = [m for m in FORBIDDEN.get(tool, []) if m in modules]
+            if leaked:
+                status = 'FORBIDDEN IMPORT'
+                failures.append(f"{tool}: imports {', '.join(leaked)}")
+
+            budget_str = f"{limit:.0f}" if limit is not None else '-'
+            print(f"{tool:<14} {ms:8.1f} ms   budget {budget_str:>6} ms   {status}")
+
+    if failures:
+        print("\nCold-start regressions:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
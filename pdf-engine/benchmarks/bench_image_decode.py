@@ -0,0 +1,116 @@
+"""
+Decode + resize time and output quality of the compressor's image path:
+full decode then LANCZOS (the old path) vs. DCT-scaled JPEG decode (draft())
+then LANCZOS (core/image_cache.py).
+
+    python benchmarks/bench_image_decode.py [--runs 3]
+
+Quality is PSNR / SSIM on luma against a reference made the slow, exact way
+(full decode, single LANCZOS pass with no reducing gap).
+"""
+import io
+import os
+import sys
+import time
+import argparse
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ENGINE_DIR)
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.samples import _photo
+from core.image_cache import ImageCache, SourceImage
+
+# (source size, longest side after resize)
+CASES = [
+    ((6000, 4000), 1600),
+    ((6000, 4000), 800),
+    ((2400, 1600), 1200),
+    ((2400, 1600), 560),
+    ((1800, 1200), 1000),
+]
+
+def _jpeg(size, seed):
+    buf = io.BytesIO()
+    _photo(*size, seed=seed).save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+def old_path(raw, max_d):
+    img = Image.open(io.BytesIO(raw))
+    img.load()
+    img = img.copy()
+    img.thumbnail((max_d, max_d), Image.Resampling.LANCZOS)
+    return img
+
+def new_path(raw, max_d):
+    # What ImageCache._decode + _fitted do, without the cache
+    img = Image.open(io.BytesIO(raw))
+    src = SourceImage(len(raw), img.width, img.height, jpeg=img.format == 'JPEG')
+    scale = ImageCache.scale(src, max_d)
+    if scale > 1:
+        img.draft(img.mode if img.mode in ('L', 'RGB') else None,
+                  (max(1, src.width // scale), max(1, src.height // scale)))
+    img.load()
+    if img.width > max_d or img.height > max_d:
+        img = img.copy()
+        img.thumbnail((max_d, max_d), Image.Resampling.LANCZOS)
+    return img, scale
+
+def reference(raw, size):
+    img = Image.open(io.BytesIO(raw))
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=None)
+
+def _luma(img):
+    return np.asarray(img.convert('L'), dtype=np.float64)
+
+def psnr(a, b):
+    mse = np.mean((_luma(a) - _luma(b)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def _box(x, k):
+    """Mean over k x k windows (valid region) via an integral image"""
+    s = np.pad(x, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (s[k:, k:] - s[:-k, k:] - s[k:, :-k] + s[:-k, :-k]) / (k * k)
+
+def ssim(a, b, k=7):
+    """Mean SSIM on luma with uniform k x k windows (Wang et al. 2004 constants)"""
+    x, y = _luma(a), _luma(b)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = _box(x, k), _box(y, k)
+    vx = _box(x * x, k) - mx * mx
+    vy = _box(y * y, k) - my * my
+    cxy = _box(x * y, k) - mx * my
+    s = ((2 * mx * my + c1) * (2 * cxy + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(s.mean())
+
+def _best(func, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'source':>11} {'target':>6} {'scale':>5}  {'old ms':>7} {'new ms':>7} {'speedup':>7}"
+          f"  {'PSNR old/new':>13}  {'SSIM old/new':>13}")
+    for i, (size, max_d) in enumerate(CASES):
+        raw = _jpeg(size, seed=i)
+        old_ms, old = _best(lambda: old_path(raw, max_d), args.runs)
+        new_ms, (new, scale) = _best(lambda: new_path(raw, max_d), args.runs)
+        ref = reference(raw, old.size)
+        if new.size != old.size:
+            new = new.resize(old.size, Image.Resampling.LANCZOS)
+        print(f"{size[0]:>5}x{size[1]:<5} {max_d:>6} {'1/' + str(scale):>5}  {old_ms:>7.1f} {new_ms:>7.1f} "
+              f"{old_ms / new_ms:>6.2f}x  {psnr(old, ref):>6.2f}/{psnr(new, ref):<6.2f}  "
+              f"{ssim(old, ref):.4f}/{ssim(new, ref):.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Rate-distortion of the compression ladders: output bytes, wall time and
+perceptual quality of every (quality, dpi) point of each strategy, with the
+Pareto-optimal points of each file marked.
+
+    python benchmarks/bench_rate_distortion.py [--corpus DIR] [--strategies engine,legacy] [--runs 1]
+        [--dpi 96] [--save report.json] [--baseline report.json]
+
+Strategies:
+  engine     core/compressor.py TIERS: structural pass, then every image at (q, dpi)
+  rasterize  core/rasterizer.py: every page rendered at (q, dpi)
+  legacy     tools/compress/compress.py LADDER (compress_image_heavy)
+  ghostscript  core/ghostscript.py pdfwrite at the engine's TIERS (only with gs installed)
+
+Quality is SSIM / PSNR on luma (benchmarks/bench_image_decode.py) of every
+page rendered at --dpi, against the same page of the original. A point is on
+the frontier when no other point of its file is as small and as good (SSIM).
+
+With --baseline (a report written by --save) it exits non-zero when a point
+got bigger or slower for the same quality, or worse for the same size, so CI
+can use it as a gate.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ENGINE_DIR)
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from benchmarks.bench_image_decode import psnr, ssim
+from benchmarks.samples import ensure_samples
+from core.compressor import PDFCompressor
+from core.image_cache import ImageCache
+
+STRATEGIES = ('engine', 'rasterize', 'legacy', 'ghostscript')
+DEFAULT_STRATEGIES = ('engine', 'legacy')
+SIZE_TOLERANCE = 0.02   # Share of a baseline point's bytes allowed as noise
+TIME_TOLERANCE = 0.5    # Share of a baseline point's time allowed as noise (timings vary more)
+TIME_SLACK_MS = 50      # ... and never less than this, for points that take a few ms
+SSIM_TOLERANCE = 0.002  # SSIM difference that counts as "the same quality"
+
+# --- strategies: name -> [(setting, run(data, q, dpi, tmp) -> PDF bytes or None)] ---
+
+def _engine(data, q, dpi, tmp):
+    c = PDFCompressor(workers=1)
+    c.images = ImageCache()
+    base, _ = c._structural(data)
+    c.structured = base is not None
+    return c._process(base if base is not None else data, q, dpi)
+
+def _rasterize(data, q, dpi, tmp):
+    from core.rasterizer import PageRasterizer
+    r = PageRasterizer(data)
+    try:
+        return r.render(q, dpi)
+    finally:
+        r.close()
+
+def _legacy(data, q, dpi, tmp):
+    from tools.compress.compress import PDFCompressor as LegacyCompressor
+    in_path, out_path = os.path.join(tmp, 'in.pdf'), os.path.join(tmp, 'out.pdf')
+    with open(in_path, 'wb') as f:
+        f.write(data)
+    LegacyCompressor().compress_image_heavy(in_path, out_path, quality=q, dpi=dpi)
+    with open(out_path, 'rb') as f:
+        return f.read()
+
+def _ghostscript(data, q, dpi, tmp):
+    from core.ghostscript import GhostscriptRun
+    run = GhostscriptRun(data, [(q, dpi)], None).start()
+    results = run.wait()
+    return results[0][2] if results else None
+
+def ladders(names):
+    engine = [(t['name'], t['q'], t['dpi']) for t in PDFCompressor.TIERS]
+    out = {}
+    for name in names:
+        if name == 'engine':
+            out[name] = [(s, q, dpi, _engine) for s, q, dpi in engine]
+        elif name == 'rasterize':
+            out[name] = [(s, q, dpi, _rasterize) for s, q, dpi in engine]
+        elif name == 'legacy':
+            from tools.compress.compress import PDFCompressor as LegacyCompressor
+            out[name] = [(f"q{a['quality']}/{a['dpi']}", a['quality'], a['dpi'], _legacy)
+                         for a in LegacyCompressor.LADDER]
+        elif name == 'ghostscript':
+            from core.ghostscript import find_binary
+            if find_binary() is None:
+                print("ghostscript: gs is not installed, skipped")
+                continue
+            out[name] = [(s, q, dpi, _ghostscript) for s, q, dpi in engine]
+        else:
+            raise SystemExit(f"Unknown strategy {name!r} (use {', '.join(STRATEGIES)})")
+    return out
+
+# --- quality ---
+
+def render(data, dpi):
+    """Every page of data as an RGB image at dpi"""
+    with fitz.open(stream=data, filetype='pdf') as doc:
+        pages = []
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            pages.append(Image.frombytes('RGB', (pix.width, pix.height), pix.samples))
+        return pages
+
+def quality(reference, data, dpi):
+    """(mean SSIM, worst page SSIM, worst page PSNR) of data against the reference renders; None if pages differ"""
+    pages = render(data, dpi)
+    if len(pages) != len(reference):
+        return None
+    scores = []
+    for ref, page in zip(reference, pages):
+        if page.size != ref.size:
+            page = page.resize(ref.size, Image.Resampling.LANCZOS)
+        scores.append((ssim(page, ref), psnr(page, ref)))
+    if not scores:
+        return None
+    return (sum(s for s, _ in scores) / len(scores), min(s for s, _ in scores), min(p for _, p in scores))
+
+# --- measurement ---
+
+def measure(path, strategies, runs, dpi):
+    """One record per (strategy, setting) for the file at path"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    reference = render(data, dpi)
+    records = []
+    with tempfile.TemporaryDirectory(prefix='pdf-bench-rd-') as tmp:
+        for strategy, ladder in strategies.items():
+            for setting, q, dpi_, run in ladder:
+                best, out = None, None
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    try:
+                        out = run(data, q, dpi_, tmp)
+                    except Exception as e:
+                        print(f"  {strategy} {setting}: {e}")
+                        out = None
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                scores = quality(reference, out, dpi) if out else None
+                if scores is None:
+                    print(f"  {strategy} {setting}: no valid output, skipped")
+                    continue
+                records.append({
+                    'file': os.path.basename(path), 'strategy': strategy, 'setting': setting,
+                    'quality': q, 'dpi': dpi_, 'original_bytes': len(data), 'bytes': len(out),
+                    'ms': best * 1000, 'ssim': scores[0], 'ssim_min': scores[1],
+                    'psnr_min': None if scores[2] == float('inf') else scores[2]
+                })
+    return records
+
+def frontier(records):
+    """Mark each record 'pareto' when no other record is as small and as good, one of them strictly"""
+    for r in records:
+        r['pareto'] = not any(
+            o is not r and o['bytes'] <= r['bytes'] and o['ssim'] >= r['ssim']
+            and (o['bytes'] < r['bytes'] or o['ssim'] > r['ssim'])
+            for o in records)
+    return records
+
+def corpus_totals(records):
+    """One point per (strategy, setting) over the whole corpus: total bytes and time, mean SSIM"""
+    groups = {}
+    for r in records:
+        groups.setdefault((r['strategy'], r['setting']), []).append(r)
+    totals = []
+    for (strategy, setting), rs in groups.items():
+        totals.append({'file': '(corpus)', 'strategy': strategy, 'setting': setting,
+                       'quality': rs[0]['quality'], 'dpi': rs[0]['dpi'],
+                       'original_bytes': sum(r['original_bytes'] for r in rs), 'bytes': sum(r['bytes'] for r in rs),
+                       'ms': sum(r['ms'] for r in rs), 'ssim': sum(r['ssim'] for r in rs) / len(rs),
+                       'ssim_min': min(r['ssim_min'] for r in rs),
+                       'psnr_min': min((r['psnr_min'] for r in rs if r['psnr_min'] is not None), default=None)})
+    return frontier(totals)
+
+def report(name, records):
+    print(f"\n{name}")
+    print(f"  {'':1} {'strategy':<11} {'setting':<10} {'KB':>9} {'ratio':>6} {'ms':>8}"
+          f"  {'SSIM':>6} {'min':>6} {'PSNR min':>8}")
+    for r in sorted(records, key=lambda r: (r['bytes'], -r['ssim'])):
+        psnr_min = 'inf' if r['psnr_min'] is None else f"{r['psnr_min']:.2f}"
+        print(f"  {'*' if r['pareto'] else '':1} {r['strategy']:<11} {r['setting']:<10} {r['bytes'] / 1024:>9.1f}"
+              f" {r['bytes'] / r['original_bytes']:>6.3f} {r['ms']:>8.1f}  {r['ssim']:.4f} {r['ssim_min']:.4f}"
+              f" {psnr_min:>8}")
+
+# --- regressions ---
+
+def compare(records, baseline):
+    """Points that got bigger or slower at the same quality, or worse at the same size, than in baseline"""
+    before = {(b['file'], b['strategy'], b['setting']): b for b in baseline}
+    failures = []
+    for r in records:
+        b = before.get((r['file'], r['strategy'], r['setting']))
+        if b is None:
+            continue
+        name = f"{r['file']} {r['strategy']} {r['setting']}"
+        not_better = r['ssim'] <= b['ssim'] + SSIM_TOLERANCE
+        if not_better and r['bytes'] > b['bytes'] * (1 + SIZE_TOLERANCE):
+            failures.append(f"{name}: {b['bytes'] / 1024:.1f} -> {r['bytes'] / 1024:.1f} KB at SSIM {r['ssim']:.4f}")
+        if not_better and r['ms'] > max(b['ms'] * (1 + TIME_TOLERANCE), b['ms'] + TIME_SLACK_MS):
+            failures.append(f"{name}: {b['ms']:.0f} -> {r['ms']:.0f} ms at SSIM {r['ssim']:.4f}")
+        if r['ssim'] < b['ssim'] - SSIM_TOLERANCE and r['bytes'] >= b['bytes'] * (1 - SIZE_TOLERANCE):
+            failures.append(f"{name}: SSIM {b['ssim']:.4f} -> {r['ssim']:.4f} at {r['bytes'] / 1024:.1f} KB")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', help='Directory of PDFs (default: the synthetic samples)')
+    parser.add_argument('--strategies', default=','.join(DEFAULT_STRATEGIES),
+                        help=f"Comma-separated, from {', '.join(STRATEGIES)}")
+    parser.add_argument('--runs', type=int, default=1, help='Best-of runs per point (time only)')
+    parser.add_argument('--dpi', type=int, default=96, help='Render resolution for SSIM / PSNR')
+    parser.add_argument('--save', help='Write the records as JSON')
+    parser.add_argument('--baseline', help='JSON from an earlier --save to check against')
+    args = parser.parse_args()
+
+    os.environ.setdefault('PDF_ENGINE_METRICS', '0')
+    strategies = ladders([s.strip() for s in args.strategies.split(',') if s.strip()])
+    with tempfile.TemporaryDirectory(prefix='pdf-bench-') as samples:
+        if args.corpus:
+            paths = sorted(glob.glob(os.path.join(args.corpus, '*.pdf')))
+        else:
+            paths = ensure_samples(samples)
+        if not paths:
+            raise SystemExit(f"No PDFs in {args.corpus}")
+
+        records = []
+        for path in paths:
+            print(f"{os.path.basename(path)} ...", flush=True)
+            rs = frontier(measure(path, strategies, args.runs, args.dpi))
+            records.extend(rs)
+            report(os.path.basename(path), rs)
+        totals = corpus_totals(records)
+        report(f"corpus ({len(paths)} files)", totals)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'dpi': args.dpi, 'records': records + totals}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('dpi') != args.dpi:
+            raise SystemExit(f"Baseline was rendered at {baseline.get('dpi')} dpi, not {args.dpi}")
+        failures = compare(records + totals, baseline['records'])
+        if failures:
+            print("\nRate-distortion regressions:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
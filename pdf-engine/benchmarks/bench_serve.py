@@ -0,0 +1,90 @@
+"""
+Per-request latency: one `python main.py <tool>` spawn per job vs. `main.py serve`.
+
+    python benchmarks/bench_serve.py [--runs 10]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ENGINE_DIR, 'main.py')
+sys.path.insert(0, ENGINE_DIR)
+
+from benchmarks.samples import ensure_samples
+
+def _jobs(sample_dir, out_dir):
+    mixed = os.path.join(sample_dir, 'mixed.pdf')
+    return [
+        {"tool": "analyze", "inputs": [mixed]},
+        {"tool": "split", "inputs": [mixed], "output": os.path.join(out_dir, 'split.pdf'), "params": {"range": "1-2"}},
+        {"tool": "compress", "inputs": [mixed], "output": os.path.join(out_dir, 'compressed.pdf')},
+    ]
+
+def _argv(job):
+    argv = [sys.executable, MAIN, job['tool'], '--inputs', *job['inputs']]
+    if job.get('output'):
+        argv += ['--output', job['output']]
+    if job.get('params'):
+        argv += ['--params', json.dumps(job['params'])]
+    return argv
+
+def bench_spawn(job, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run(_argv(job), capture_output=True, text=True, check=True).stdout
+        timings.append(time.perf_counter() - start)
+        json.loads(out.strip().splitlines()[-1])
+    return timings
+
+def bench_serve(job, runs, server):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        server.stdin.write(json.dumps(job) + "\n")
+        server.stdin.flush()
+        json.loads(server.stdout.readline())
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def _summary(timings):
+    ms = sorted(t * 1000 for t in timings)
+    p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+    return f"mean {statistics.mean(ms):8.1f} ms   p50 {statistics.median(ms):8.1f} ms   p95 {p95:8.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_serve_") as tmp:
+        samples = os.path.join(tmp, 'samples')
+        ensure_samples(samples)
+        jobs = _jobs(samples, tmp)
+
+        server = subprocess.Popen(
+            [sys.executable, MAIN, 'serve'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        try:
+            # First request absorbs worker warm-up, as it would in production
+            bench_serve({"tool": "test"}, 1, server)
+
+            for job in jobs:
+                spawn = bench_spawn(job, args.runs)
+                served = bench_serve(job, args.runs, server)
+                print(f"{job['tool']:<10} spawn  {_summary(spawn)}")
+                print(f"{'':<10} serve  {_summary(served)}   "
+                      f"({statistics.mean(spawn) / statistics.mean(served):.1f}x)")
+        finally:
+            server.stdin.close()
+            server.wait(timeout=30)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import io
+import os
+import fitz  # PyMuPDF
+from PIL import Image
+
+def _photo(width, height, seed=0):
+    """Noisy gradient that JPEG can't shrink to nothing (stands in for a photo)"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noise = rng.normal(0, 18, (height, width, 3))
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype('uint8'), 'RGB')
+
+def make_sample_pdf(path, pages=4, image_size=(1800, 1200), text=True, images=True, seed=0):
+    """Write a small synthetic PDF with text and one large photo per page"""
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), f"Sample page {i + 1}", fontsize=20)
+            page.insert_textbox(fitz.Rect(72, 100, 520, 300), "Lorem ipsum dolor sit amet. " * 30, fontsize=10)
+        if images:
+            buf = io.BytesIO()
+            _photo(*image_size, seed=seed + i).save(buf, "JPEG", quality=95)
+            page.insert_image(fitz.Rect(72, 320, 520, 620), stream=buf.getvalue())
+    doc.save(path, garbage=4, deflate=True)
+    doc.close()
+    return path
+
+def ensure_samples(directory, names=None):
+    """Create the default benchmark corpus in directory (reused if already there); names picks some of it"""
+    os.makedirs(directory, exist_ok=True)
+    specs = {
+        'text_only.pdf': dict(pages=6, images=False),
+        'mixed.pdf': dict(pages=4),
+        'photos.pdf': dict(pages=8, text=False, image_size=(2400, 1600)),
+    }
+    paths = []
+    for name, spec in specs.items():
+        if names is not None and name not in names:
+            continue
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            make_sample_pdf(path, **spec)
+        paths.append(path)
+    return paths
@@ -1,21 +1,28 @@
 import fitz  # PyMuPDF
 import os
-from PIL import Image
-import io
+
+from core.streams import input_size, open_pdf, read_bytes
 
 class PDFAnalyzer:
+    # Trial encodes for estimated_min_size_kb: enough for the cheapest level of the largest images
+    ESTIMATE_BUDGET_MS = 100
+
     def __init__(self):
         pass
     
-    def analyze(self, pdf_path):
-        """Analyze PDF content and structure"""
-        doc = fitz.open(pdf_path)
+    def analyze(self, pdf_path, estimate=False):
+        """
+        Analyze PDF content and structure. estimated_min_size_kb needs trial
+        encodes (~0.2 s), so it is only filled in with estimate=True.
+        """
+        doc = open_pdf(pdf_path)
         
         total_pages = len(doc)
         total_images = 0
         text_ratio = 0
         image_sizes = []
         is_scanned = True
+        type3_fonts = set()
         
         for page_num in range(total_pages):
             page = doc[page_num]
@@ -25,6 +32,11 @@ class PDFAnalyzer:
             if text.strip():
                 is_scanned = False
             
+            # Type3 (glyphs drawn as content streams) decide the compress backend
+            for font in page.get_fonts():
+                if font[2] == 'Type3':
+                    type3_fonts.add(font[0])
+            
             # Get images
             images = page.get_images()
             total_images += len(images)
@@ -49,10 +61,8 @@ class PDFAnalyzer:
         if total_chars_estimate > 0:
             text_ratio = text_char_count / total_chars_estimate
         
-        # Calculate estimated minimum size
-        min_size_kb = self._calculate_minimum_size(
-            total_pages, total_images, image_sizes, is_scanned
-        )
+        # Smallest size the compress ladder can reach (core/estimator.py)
+        min_size_kb = self._estimate_minimum_size(pdf_path) if estimate else None
         
         return {
             "pages": total_pages,
@@ -61,34 +71,13 @@ class PDFAnalyzer:
             "total_image_size_kb": sum(image_sizes)/1024 if image_sizes else 0,
             "is_scanned": is_scanned,
             "text_ratio": text_ratio,
+            "type3_fonts": len(type3_fonts),
             "estimated_min_size_kb": min_size_kb,
-            "file_size_kb": os.path.getsize(pdf_path) / 1024
+            "file_size_kb": input_size(pdf_path) / 1024
         }
     
-    def _calculate_minimum_size(self, pages, images, image_sizes, is_scanned):
-        """Calculate minimum safe size for this PDF"""
-        # Base PDF structure
-        min_size = 50  # KB
-        
-        # Add for pages
-        min_size += pages * 10
-        
-        # Add for images
-        if images > 0:
-            if image_sizes:
-                # Calculate current average image size
-                avg_image_size = sum(image_sizes) / len(image_sizes) / 1024  # KB
-                # Minimum reasonable image size (compressed JPEG)
-                min_image_size = max(avg_image_size * 0.1, 20)  # 10% of original or 20KB
-                min_size += images * min_image_size
-            else:
-                min_size += images * 50  # 50KB per image if unknown
-        
-        # If scanned PDF (all images), be more conservative
-        if is_scanned:
-            min_size *= 1.5
-        
-        # Add safety margin
-        min_size *= 1.2
-        
-        return min(min_size, 10240)  # Cap at 10MB
+    def _estimate_minimum_size(self, pdf_path):
+        """Predicted output at the most aggressive level, from trial encodes of the largest images (None if it failed)"""
+        from core.estimator import SizeEstimator
+        result = SizeEstimator(budget_ms=self.ESTIMATE_BUDGET_MS).estimate(read_bytes(pdf_path))
+        return result['min_size_kb'] if result['success'] else None
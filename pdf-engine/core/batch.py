@@ -0,0 +1,141 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.registry import get_tool
+from core.progress import ProgressReporter, parse_target
+from core.streams import is_stream
+from core.utils import usable_cpus
+
+def batch_output_paths(spec, inputs, output_dir):
+    """Map each input to its own output inside output_dir (<name>_pdfbaba.<ext>, or a sub-directory)"""
+    paths = []
+    used = set()
+    for path in inputs:
+        stem = os.path.splitext(os.path.basename(path))[0] or 'file'
+        unique = stem
+        n = 1
+        while unique in used:
+            n += 1
+            unique = f"{stem}_{n}"
+        used.add(unique)
+
+        if spec.batch == '/':
+            paths.append(os.path.join(output_dir, unique))
+        else:
+            paths.append(os.path.join(output_dir, f"{unique}_pdfbaba{spec.batch}"))
+    return paths
+
+def _run_one(tool, input_path, output_path, params, options):
+    """Worker side: run a single-file job and time it"""
+    start = time.perf_counter()
+    spec = get_tool(tool)
+    args = argparse.Namespace(tool=tool, inputs=[input_path], output=output_path, params=None, **options)
+    try:
+        if spec.batch == '/':
+            os.makedirs(output_path, exist_ok=True)
+        result = spec.execute(args, params)
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    result['durationMs'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def default_workers(n_inputs):
+    return max(1, min(usable_cpus(), n_inputs))
+
+def run_batch(spec, args, params):
+    """
+    Run spec over every --inputs file, one output per file in the --output
+    directory. Files are spread over a process pool and collected as they
+    finish, so a slow file doesn't hold up the others.
+    """
+    if spec.batch is None:
+        raise Exception(f"Tool {spec.name} does not support --batch")
+    spec.check_args(args)
+    if is_stream(args.output) or any(is_stream(p) for p in args.inputs):
+        raise Exception("--batch works on files, not '-' or fd:N streams")
+
+    output_dir = args.output
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = batch_output_paths(spec, args.inputs, output_dir)
+
+    workers = args.workers or default_workers(len(args.inputs))
+    workers = max(1, min(workers, len(args.inputs)))
+    if workers > 1 and 'image_workers' in params and params['image_workers'] is None:
+        # The files already spread over the cores; one image thread per file
+        params = dict(params, image_workers=1)
+    options = {
+        'debug': args.debug, 'profile': getattr(args, 'profile', False),
+        'progress': getattr(args, 'progress', None), 'job_id': getattr(args, 'job_id', None),
+        'target_size': args.target_size, 'quality': args.quality,
+        'no_cache': getattr(args, 'no_cache', False), 'cache_dir': getattr(args, 'cache_dir', None),
+        'timeout': getattr(args, 'timeout', None), 'mem_limit_mb': getattr(args, 'mem_limit_mb', None),
+        'max_pages': getattr(args, 'max_pages', None), 'max_megapixels': getattr(args, 'max_megapixels', None)
+    }
+
+    # Batch-level file counter; each file's own events come from the workers
+    reporter = None
+    if getattr(args, 'progress', None):
+        reporter = ProgressReporter(parse_target(args.progress), spec.name, getattr(args, 'job_id', None))
+        reporter.phase('batch', total=len(args.inputs), unit='files')
+
+    start = time.perf_counter()
+    by_index = {}
+
+    if workers == 1:
+        for i, (input_path, output_path) in enumerate(zip(args.inputs, outputs)):
+            by_index[i] = _run_one(spec.name, input_path, output_path, params, options)
+            if reporter:
+                reporter.step(len(by_index))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_run_one, spec.name, input_path, output_path, params, options): i
+                for i, (input_path, output_path) in enumerate(zip(args.inputs, outputs))
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    by_index[i] = future.result()
+                except Exception as e:
+                    # Worker process died (e.g. MuPDF segfault); the rest of the batch still reports
+                    by_index[i] = {"status": "error", "message": f"Worker failed: {e}"}
+                if reporter:
+                    reporter.step(len(by_index))
+                if args.debug:
+                    print(f"[batch] {len(by_index)}/{len(futures)} done: {args.inputs[i]}")
+
+    results = []
+    failures = []
+    for i, input_path in enumerate(args.inputs):
+        result = by_index[i]
+        entry = dict(result, input=input_path)
+        if result.get('status') == 'success':
+            entry.setdefault('output', outputs[i])
+            results.append(entry)
+        else:
+            failure = {
+                "input": input_path,
+                "message": result.get('message') or result.get('error') or 'Failed',
+                "durationMs": result.get('durationMs')
+            }
+            if result.get('status') == 'aborted':
+                failure.update(status='aborted', reason=result.get('reason'))
+            failures.append(failure)
+
+    return {
+        "status": "success" if results else "error",
+        "tool": spec.name,
+        "batch": True,
+        "output": output_dir,
+        "results": results,
+        "failures": failures,
+        "stats": {
+            "total": len(args.inputs),
+            "succeeded": len(results),
+            "failed": len(failures),
+            "workers": workers,
+            "durationMs": round((time.perf_counter() - start) * 1000, 1)
+        }
+    }
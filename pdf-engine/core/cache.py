@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+from core.profiler import stage
+from core.utils import FileLock
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'pdf-baba-cache')
+DEFAULT_MAX_MB = 1024
+
+_engine_fingerprint = None
+
+def engine_fingerprint():
+    """Hash of the engine's own source, so a code change never serves stale results"""
+    global _engine_fingerprint
+    if _engine_fingerprint is None:
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(ENGINE_DIR):
+            dirs[:] = sorted(d for d in dirs if d not in ('__pycache__', 'benchmarks'))
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    path = os.path.join(root, name)
+                    digest.update(os.path.relpath(path, ENGINE_DIR).encode())
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+        _engine_fingerprint = digest.hexdigest()
+    return _engine_fingerprint
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    On-disk cache of tool results keyed by SHA-256 of the input bytes, the tool
+    name and the canonicalised params. Each entry is a directory holding
+    result.json plus the output file(s); it is built in a scratch dir and
+    renamed into place, so readers never see half-written entries. Entry mtime
+    is the LRU clock; stats.json keeps a running byte total next to the hit
+    counts, and once a store takes it past max_mb the cache is walked and
+    trimmed back (which also corrects the total).
+    """
+
+    def __init__(self, cache_dir=None, max_mb=None, debug=False):
+        self.cache_dir = cache_dir or os.environ.get('PDF_ENGINE_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.max_bytes = int(float(max_mb or os.environ.get('PDF_ENGINE_CACHE_MAX_MB') or DEFAULT_MAX_MB) * 1024 * 1024)
+        self.debug = debug
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.scratch_dir = os.path.join(self.cache_dir, 'tmp')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self.lock_path = os.path.join(self.cache_dir, 'lock')
+        self.stats_path = os.path.join(self.cache_dir, 'stats.json')
+
+    # --- keys ---
+
+    def make_key(self, spec, args, params):
+        key_parts = {
+            'engine': engine_fingerprint(),
+            'tool': spec.name,
+            'params': params,
+            'target_size': getattr(args, 'target_size', None),
+            'quality': getattr(args, 'quality', None),
+            'inputs': [file_digest(p) for p in args.inputs or []],
+        }
+        # Merged TOC entries are named after the files, so the names matter there
+        if spec.name == 'merge' and params.get('toc'):
+            key_parts['names'] = [os.path.basename(p) for p in args.inputs]
+        canonical = json.dumps(key_parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    # --- counters ---
+
+    def _bump(self, field):
+        with FileLock(self.lock_path):
+            counts = self._read_counts()
+            counts[field] = counts.get(field, 0) + 1
+            self._write_counts(counts)
+        return counts
+
+    def _add_bytes(self, size):
+        """Add a stored entry to the recorded total; None if there is none yet (evict() sets it)"""
+        with FileLock(self.lock_path):
+            counts = self._read_counts()
+            if 'bytes' not in counts:
+                return None
+            counts['bytes'] += size
+            self._write_counts(counts)
+        return counts['bytes']
+
+    def _write_counts(self, counts):
+        """Replace stats.json; callers hold the lock"""
+        tmp = self.stats_path + f".{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump(counts, f)
+        os.replace(tmp, self.stats_path)
+
+    def _read_counts(self):
+        try:
+            with open(self.stats_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    # --- lookup / store ---
+
+    def lookup(self, key, args):
+        """Restore a cached result into args.output; None on miss"""
+        entry = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry, 'result.json')) as f:
+                stored = json.load(f)
+            result = self._restore(entry, stored, args)
+            os.utime(entry)  # LRU touch
+        except (OSError, ValueError, KeyError):
+            return None
+        return result
+
+    def _restore(self, entry, stored, args):
+        from core.streams import atomic
+        result = stored['result']
+        if stored.get('output_file'):
+            # Copied next to the output and renamed, so a crash never leaves a truncated file there
+            with atomic(args.output) as partial:
+                shutil.copyfile(os.path.join(entry, stored['output_file']), partial)
+            result['output'] = args.output
+        if stored.get('files') is not None:
+            os.makedirs(args.output, exist_ok=True)
+            # Files are named after the input (<stem>_page-1_pdfbaba.jpg); rename for this upload
+            old_stem = stored.get('stem', '')
+            new_stem = os.path.splitext(os.path.basename(args.inputs[0]))[0]
+            restored = []
+            for name in stored['files']:
+                new_name = new_stem + name[len(old_stem):] if old_stem and name.startswith(old_stem) else name
+                target = os.path.join(args.output, new_name)
+                with atomic(target) as partial:
+                    shutil.copyfile(os.path.join(entry, 'files', name), partial)
+                restored.append(target)
+            result['files'] = restored
+        return result
+
+    def store(self, key, args, result):
+        """Copy the outputs of a successful run into the cache"""
+        entry = self._entry_dir(key)
+        if os.path.exists(entry):
+            return
+        scratch = tempfile.mkdtemp(prefix='entry_', dir=self.scratch_dir)
+        try:
+            stored = {'result': dict(result), 'created': time.time()}
+            output = args.output
+            if result.get('files'):
+                os.makedirs(os.path.join(scratch, 'files'))
+                names = []
+                for path in result['files']:
+                    name = os.path.basename(path)
+                    shutil.copyfile(path, os.path.join(scratch, 'files', name))
+                    names.append(name)
+                stored['files'] = names
+                stored['stem'] = os.path.splitext(os.path.basename(args.inputs[0]))[0]
+            elif output and os.path.isfile(output):
+                stored['output_file'] = 'output' + os.path.splitext(output)[1]
+                shutil.copyfile(output, os.path.join(scratch, stored['output_file']))
+
+            with open(os.path.join(scratch, 'result.json'), 'w') as f:
+                json.dump(stored, f)
+            size = self._size(scratch)
+
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                os.rename(scratch, entry)
+                scratch = None
+            except OSError:
+                return  # Another process stored the same key first
+        finally:
+            if scratch:
+                shutil.rmtree(scratch, ignore_errors=True)
+        total = self._add_bytes(size)
+        if total is None or total > self.max_bytes:
+            self.evict()
+
+    @staticmethod
+    def _size(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes; resets the recorded total"""
+        with FileLock(self.lock_path):
+            entries = []
+            total = 0
+            for shard in os.listdir(self.objects_dir):
+                shard_dir = os.path.join(self.objects_dir, shard)
+                for key in os.listdir(shard_dir):
+                    path = os.path.join(shard_dir, key)
+                    try:
+                        size = self._size(path)
+                        entries.append((os.path.getmtime(path), size, path))
+                    except OSError:
+                        continue
+                    total += size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                # Rename first so a concurrent reader sees the entry vanish at once
+                doomed = tempfile.mkdtemp(prefix='evict_', dir=self.scratch_dir)
+                try:
+                    os.rename(path, os.path.join(doomed, 'entry'))
+                except OSError:
+                    pass
+                shutil.rmtree(doomed, ignore_errors=True)
+                total -= size
+                if self.debug:
+                    print(f"[cache] evicted {os.path.basename(path)}")
+            counts = self._read_counts()
+            counts['bytes'] = total
+            self._write_counts(counts)
+
+    def run(self, spec, args, params, func):
+        """Run func(args, params) through the cache and report hit/miss in result['stats']['cache']"""
+        try:
+            with stage('cache.key'):
+                key = self.make_key(spec, args, params)
+        except OSError:
+            # Unreadable input: let the tool report it the way it normally does
+            return func(args, params)
+        with stage('cache.lookup'):
+            result = self.lookup(key, args)
+        hit = result is not None
+        if not hit:
+            result = func(args, params)
+        counts = self._bump('hits' if hit else 'misses')
+        if not hit and (result.get('status') == 'success' or result.get('success') is True):
+            try:
+                with stage('cache.store'):
+                    self.store(key, args, result)
+            except OSError as e:
+                if self.debug:
+                    print(f"[cache] store failed: {e}")
+        result.setdefault('stats', {})['cache'] = {
+            'hit': hit,
+            'hits': counts.get('hits', 0),
+            'misses': counts.get('misses', 0)
+        }
+        return result
+
+def cache_enabled(args):
+    if getattr(args, 'no_cache', False):
+        return False
+    # Entries are keyed on and restored to files; piped jobs run uncached
+    from core.streams import is_stream
+    if is_stream(getattr(args, 'output', None)) or any(is_stream(p) for p in getattr(args, 'inputs', None) or []):
+        return False
+    return os.environ.get('PDF_ENGINE_CACHE', '1').lower() not in ('0', 'off', 'false', 'no')
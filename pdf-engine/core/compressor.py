@@ -1,25 +1,131 @@
 
-import fitz  # PyMuPDF
-from PIL import Image
-import io
 import os
-import shutil
-import tempfile
+import math
+import hashlib
+import multiprocessing
+from multiprocessing.connection import wait
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+
+from core import ghostscript, governor, profiler, progress, rasterizer
+from core.image_cache import ImageCache
+from core.profiler import stage
+from core.rasterizer import PageRasterizer
+from core.scratch import Scratch
+from core.streams import read_bytes, write_output
+from core.utils import usable_cpus
+
+# Lossless stream filters of 8-bit images: the class codecs (JPEG, G4, packed palette) can still shrink those
+GENERIC_FILTERS = ('', 'FlateDecode', 'LZWDecode', 'RunLengthDecode')
+
+class PlacedImage:
+    """An image xref of the input: pixel size, stream filter and bits, and where it is drawn largest"""
+
+    def __init__(self, width, height, filter_name, bpc=8):
+        self.width = width
+        self.height = height
+        self.filter = filter_name
+        self.bpc = bpc
+        self.raw_size = None   # Stream bytes as stored
+        self.placement = None  # (x, y) extent in points of the largest placement
+
+    def place(self, x_pt, y_pt):
+        if self.placement is None or x_pt * y_pt > self.placement[0] * self.placement[1]:
+            self.placement = (x_pt, y_pt)
 
 class PDFCompressor:
-    def __init__(self, debug=False):
+    # Descent: Lossless-ish -> High -> Medium -> Low.
+    # The search moves along this ladder continuously: level 0.0 is Best,
+    # 1.0 is Aggressive and the named tiers sit evenly in between.
+    TIERS = (
+        {'q': 95, 'dpi': 300, 'name': 'Best'},     # Very gentle
+        {'q': 85, 'dpi': 200, 'name': 'High'},     # Gentle
+        {'q': 75, 'dpi': 150, 'name': 'Medium'},   # Standard
+        {'q': 60, 'dpi': 120, 'name': 'Strong'},   # Strong
+        {'q': 45, 'dpi': 90,  'name': 'Aggressive'},
+    )
+    # JPEG bytes relative to q95 at the same pixel count (libjpeg, photographic content).
+    # Only the shape matters: the size model is rescaled by every real save.
+    QUALITY_BYTES = ((35, 0.07), (45, 0.10), (50, 0.12), (60, 0.155), (70, 0.21),
+                     (75, 0.25), (80, 0.32), (85, 0.43), (90, 0.61), (95, 1.0))
+    MAX_SAVES = 4       # Full document rewrites per search (+1 at Aggressive if nothing fit)
+    TARGET_FILL = 0.9   # A result this close under the target is good enough
+    TARGET_AIM = 0.97   # The model aims a little under the target so the next save fits
+    SMALL_IMAGES = 0.05 # The smallest images, together up to this share of the image bytes, are left alone
+    IMAGE_SHARE = 0.1   # Image tiers only run if images are at least this share of the structurally compressed file
+    ALLOC_STEPS = 50    # Per-image levels are multiples of 1/ALLOC_STEPS, so passes reuse each other's encodes
+    ALLOC_SKEW = 0.5    # How strongly the byte budget is taken from the images that can give up the most
+
+    def __init__(self, debug=False, workers=None, concurrent_tiers=False, backend='auto',
+                 strategy='auto', raster_dpi=None, color_mode='auto'):
         self.debug = debug
-        self.temp_dir = tempfile.mkdtemp(prefix="pdf_simple_")
+        # Threads for image decode/resize/encode (1 = serial; output is the same either way),
+        # or tier processes with concurrent_tiers
+        self.workers = workers or int(os.environ.get('PDF_ENGINE_IMAGE_WORKERS') or usable_cpus())
+        # Opt-in: race the named tiers in worker processes instead of searching (see _race)
+        self.concurrent_tiers = concurrent_tiers
+        # auto / mupdf / ghostscript / race (see core/ghostscript.py choose())
+        self.backend = backend
+        # auto / images / rasterize, and the rasterize options (see core/rasterizer.py)
+        self.strategy = strategy
+        self.raster_dpi = raster_dpi   # Fixed render dpi (the search then only moves the quality)
+        self.color_mode = color_mode   # auto / color / gray / bilevel
+        self.images = None  # ImageCache for the job in progress
+        self.pool = None    # ThreadPoolExecutor for the job in progress (None when serial)
+        self.scratch = None # Scratch holding the job's candidate outputs
+        self.attempts = []  # [{'quality', 'dpi', 'sizeKB'}] of the last compress_data() call ('backend' on gs runs)
+        # Image index of the job's input, built by the first pass (see _index_images)
+        self.image_pages = None   # xref -> page numbers using it
+        self.image_info = {}      # xref -> PlacedImage
+        self.duplicates = {}      # xref -> lower xref with a byte-identical image
+        self.redirects = []       # (xref holding the XObject dict, key path of the entry, duplicate xref)
+        self.untouched = set()    # Small images no pass re-encodes (SMALL_IMAGES)
+        self.tier_stats = {}      # _image_stats() of the raced tiers' workers (the parent builds no index)
+        # Byte budget allocation, from the first measured pass (see _measure / _levels)
+        self.curves = None        # Predicted bytes per image (row) at each allocation step (column)
+        self.curve_xrefs = []     # xref of each row
+        self.structured = False   # The passes start from _structural's output
 
     def compress(self, input_path, output_path, target_size_kb=None, quality='medium', analysis=None):
+        """File wrapper around compress_data(): read input_path, write the result to output_path"""
+        try:
+            with stage('read'):
+                data = read_bytes(input_path)
+            result = self.compress_data(data, target_size_kb, quality, analysis)
+            if result['success']:
+                with stage('write') as rec:
+                    written = write_output(output_path, result.pop('data'))
+                    rec.add_bytes(written)
+                progress.written(nbytes=written)
+            return result
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def compress_data(self, data, target_size_kb=None, quality='medium', analysis=None):
         """
         SIMPLE LOGIC:
         - Goal: Compress to 50% of original size (or user target).
-        - Method: Try decreasing quality until goal is met.
+        - Method: Search the quality ladder for the gentlest setting that meets the goal.
         - Fix: Start with VERY high quality to avoid over-compression.
+        - Structure first: a lossless pass runs once; images are only touched
+          if that misses the goal and they hold IMAGE_SHARE of the bytes.
+        - Engine: Ghostscript instead of the MuPDF path when analysis
+          (PDFAnalyzer output) says so, or racing it with backend='race';
+          stats name the 'backend'.
+        Works on PDF bytes so the pipeline tool can chain it without files;
+        the result carries the chosen bytes under 'data'.
         """
+        self.images = ImageCache()
+        self.scratch = Scratch()
+        self.attempts = []
+        self.image_pages, self.image_info, self.duplicates, self.redirects = None, {}, {}, []
+        self.untouched, self.curves, self.curve_xrefs = set(), None, []
+        self.tier_stats = {}
+        self.structured = False
+        gs = None
         try:
-            original_size_kb = os.path.getsize(input_path) / 1024
+            original_size_kb = len(data) / 1024
             
             # --- 1. DETERMINE GOAL (Strict 50%) ---
             if target_size_kb is not None and target_size_kb > 0:
@@ -34,88 +140,850 @@ class PDFCompressor:
 
             # Shortcut
             if original_size_kb <= target:
-                 shutil.copy2(input_path, output_path)
-                 return {'success': True, 'compressed_size_kb': original_size_kb}
-
-            # --- 2. LOOP UNTIL DONE ---
-            # Descent: Lossless-ish -> High -> Medium -> Low
-            steps = [
-                {'q': 95, 'dpi': 300, 'name': 'Best'},     # Very gentle (New Tier)
-                {'q': 85, 'dpi': 200, 'name': 'High'},     # Gentle
-                {'q': 75, 'dpi': 150, 'name': 'Medium'},   # Standard
-                {'q': 60, 'dpi': 120, 'name': 'Strong'},   # Strong
-                {'q': 45, 'dpi': 90,  'name': 'Aggressive'},
-            ]
-
-            best_file = None
-            best_difference = float('inf') # Find closest to target without going over? 
-            # Actually, we just want the *First* one that is <= target.
-            # Because the list is ordered by Quality (Desc), the first success is the Best Quality Success.
-
-            for step in steps:
-                temp_out = os.path.join(self.temp_dir, f"temp_{step['name']}.pdf")
-                
-                # Run safe compression
-                self._process(input_path, temp_out, step['q'], step['dpi'])
-                
-                if os.path.exists(temp_out):
-                    current_size = os.path.getsize(temp_out) / 1024
-                    
-                    # Track result
-                    # Stop if goal met
-                    if current_size <= target:
-                        shutil.copy2(temp_out, output_path)
-                        return {'success': True, 'compressed_size_kb': current_size}
-                    
-                    # If we haven't met target yet, keep this result as a fallback (it's the smallest so far)
-                    # Wait, no. The LOOP goes from High Size -> Low Size.
-                    # So the LAST result will be the smallest. 
-                    best_file = temp_out
-                    best_size = current_size
-
-            # If we tried everything and failed to hit 50%, return the smallest (last) one
-            if best_file:
-                shutil.copy2(best_file, output_path)
-                return {'success': True, 'compressed_size_kb': best_size}
-
-            # Default
-            shutil.copy2(input_path, output_path)
-            return {'success': True, 'compressed_size_kb': original_size_kb}
+                 return {'success': True, 'data': data, 'compressed_size_kb': original_size_kb, 'tier': 'Original',
+                         'backend': 'mupdf'}
+
+            # --- 2. ENGINE ---
+            backend = ghostscript.choose(analysis, self.backend)
+            if backend != 'mupdf':
+                gs = ghostscript.GhostscriptRun(data, self._gs_settings(), target).start()
+            if backend == 'ghostscript':
+                result = self._gs_result(gs, data, target)
+                if result is not None:
+                    return result
+                # gs failed: the MuPDF path is the fallback
+
+            # Racing gs: leave it a core
+            workers = self.workers - 1 if backend == 'race' else self.workers
+            if workers > 1 and not self.concurrent_tiers:
+                self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image')
+            result = self._compress_mupdf(data, target, analysis)
+            if backend == 'race':
+                if result.get('success') and result['compressed_size_kb'] <= target:
+                    gs.cancel()  # MuPDF met the target: only what gs has already finished can still win
+                result = self._pick(result, self._gs_result(gs, data, target), target)
+            return result
 
         except Exception as e:
             return {'success': False, 'error': str(e)}
+        finally:
+            if gs is not None:
+                gs.cancel()
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+            self.scratch.close()
+            self.images = self.pool = self.scratch = None
+
+    def _compress_mupdf(self, data, target, analysis=None):
+        """The structural pass, then the image ladder if still needed; a compress_data() result"""
+        original_size_kb = len(data) / 1024
+        with fitz.open(stream=data, filetype='pdf') as doc:
+            strategy = rasterizer.choose(analysis, doc, self.strategy)
+
+        # --- STRUCTURE (lossless, once) ---
+        progress.phase('structure')
+        with stage('compress.structure'):
+            structural, image_bytes = self._structural(data)
+        if structural is not None and len(structural) < len(data):
+            data = structural
+            self.structured = True
+        size_kb = len(data) / 1024
+        self.attempts.append({'quality': None, 'dpi': None, 'sizeKB': round(size_kb, 2)})
+        if size_kb <= target or image_bytes < self.IMAGE_SHARE * len(data):
+            # Met without touching a pixel, or too few image bytes for the tiers to matter
+            tier = 'Structural' if data is structural else 'Original'
+            return {'success': True, 'data': data, 'compressed_size_kb': size_kb, 'tier': tier,
+                    'attempts': self.attempts, 'backend': 'mupdf', 'strategy': strategy}
+
+        # --- SEARCH THE LADDER (or race its tiers; scans render their pages instead) ---
+        if strategy == 'rasterize':
+            best = self._rasterize(data, target)
+            if best is not None:
+                level, size_kb, out = best
+                q, dpi = self._raster_settings(level)
+                return {'success': True, 'data': out, 'compressed_size_kb': size_kb,
+                        'tier': self._tier_name(level), 'quality': q, 'dpi': dpi,
+                        'attempts': self.attempts, 'backend': 'mupdf', 'strategy': strategy}
+        else:
+            best = self._race(data, target) if self.concurrent_tiers else self._search(data, target)
+            if best is not None:
+                pressure, size_kb, out = best
+                level = self._headline(pressure)
+                q, dpi = self._settings(level)
+                return {'success': True, 'data': out, 'compressed_size_kb': size_kb,
+                        'tier': self._tier_name(level), 'quality': q, 'dpi': dpi,
+                        'attempts': self.attempts, 'backend': 'mupdf', 'strategy': strategy,
+                        **self._image_stats()}
+
+        # Default
+        return {'success': True, 'data': data, 'compressed_size_kb': len(data) / 1024 if self.structured else original_size_kb,
+                'tier': 'Structural' if self.structured else 'Original', 'attempts': self.attempts,
+                'backend': 'mupdf', 'strategy': strategy}
+
+    # --- ghostscript ---
+
+    def _gs_settings(self):
+        """(q, dpi) gs tries, gentlest first: Best, Medium, Aggressive"""
+        return [(t['q'], t['dpi']) for t in (self.TIERS[0], self.TIERS[len(self.TIERS) // 2], self.TIERS[-1])]
+
+    def _gs_result(self, gs, data, target):
+        """
+        Wait for gs and turn its best valid output - the gentlest that fits,
+        else the smallest - into a compress_data() result (None if none is valid).
+        Validity is checked here, on this thread: the output must open and
+        have the input's page count.
+        """
+        with stage('compress.ghostscript'):
+            results = gs.wait()
+        names = {(t['q'], t['dpi']): t['name'] for t in self.TIERS}
+        for q, dpi, out in results:
+            self.attempts.append({'quality': q, 'dpi': dpi, 'sizeKB': round(len(out) / 1024, 2), 'backend': 'ghostscript'})
+        if self.debug and gs.errors:
+            print(f"[DEBUG] Ghostscript: {'; '.join(gs.errors)}")
+
+        fitting = [r for r in results if len(r[2]) / 1024 <= target]
+        rest = sorted((r for r in results if r not in fitting), key=lambda r: len(r[2]))
+        pages = None
+        for q, dpi, out in fitting[:1] + rest + fitting[1:]:
+            try:
+                if pages is None:
+                    with fitz.open(stream=data, filetype='pdf') as doc:
+                        pages = len(doc)
+                with fitz.open(stream=out, filetype='pdf') as doc:
+                    if out[:5] != b'%PDF-' or len(doc) != pages:
+                        continue
+            except Exception:
+                continue
+            return {'success': True, 'data': out, 'compressed_size_kb': len(out) / 1024,
+                    'tier': names[(q, dpi)], 'quality': q, 'dpi': dpi,
+                    'attempts': self.attempts, 'backend': 'ghostscript'}
+        return None
+
+    @staticmethod
+    def _pick(mupdf, gs, target):
+        """Of the two backends' results, one that fits the target over one that doesn't, then the smaller"""
+        if gs is None or not mupdf.get('success'):
+            return gs or mupdf
+        return min((mupdf, gs), key=lambda r: (r['compressed_size_kb'] > target, r['compressed_size_kb']))
+
+    # --- search ---
+
+    def _search(self, data, target):
+        """
+        Gentlest byte budget whose output fits target, usually in 2-3 full
+        saves (MAX_SAVES at most, plus a last one at Aggressive if none fit).
+        The search runs over a pressure between 0.0 (every image at Best) and
+        1.0 (every image at its smallest); _levels turns a pressure into a
+        ladder level per image, so big images give up bytes first.
+        The first pass runs at Best; if that is too big, its encodes give a
+        size curve per image, and each next pressure is where the model
+        (corrected by the real saves) meets the target, kept inside the
+        bracket of pressures already known to be too big / to fit.
+        Returns (pressure, size_kb, bytes) of the best pass, or None if every pass failed.
+        """
+        results = {}         # pressure -> (size_kb, scratch key)
+        too_big = None       # Highest pressure known to be over the target
+        fits = None          # Lowest pressure known to fit
+        model = None
+        pressure = 0.0
+
+        while pressure is not None:
+            governor.check()
+            level = self._headline(pressure)
+            progress.tier(self._tier_name(level), len(results) + 1, self.MAX_SAVES)
+            q, dpi = self._settings(level)
+            levels = self._levels(pressure)
+            with stage(f"compress.tier.{self._tier_name(level)}"):
+                out = self._process(data, q, dpi, levels)
+            size = self._keep(results, pressure, out, target)
+            out = None
+            self.attempts.append({'quality': q, 'dpi': dpi, 'sizeKB': round(size, 2) if size is not None else None})
+            if self.debug:
+                print(f"[DEBUG] Pressure {pressure:.3f} (largest image q{q}, {dpi} dpi): {size} KB")
+
+            if size is not None and size <= target:
+                fits = pressure if fits is None else min(fits, pressure)
+                if size >= target * self.TARGET_FILL or pressure == 0.0:
+                    break
+            else:
+                too_big = pressure if too_big is None else max(too_big, pressure)
+            if size is not None and model is None:
+                model = self._measure(levels or self._levels(pressure), size)
 
-    def _process(self, input_p, output_p, q, dpi):
-        """Safe image resizing/compression"""
+            pressure = self._next_level(model, results, too_big, fits, target)
+
+        best = self._best(results, target)
+        if best is None:
+            return None
+        size, key = results[best]
+        return (best, size, self.scratch.get(key))
+
+    def _rasterize(self, data, target):
+        """
+        The search for scans (core/rasterizer.py): every pass renders each
+        page at a ladder level and rebuilds the document around the renders.
+        There are no per-image curves here; the size model scales the first
+        pass by pixel count (dpi squared) and JPEG quality, and the real
+        passes correct it like in _search. raster_dpi pins the dpi.
+        Returns (level, size_kb, bytes) like _search.
+        """
+        results = {}
+        too_big = fits = model = None
+        level = 0.0
+        pages = PageRasterizer(data, self.workers, self.color_mode)
         try:
-            doc = fitz.open(input_p)
-            for page in doc:
-                for img in page.get_images():
-                    xref = img[0]
-                    if img[1] > 0: continue
+            while level is not None:
+                governor.check()
+                progress.tier(self._tier_name(level), len(results) + 1, self.MAX_SAVES)
+                q, dpi = self._raster_settings(level)
+                with stage('compress.rasterize'):
+                    try:
+                        out = pages.render(q, dpi, fixed_dpi=self.raster_dpi is not None)
+                    except governor.JobAborted:
+                        raise
+                    except Exception as e:
+                        if self.debug:
+                            print(f"[DEBUG] Rasterize failed: {e}")
+                        out = None
+                size = self._keep(results, level, out, target)
+                out = None
+                self.attempts.append({'quality': q, 'dpi': dpi, 'sizeKB': round(size, 2) if size is not None else None})
+                if self.debug:
+                    print(f"[DEBUG] Rasterized at q{q}, {dpi} dpi: {size} KB")
+
+                if size is not None and size <= target:
+                    fits = level if fits is None else min(fits, level)
+                    if size >= target * self.TARGET_FILL or level == 0.0:
+                        break
+                else:
+                    too_big = level if too_big is None else max(too_big, level)
+                if size is not None and model is None:
+                    model = self._raster_model(level, size)
+
+                level = self._next_level(model, results, too_big, fits, target)
+        finally:
+            pages.close()
+
+        best = self._best(results, target)
+        if best is None:
+            return None
+        size, key = results[best]
+        return (best, size, self.scratch.get(key))
+
+    def _raster_settings(self, level):
+        """(quality, dpi) of a rasterize pass: the ladder's, with raster_dpi pinning the dpi"""
+        q, dpi = self._settings(level)
+        return q, self.raster_dpi or dpi
+
+    def _raster_model(self, at, size):
+        """Predicted size of a rasterize pass at a level, from one measured at another"""
+        q0, dpi0 = self._raster_settings(at)
+
+        def predict(level):
+            q, dpi = self._raster_settings(level)
+            return size * (dpi / dpi0) ** 2 * self._quality_bytes(q) / self._quality_bytes(q0)
+        return predict
+
+    def _race(self, data, target):
+        """
+        Latency mode: run the named tiers at once in worker processes (up to
+        one per core). The gentlest tier that fits wins as soon as every
+        gentler tier has finished too big or failed; the rest are killed.
+        Uses spare cores instead of the search's 2-3 sequential saves, at the
+        coarser granularity of the tiers. Returns (level, size_kb, bytes) like _search.
+        """
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        levels = [i / (len(self.TIERS) - 1) for i in range(len(self.TIERS))]
+        slots = max(1, min(self.workers, len(levels)))
+        results = {}   # tier index -> (size_kb, scratch key); size None if the pass failed
+        running = {}   # connection -> (tier index, process)
+        queued = list(range(len(levels)))
+        progress.phase('tiers', total=len(levels), unit='tiers')
+
+        def winner():
+            for i in range(len(levels)):
+                if i not in results:
+                    return None
+                size = results[i][0]
+                if size is not None and size <= target:
+                    return i
+            return None
+
+        try:
+            while queued or running:
+                governor.check()
+                while queued and len(running) < slots:
+                    i = queued.pop(0)
+                    q, dpi = self._settings(levels[i])
+                    parent_conn, child_conn = ctx.Pipe(duplex=False)
+                    proc = ctx.Process(target=_tier_worker, args=(child_conn, data, q, dpi), daemon=True)
+                    proc.start()
+                    child_conn.close()
+                    running[parent_conn] = (i, proc)
+
+                for conn in wait(list(running), timeout=0.1):
+                    i, proc = running.pop(conn)
+                    try:
+                        stats = conn.recv()
+                        out = conn.recv_bytes() or None
+                    except (EOFError, OSError):
+                        stats, out = {}, None  # Worker died
+                    for name, value in stats.items():
+                        # Every worker indexes the same input: any that got that far has the counts
+                        self.tier_stats[name] = max(self.tier_stats.get(name, 0), value)
+                    conn.close()
+                    proc.join()
+                    size = self._keep(results, i, out, target)
+                    out = None
+                    q, dpi = self._settings(levels[i])
+                    self.attempts.append({'quality': q, 'dpi': dpi, 'sizeKB': round(size, 2) if size is not None else None})
+                    progress.step(len(results))
+                    if self.debug:
+                        print(f"[DEBUG] Tier {self.TIERS[i]['name']} (q{q}, {dpi} dpi): {size} KB")
+
+                if winner() is not None:
+                    break
+        finally:
+            # Early cancel: whatever is still running can't beat the winner
+            for conn, (i, proc) in running.items():
+                proc.kill()
+                proc.join()
+                conn.close()
+
+        best = self._best(results, target)
+        if best is None:
+            return None
+        size, key = results[best]
+        return (levels[best], size, self.scratch.get(key))
+
+    # --- candidates ---
+
+    @staticmethod
+    def _best(results, target):
+        """
+        Key of the result to return: the gentlest (lowest key) that fits, or
+        if nothing fits the smallest output, the closest we got. None if every pass failed.
+        """
+        fitting = [k for k, (size, _) in results.items() if size is not None and size <= target]
+        if fitting:
+            return min(fitting)
+        done = [(size, k) for k, (size, _) in results.items() if size is not None]
+        return min(done)[1] if done else None
+
+    def _keep(self, results, key, out, target):
+        """
+        Record a pass (out is None if it failed) and hold its bytes in scratch;
+        outputs that can no longer be returned are dropped straight away, so
+        only the current best is held between passes. Returns the size in KB.
+        """
+        size = len(out) / 1024 if out is not None else None
+        results[key] = (size, self.scratch.put(out) if out is not None else None)
+        best = self._best(results, target)
+        for k, (s, handle) in list(results.items()):
+            if handle is not None and k != best:
+                self.scratch.drop(handle)
+                results[k] = (s, None)
+        return size
+
+    def _next_level(self, model, results, too_big, fits, target):
+        lower = too_big if too_big is not None else 0.0
+        upper = fits if fits is not None else 1.0
+        if len(results) >= self.MAX_SAVES:
+            # Out of saves and nothing fits: finish with the smallest setting
+            return 1.0 if fits is None and 1.0 not in results else None
+        if upper - lower < 0.02:
+            return None
+        if model is None:
+            level = (lower + upper) / 2
+        else:
+            # Correct the model by its error at the real saves (interpolated
+            # between them), then bisect it for the level that meets the target.
+            # Each further save aims a little lower so a near miss isn't repeated.
+            errors = sorted((l, size / max(model(l), 1e-6))
+                            for l, (size, _) in results.items() if size is not None)
+
+            def corrected(at):
+                below = [e for e in errors if e[0] <= at] or errors[:1]
+                above = [e for e in errors if e[0] >= at] or errors[-1:]
+                (la, ea), (lb, eb) = below[-1], above[0]
+                error = ea if lb == la else ea + (eb - ea) * (at - la) / (lb - la)
+                return model(at) * error
+
+            goal = target * self.TARGET_AIM ** len(results)
+            lo, hi = lower, upper
+            if corrected(hi) > goal:
+                level = hi
+            else:
+                for _ in range(30):
+                    mid = (lo + hi) / 2
+                    if corrected(mid) > goal:
+                        lo = mid
+                    else:
+                        hi = mid
+                level = hi
+            # Stay strictly inside the bracket
+            if not lower < level < upper and not (fits is None and level == upper):
+                level = (lower + upper) / 2
+            # Quantized allocations can put the answer a hair above the pressure just tried
+            level = max(level, lower + 0.001)
+        level = round(level, 3)
+        return None if level in results else level
+
+    def _measure(self, levels, size_kb):
+        """
+        Size curve of every image from a finished pass (levels: xref -> the
+        level it ran at): each image scales with its fitted pixel count and
+        the JPEG quality curve (palette / bilevel encodes only with the pixel
+        count), evaluated at each of the ALLOC_STEPS levels. A JPEG the pass
+        left alone (_skips) is taken to be a q95 encode of its pixels, any
+        other image left alone a lossless one.
+        Everything else in the file stays as it was. Sets self.curves and
+        returns the size model: KB as a function of pressure.
+        """
+        import numpy as np  # Lazy: only jobs that reach the allocation need it
+        grid = np.linspace(0.0, 1.0, self.ALLOC_STEPS + 1)
+        xrefs, rows = [], []
+        image_bytes = 0
+        for xref, info in self.image_info.items():
+            if xref in self.duplicates or xref in self.untouched or xref not in levels:
+                continue
+            q0, dpi0 = self._settings(levels[xref])
+            d0 = self._target_dim(xref, dpi0)
+            encoded = self.images.cached(xref, d0, q0)
+            if encoded is not None:
+                src = self.images.source(xref)
+                used = encoded.size if self._replaces(src, encoded.size, d0) else src.raw_size
+                # Palette / bilevel encodes don't get smaller with the quality
+                quality = None if encoded.lossless else q0
+                per_unit = encoded.size / (self._fit_area(src, d0) * self._quality_bytes(quality))
+            elif self._skips(xref, d0) and info.raw_size:
+                src = info
+                used = info.raw_size
+                quality = 95 if info.filter == 'DCTDecode' else None
+                per_unit = info.raw_size / (self._fit_area(info, d0) * self._quality_bytes(quality))
+            else:
+                continue
+            image_bytes += used
+            row = []
+            for at in grid:
+                q, dpi = self._settings(at)
+                max_d = self._target_dim(xref, dpi)
+                if self._skips(xref, max_d):
+                    row.append(src.raw_size)
+                    continue
+                est = per_unit * self._fit_area(src, max_d) * self._quality_bytes(None if quality is None else q)
+                row.append(est if self._replaces(src, est, max_d) else src.raw_size)
+            xrefs.append(xref)
+            rows.append(row)
+        other = max(size_kb * 1024 - image_bytes, 0)
+        self.curve_xrefs = xrefs
+        self.curves = np.array(rows, dtype=np.float64).reshape(len(rows), len(grid))
+
+        def predict(pressure):
+            steps = self._steps(pressure)
+            return (other + self.curves[np.arange(len(steps)), steps].sum()) / 1024
+        return predict
+
+    def _steps(self, pressure):
+        """
+        Allocation step of each curve row at a pressure. An image's level is
+        pressure ** (1 / share), share being the bytes it can give up (Best
+        minus smallest) relative to the image that can give up the most,
+        raised to ALLOC_SKEW: the biggest saver follows the pressure, one
+        with a quarter of its savings is at 0.25 when that is at 0.5, and an
+        icon barely moves before the pressure reaches 1.0, where every image
+        is at its smallest. Predicted size only falls as pressure rises.
+        """
+        import numpy as np
+        if not len(self.curves):
+            return np.zeros(0, dtype=int)
+        if pressure >= 1.0:
+            return np.full(len(self.curves), self.ALLOC_STEPS)
+        savings = self.curves[:, 0] - self.curves.min(axis=1)
+        share = (savings / max(savings.max(), 1.0)) ** self.ALLOC_SKEW
+        levels = np.where(share > 0, pressure ** (1.0 / np.maximum(share, 1e-12)), 0.0)
+        return np.rint(levels * self.ALLOC_STEPS).astype(int)
+
+    def _levels(self, pressure):
+        """
+        xref -> ladder level at a pressure: the allocation once the image
+        curves are measured, before that the pressure itself for every image.
+        None before the first pass has indexed the images.
+        """
+        if self.image_pages is None:
+            return None
+        if self.curves is not None and len(self.curve_xrefs):
+            steps = self._steps(pressure)
+            levels = {xref: int(step) / self.ALLOC_STEPS for xref, step in zip(self.curve_xrefs, steps)}
+        else:
+            levels = {}
+        for xref in self.image_pages:
+            if xref not in self.duplicates and xref not in self.untouched:
+                levels.setdefault(xref, pressure)
+        return levels
+
+    def _headline(self, pressure):
+        """Level reported for a pressure: the one the largest image got"""
+        if self.curves is None or not len(self.curve_xrefs):
+            return pressure
+        largest = int(self.curves[:, 0].argmax())
+        return int(self._steps(pressure)[largest]) / self.ALLOC_STEPS
+
+    # --- ladder ---
+
+    def _settings(self, level):
+        """(quality, dpi) at a level between 0.0 (Best) and 1.0 (Aggressive)"""
+        pos = min(max(level, 0.0), 1.0) * (len(self.TIERS) - 1)
+        i = min(int(pos), len(self.TIERS) - 2)
+        frac = pos - i
+        a, b = self.TIERS[i], self.TIERS[i + 1]
+        return (int(round(a['q'] + (b['q'] - a['q']) * frac)),
+                int(round(a['dpi'] + (b['dpi'] - a['dpi']) * frac)))
+
+    def _tier_name(self, level):
+        """Name of the ladder tier closest to level"""
+        return self.TIERS[int(round(min(max(level, 0.0), 1.0) * (len(self.TIERS) - 1)))]['name']
+
+    def _quality_bytes(self, q):
+        """JPEG size factor of quality q (1.0 for None: a lossless encode)"""
+        if q is None:
+            return 1.0
+        table = self.QUALITY_BYTES
+        if q <= table[0][0]:
+            return table[0][1]
+        for (qa, ba), (qb, bb) in zip(table, table[1:]):
+            if q <= qb:
+                return ba + (bb - ba) * (q - qa) / (qb - qa)
+        return table[-1][1]
+
+    @staticmethod
+    def _max_dim(dpi):
+        return int((dpi / 72.0) * 800)
+
+    def _target_dim(self, xref, dpi):
+        """
+        Longest side in pixels xref needs to show at dpi where it is drawn
+        largest (its own size if it is already at or under dpi there). Images
+        that weren't found on a page fall back to the page-sized cap.
+        """
+        info = self.image_info.get(xref)
+        if info is None or info.placement is None:
+            return self._max_dim(dpi)
+        x_pt, y_pt = info.placement
+        # Keep the axis that needs the most pixels so nothing is cut below dpi
+        scale = min(1.0, max(x_pt * dpi / 72.0 / info.width, y_pt * dpi / 72.0 / info.height))
+        return max(1, int(math.ceil(max(info.width, info.height) * scale)))
+
+    def _skips(self, xref, max_d):
+        """
+        Not over the target DPI: left as is without decoding. Re-encoding a
+        JPEG, JPX, CCITT or JBIG2 stream or packed low-bit pixels would only
+        stack generation loss for little gain; 8-bit pixels stored with a
+        generic lossless filter (GENERIC_FILTERS) are the exception, as the
+        codec of their class can still shrink them.
+        """
+        info = self.image_info.get(xref)
+        if info is None or max(info.width, info.height) > max_d:
+            return False
+        return not (info.bpc == 8 and info.filter in GENERIC_FILTERS)
+
+    @staticmethod
+    def _fit_area(src, max_d):
+        scale = min(1.0, max_d / src.width, max_d / src.height)
+        return max(src.width * scale, 1) * max(src.height * scale, 1)
+
+    @staticmethod
+    def _replaces(src, new_size, max_d):
+        # Always keep smaller to ensure monotonic decrease if possible,
+        # EXCEPT if we really resized it down, then we trust the resize.
+        return new_size < src.raw_size or max(src.width, src.height) > max_d
+
+    def _process(self, data, q, dpi, levels=None):
+        """
+        Safe image resizing/compression at q / dpi, or per image at the
+        ladder level levels gives it; returns the new PDF bytes (None if it failed)
+        """
+        try:
+            with stage('open'):
+                doc = fitz.open(stream=data, filetype='pdf')
+            governor.check_pages(len(doc))
+            if self.image_pages is None:
+                self._index_images(doc)
+
+            # Point references to a duplicate at its twin; the copy is dropped at save
+            for holder, key, xref in self.redirects:
+                doc.xref_set_key(holder, key, f"{self.duplicates[xref]} 0 R")
+            settings = {xref: self._settings(levels[xref]) if levels and xref in levels else (q, dpi)
+                        for xref in self.image_pages if xref not in self.duplicates and xref not in self.untouched}
+            # Pixel cap per image from its effective DPI
+            targets = {xref: self._target_dim(xref, settings[xref][1]) for xref in settings}
+            unique = [xref for xref, max_d in targets.items() if not self._skips(xref, max_d)]
+
+            # Decode/resize/encode on the pool; each xref once per job, whichever tier asks first
+            keys = [(xref, targets[xref], settings[xref][0]) for xref in unique]
+            progress.phase('images', total=len(keys), unit='images')
+            self.images.prepare(doc, keys, self.pool, on_done=self._image_done)
+
+            # Replace each image once (every page using the xref sees it), in a fixed order
+            replaced = 0
+            for xref in unique:
+                max_d = targets[xref]
+                src = self.images.source(xref)
+                encoded = self.images.cached(xref, max_d, settings[xref][0])
+                if src is None or encoded is None:
+                    continue
+                if self._replaces(src, encoded.size, max_d):
                     try:
-                        base = doc.extract_image(xref)
-                        pil_img = Image.open(io.BytesIO(base["image"]))
-                        if pil_img.mode in ['P', 'RGBA', 'CMYK']: pil_img = pil_img.convert('RGB')
-                        
-                        max_d = int((dpi / 72.0) * 800)
-                        w, h = pil_img.size
-                        
-                        buf = io.BytesIO()
-                        # Resize if needed
-                        if w > max_d or h > max_d:
-                            pil_img.thumbnail((max_d, max_d), Image.Resampling.LANCZOS)
-                        
-                        pil_img.save(buf, "JPEG", quality=q, optimize=True)
-                        new_bytes = buf.getvalue()
-                        
-                        # Apply change
-                        # Note: In aggressive mode we might replace even if larger? 
-                        # No, always keep smaller to ensure monotonic decrease if possible. 
-                        # EXCEPT if we really resized it down, then we trust the resize.
-                        if len(new_bytes) < len(base["image"]) or (w > max_d):
-                            page.replace_image(xref, stream=new_bytes)
-                    except: pass
-            doc.save(output_p, garbage=4, deflate=True, clean=True)
+                        with stage('image.replace'):
+                            self._write_image(doc, xref, encoded)
+                        replaced += 1
+                    except Exception:
+                        pass
+            if not replaced and not self.redirects and self.structured:
+                # Saving again with the options _structural used would give the same file
+                doc.close()
+                return data
+            progress.phase('save')
+            with stage('save') as rec:
+                out = doc.tobytes(garbage=4, deflate=True, clean=True, use_objstms=1)
+                rec.add_bytes(len(out))
+            doc.close()
+            return out
+        except governor.JobAborted:
+            raise
+        except Exception:
+            return None
+
+    def _structural(self, data):
+        """
+        Lossless pass run once before any image tier: fonts subset to the
+        glyphs used, page thumbnails, XMP metadata and PieceInfo (private
+        editor data) dropped, then a save that removes unused objects, merges
+        duplicates (repeated font programs included), cleans the content
+        streams and packs objects into compressed object streams.
+        Returns (PDF bytes or None if it failed, bytes of image streams).
+        """
+        try:
+            with stage('open'):
+                doc = fitz.open(stream=data, filetype='pdf')
+            governor.check_pages(len(doc))
+            images = self._strip(doc)
+            image_bytes = sum(self._stream_length(doc, xref) for xref in images)
+            progress.phase('save')
+            with stage('save') as rec:
+                out = doc.tobytes(garbage=4, deflate=True, clean=True, use_objstms=1)
+                rec.add_bytes(len(out))
             doc.close()
-        except: pass
+            return out, image_bytes
+        except governor.JobAborted:
+            raise
+        except Exception:
+            return None, 0
+
+    @staticmethod
+    def _strip(doc):
+        """The lossless edits of _structural on an open document; returns the image xrefs its pages draw"""
+        # A form field may need any glyph once it is edited
+        if not doc.is_form_pdf:
+            with stage('structure.fonts'):
+                try:
+                    doc.subset_fonts()
+                except Exception:
+                    pass
+        images = set()
+        with stage('structure.strip'):
+            doc.del_xml_metadata()
+            doc.xref_set_key(doc.pdf_catalog(), 'PieceInfo', 'null')
+            for page in doc:
+                governor.check()
+                for key in ('Thumb', 'PieceInfo'):
+                    doc.xref_set_key(page.xref, key, 'null')
+                images.update(img[0] for img in page.get_images())
+        return images
+
+    @staticmethod
+    def _stream_length(doc, xref):
+        """Stored stream size of xref, from /Length when it is a plain number"""
+        kind, value = doc.xref_get_key(xref, 'Length')
+        if kind == 'int':
+            return int(value)
+        try:
+            return len(doc.xref_stream_raw(xref))
+        except Exception:
+            return 0
+
+    @staticmethod
+    def _write_image(doc, xref, encoded):
+        """
+        Swap the stream of image xref for an EncodedImage in place. Every
+        other key stays, so an SMask (alpha) keeps applying to the new pixels.
+        """
+        doc.update_stream(xref, encoded.data, compress=False)
+        for key, value in encoded.keys():
+            doc.xref_set_key(xref, key, value)
+
+    @staticmethod
+    def _rewritable(doc, xref, smask):
+        """
+        Whether the pixels of xref can be re-encoded on their own: not a
+        stencil or colour-key mask, no /Decode remapping, no alpha inside a
+        JPX stream, and no premultiplied (/Matte) soft mask that would have
+        to be resized along with it.
+        """
+        for key in ('ImageMask', 'Mask', 'Decode', 'SMaskInData'):
+            kind, value = doc.xref_get_key(xref, key)
+            if kind != 'null' and value not in ('false', '0'):
+                return False
+        return smask <= 0 or doc.xref_get_key(smask, 'Matte')[0] == 'null'
+
+    def _index_images(self, doc):
+        """
+        Build the job's image index from the first pass's document. Every pass
+        opens the same input bytes, so xrefs hold for the whole job.
+        image_pages lists each image xref once with the pages using it (a logo
+        on 200 pages is one entry); image_info has its size and largest
+        placement (_placements), for the effective DPI. Images whose dictionary and stream are
+        byte-identical are mapped to the lowest such xref; a duplicate is only
+        merged if every reference to it is a resource entry that can be repointed.
+        Images with a soft mask are in (their SMask is kept as is); masks and
+        images whose pixels can't be re-encoded on their own are left out.
+        """
+        pages = {}
+        info = {}
+        refs = {}
+        fixed = set()   # Images that are left exactly as they are (_rewritable)
+        for page in doc:
+            governor.check()
+            extents = None
+            for img in page.get_images(full=True):
+                xref, smask, width, height, name, referencer = img[0], img[1], img[2], img[3], img[7], img[9]
+                if xref in fixed:
+                    continue
+                if xref not in info and not self._rewritable(doc, xref, smask):
+                    fixed.add(xref)
+                    continue
+                governor.check_pixels(width, height)
+                if xref not in info:
+                    info[xref] = PlacedImage(width, height, img[8], img[4])
+                if page.number not in pages.setdefault(xref, []):
+                    pages[xref].append(page.number)
+                    if extents is None:
+                        with stage('image.placement'):
+                            extents = self._placements(page)
+                    for extent in extents.get((width, height), []):
+                        info[xref].place(*extent)
+                refs.setdefault(xref, set()).add((referencer or page.xref, name))
+
+        first = {}
+        duplicates = {}
+        redirects = []
+        with stage('image.hash'):
+            for xref in sorted(pages):
+                try:
+                    raw = doc.xref_stream_raw(xref)
+                    digest = hashlib.sha256(doc.xref_object(xref, compressed=True).encode() + raw).digest()
+                except Exception:
+                    continue
+                info[xref].raw_size = len(raw)
+                twin = first.setdefault(digest, xref)
+                if twin == xref:
+                    continue
+                entries = sorted({self._xobject_entry(doc, referencer, name) for referencer, name in refs[xref]})
+                if all(doc.xref_get_key(holder, key) == ('xref', f"{xref} 0 R") for holder, key in entries):
+                    duplicates[xref] = twin
+                    redirects += [(holder, key, xref) for holder, key in entries]
+                    pages[twin] = sorted(set(pages[twin] + pages[xref]))
+                    if info[xref].placement:
+                        info[twin].place(*info[xref].placement)
+
+        self.image_pages = pages
+        self.image_info = info
+        self.duplicates = duplicates
+        self.redirects = redirects
+        self.untouched = self._small_images()
+
+    @staticmethod
+    def _xobject_entry(doc, referencer, name):
+        """
+        (xref, key path) of resource name in the XObject dictionary of
+        referencer. /Resources and /XObject may be indirect (often shared by
+        pages): xref_set_key can't write through a reference, so the path
+        starts at the object that holds the entry.
+        """
+        xref, path = referencer, ''
+        for key in ('Resources', 'XObject'):
+            kind, value = doc.xref_get_key(xref, path + key)
+            if kind == 'xref':
+                xref, path = int(value.split()[0]), ''
+            else:
+                path += key + '/'
+        return xref, path + name
+
+    @staticmethod
+    def _placements(page):
+        """
+        (width, height) in pixels -> (x, y) extents in points of every image
+        drawn on page. get_image_rects / get_image_info(xrefs=True) decode
+        every image to tell xrefs apart; matching by pixel size doesn't, and
+        where two images share a size each gets the larger placement.
+        """
+        extents = {}
+        try:
+            for item in page.get_image_info():
+                m = fitz.Matrix(item['transform'])
+                # Lengths of the image's x and y axes on the page (rotation-safe)
+                extents.setdefault((item['width'], item['height']), []).append(
+                    (math.hypot(m.a, m.b), math.hypot(m.c, m.d)))
+        except Exception:
+            pass
+        return extents
+
+    def _small_images(self):
+        """
+        The smallest images that together hold at most SMALL_IMAGES of the
+        image bytes: icons and logos that can't move the output size, so no
+        pass spends a decode or risks their quality.
+        """
+        sizes = sorted((self.image_info[xref].raw_size or 0, xref)
+                       for xref in self.image_pages if xref not in self.duplicates)
+        budget = self.SMALL_IMAGES * sum(size for size, _ in sizes)
+        small = set()
+        total = 0
+        for size, xref in sizes:
+            total += size
+            if total > budget:
+                break
+            small.add(xref)
+        return small
+
+    def _image_stats(self):
+        if self.image_pages is None and self.tier_stats:
+            return dict(self.tier_stats)  # Raced tiers: the index was built in the workers
+        pages = self.image_pages or {}
+        return {
+            'unique_images': len(pages) - len(self.duplicates),
+            'duplicate_images': len(self.duplicates),
+            'shared_image_refs': sum(len(p) - 1 for x, p in pages.items() if x not in self.duplicates),
+            'untouched_images': len(self.untouched)
+        }
+
+    @staticmethod
+    def _image_done(done):
+        governor.check()
+        progress.step(done)
+
+def _tier_worker(conn, data, q, dpi):
+    """Process side of _race(): one tier pass; its image counts, then the PDF bytes (empty if it failed), sent back"""
+    # Reporting and profiling belong to the parent; a forked copy would write into the same stream
+    progress.detach()
+    profiler.detach()
+    compressor = PDFCompressor(workers=1)
+    compressor.images = ImageCache()
+    try:
+        out = compressor._process(data, q, dpi)
+    except governor.JobAborted:
+        out = None  # The parent's own checks abort the job
+    conn.send(compressor._image_stats())
+    conn.send_bytes(out or b'')
+    conn.close()
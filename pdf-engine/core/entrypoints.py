@@ -0,0 +1,302 @@
+"""
+Tool entry points for main.py / serve mode. Each function takes the parsed CLI
+args plus the schema-resolved params and returns the result dict that gets
+printed as JSON. Heavy libraries are imported inside the functions so a tool
+only loads what it uses.
+"""
+from core.profiler import stage
+
+def run_test(args, params):
+    return {"status": "ok", "message": "Engine is ready"}
+
+def run_stats(args, params):
+    import time
+    from core.metrics import MetricsStore, summarize, render_prometheus
+
+    window = params['window_minutes'] * 60 if params['window_minutes'] else None
+    store = MetricsStore()
+    records = store.read(since=time.time() - window if window else None)
+    summary = summarize(records, window_seconds=window)
+    totals = store.totals()
+    if params['format'] == 'json':
+        return {"status": "success", "tool": "stats", "stats": {**summary, 'totals': totals}}
+    if params['format'] != 'prometheus':
+        raise Exception(f"Unknown stats format: {params['format']}")
+    # Printed as-is by main.py (see "text" there)
+    return {"status": "success", "tool": "stats", "text": render_prometheus(summary, totals)}
+
+def run_preview(args, params):
+    from tools.merge.preview import PDFPreviewGenerator
+    generator = PDFPreviewGenerator()
+    return generator.generate_thumbnail(args.inputs[0], page_num=params['page'], width=params['width'])
+
+def run_analyze(args, params):
+    try:
+        from core.streams import open_pdf
+        with stage('open'):
+            doc = open_pdf(args.inputs[0])
+        count = len(doc)
+        doc.close()
+        return {
+            "status": "success",
+            "tool": "analyze",
+            "stats": {
+                "totalPages": count
+            }
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def run_merge(args, params):
+    from tools.merge.merger import AdvancedPDFMerger
+
+    merger = AdvancedPDFMerger(debug=args.debug)
+    result = merger.merge_with_properties(
+        file_paths=args.inputs,
+        output_path=args.output,
+        order=params['order'],
+        properties=params
+    )
+
+    if result['success']:
+        return {
+            "status": "success",
+            "tool": "merge",
+            "output": args.output,
+            "stats": {
+                "filesMerged": result['files_merged'],
+                "totalPages": result['total_pages'],
+                "outputSizeKB": result['output_size_kb']
+            }
+        }
+    return {"status": "error", "message": result.get('error')}
+
+def run_split(args, params):
+    from tools.split.splitter import PDFSplitter
+
+    splitter = PDFSplitter(debug=args.debug)
+    result = splitter.split_by_range(
+        input_path=args.inputs[0],
+        output_path=args.output,
+        range_str=params['range'],
+        properties=params
+    )
+
+    if result['success']:
+        return {
+            "status": "success",
+            "tool": "split",
+            "output": args.output,
+            "stats": {
+                "totalPages": result['total_pages'],
+                "outputSizeKB": result['output_size_kb']
+            }
+        }
+    return {"status": "error", "message": result.get('error')}
+
+def run_compress(args, params):
+    from core.compressor import PDFCompressor
+    from core.analyzer import PDFAnalyzer
+
+    # CLI flags take precedence over --params
+    target_kb = args.target_size if args.target_size else params['target_size_kb']
+    quality = args.quality if args.quality else params['quality']
+
+    compressor = PDFCompressor(debug=args.debug, workers=params['image_workers'],
+                               concurrent_tiers=params['concurrent_tiers'], backend=params['backend'],
+                               strategy=params['strategy'], raster_dpi=params['raster_dpi'],
+                               color_mode=params['color_mode'])
+
+    # Analyze PDF (Optional, just pass None if simple mode)
+    analysis = None
+    try:
+        analyzer = PDFAnalyzer()
+        with stage('analyze'):
+            analysis = analyzer.analyze(args.inputs[0])
+    except:
+        pass # Don't let analysis fail the whole process
+
+    # Validate target is reasonable if set
+    if target_kb and target_kb > 0:
+        min_safe_kb = 50 # Hardcoded safe limit for CLI validation
+        if target_kb < min_safe_kb:
+            target_kb = min_safe_kb
+
+    if args.debug:
+         print(f"[DEBUG] CLI Target: {target_kb}")
+
+    result = compressor.compress(
+        input_path=args.inputs[0],
+        output_path=args.output,
+        target_size_kb=target_kb,
+        quality=quality,
+        analysis=analysis
+    )
+
+    if result['success']:
+        # Return JSON as expected by API
+        return {
+            "status": "success",
+            "tool": "compress",
+            "output": args.output,
+            "stats": {
+                "originalSize": result.get('original_size_kb'),
+                "compressedSize": result.get('compressed_size_kb'),
+                "reduction": result.get('reduction_percent'),
+                "tier": result.get('tier'),
+                "backend": result.get('backend'),
+                "strategy": result.get('strategy'),
+                "quality": result.get('quality'),
+                "dpi": result.get('dpi'),
+                "attempts": result.get('attempts'),
+                "uniqueImages": result.get('unique_images'),
+                "duplicateImages": result.get('duplicate_images'),
+                "sharedImageRefs": result.get('shared_image_refs'),
+                "untouchedImages": result.get('untouched_images'),
+                "totalPages": analysis['pages'] if analysis else None
+            }
+        }
+    return {
+        "status": "error",
+        "message": result.get('error', 'Compression failed')
+    }
+
+def run_estimate(args, params):
+    from core.estimator import SizeEstimator
+    from core.streams import read_bytes
+
+    try:
+        with stage('read'):
+            data = read_bytes(args.inputs[0])
+        result = SizeEstimator(budget_ms=params['budget_ms']).estimate(data)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    if not result['success']:
+        return {"status": "error", "message": result.get('error', 'Estimate failed')}
+    return {
+        "status": "success",
+        "tool": "estimate",
+        "stats": {
+            "originalSize": round(result['original_size_kb'], 2),
+            "structuralSize": round(result['structural_size_kb'], 2),
+            "minimumSize": round(result['min_size_kb'], 2),
+            "levels": [{'tier': l['tier'], 'quality': l['quality'], 'dpi': l['dpi'], 'sizeKB': round(l['size_kb'], 2)}
+                       for l in result['levels']],
+            "images": result['images'],
+            "sampledImages": result['sampled_images'],
+            "sampledShare": round(result['sampled_share'], 3),
+            "elapsedMs": round(result['elapsed_ms'], 1)
+        }
+    }
+
+def run_pipeline(args, params):
+    from core.registry import get_tool
+    from tools.pipeline.pipeline import PDFPipeline
+
+    def resolve(op, options):
+        # Steps take the same params as the standalone tools, with the same defaults
+        spec = get_tool('image-to-pdf' if op == 'imageToPdf' else op)
+        return spec.resolve_params(options) if spec else options
+
+    pipeline = PDFPipeline(debug=args.debug)
+    result = pipeline.run(args.inputs, args.output, params['steps'], resolve=resolve)
+
+    if result['success']:
+        return {
+            "status": "success",
+            "tool": "pipeline",
+            "output": args.output,
+            "stats": {
+                "totalPages": result['total_pages'],
+                "outputSizeKB": result['output_size_kb'],
+                "steps": result['steps']
+            }
+        }
+    return {"status": "error", "message": result.get('error', "Pipeline failed")}
+
+def run_image_to_pdf(args, params):
+    from tools.convert.image_to_pdf import ImageToPdfConverter
+
+    converter = ImageToPdfConverter(debug=args.debug)
+    result = converter.convert(
+        image_paths=args.inputs,
+        output_path=args.output,
+        params=params
+    )
+
+    if result['success']:
+        return {
+            "status": "success",
+            "tool": "image-to-pdf",
+            "output": args.output,
+            "stats": {
+                "totalPages": len(params['pages'] or args.inputs), # Approx
+                "outputSizeKB": result['output_size_kb']
+            }
+        }
+    return {"status": "error", "message": "Conversion failed"}
+
+def run_pdf_to_image(args, params):
+    from tools.convert.pdf_to_image import convert_pdf_to_images
+
+    result = convert_pdf_to_images(
+        input_path=args.inputs[0],
+        output_dir=args.output,
+        fmt=params['format'],
+        dpi=params['dpi'],
+        color_mode=params['color'],
+        page_range=params['pages']
+    )
+
+    if result['success']:
+        return {
+            "status": "success",
+            "tool": "pdf-to-image",
+            "files": result['files'],
+            "stats": {
+                "totalConverted": result['total_converted']
+            }
+        }
+    return {"status": "error", "message": result.get('error', "Conversion failed")}
+
+def run_pdf_to_word(args, params):
+    from tools.convert.pdf_to_word import convert_pdf_to_word
+
+    with stage('convert', args.output):
+        result = convert_pdf_to_word(
+            input_path=args.inputs[0],
+            output_path=args.output,
+            pages=params['pages']
+        )
+
+    if result['success']:
+        return {
+            "status": "success",
+            "tool": "pdf-to-word",
+            "output": args.output
+        }
+    return {"status": "error", "message": result.get('error', "Conversion failed")}
+
+def run_protect(args, params):
+    if not params['user_password']:
+        raise Exception("User password is required")
+
+    from tools.security.protector import PDFProtector
+
+    protector = PDFProtector(debug=args.debug)
+    result = protector.protect(
+        input_path=args.inputs[0],
+        output_path=args.output,
+        user_password=params['user_password'],
+        owner_password=params['owner_password'],
+        permissions=params['permissions'],
+        encryption_level=params['encryption']
+    )
+
+    if result['success']:
+        return {
+            "status": "success",
+            "tool": "protect",
+            "output": args.output
+        }
+    return {"status": "error", "message": result.get('error', "Protection failed")}
@@ -0,0 +1,238 @@
+import math
+import time
+import hashlib
+
+import fitz  # PyMuPDF
+
+from core import governor
+from core.compressor import PDFCompressor, PlacedImage
+from core.image_cache import ImageCache
+from core.profiler import stage
+
+DEFAULT_BUDGET_MS = 300   # Time for trial encodes; the rest of an estimate is a few tens of ms
+SAMPLE_LEVELS = (1.0, 0.5, 0.0)  # Trial points, cheapest decode first
+Q95_BYTES_PER_PIXEL = 0.35       # Photographic q95 JPEG, for when no image could be sampled
+DEFAULT_SLOPE = 0.5              # Unit ~ (share of pixels kept) ** slope, until two trials of one image say otherwise
+MAX_SLOPE = 1.0
+EXTRAPOLATE = 0.5                # Share of the slope kept past the largest trial
+
+class SizeEstimator:
+    """
+    Predicted compress output per ladder level without running the ladder.
+
+    The structural floor is exact: the document with every image stream
+    emptied goes through the structural pass's lossless edits and save.
+    Images are added on top, each at its size at the level: left alone
+    (duplicates drop out, masks and the smallest images stay as they are,
+    images already under the level's dpi are skipped, see the compressor's
+    _skips), or re-encoded. The largest images are trial-encoded through
+    the compressor's ImageCache at a few levels until the time budget is
+    spent, and sized by bytes per fitted pixel (interpolated between the
+    trial levels); the others use the sampled images' average.
+
+    The image index skips get_image_rects (which decodes every image to
+    match it to its xref): placements come from get_image_info and are
+    matched to xrefs by pixel size, taking the largest when sizes collide.
+    """
+
+    def __init__(self, budget_ms=None):
+        self.budget = (budget_ms if budget_ms is not None else DEFAULT_BUDGET_MS) / 1000.0
+        # Settings, fitting and size rules are the compressor's, so the two agree
+        self.compressor = PDFCompressor(workers=1)
+        self.images = ImageCache()
+        self.raw = {}        # xref -> stored bytes of every image drawn, masks included
+        self.trials = {}     # sampled xref -> {share of its pixels kept: bytes per fitted pixel and quality unit}
+        self.lossless = set()  # Sampled xrefs whose class encodes losslessly (no quality factor)
+
+    def estimate(self, data):
+        try:
+            start = time.perf_counter()
+            with stage('open'):
+                doc = fitz.open(stream=data, filetype='pdf')
+            governor.check_pages(len(doc))
+            with stage('estimate.index'):
+                self._index(doc)
+            candidates = self._candidates()
+            with stage('estimate.sample'):
+                self._sample(doc, candidates, start + self.budget)
+            with stage('estimate.floor'):
+                floor = self._floor(doc)
+            doc.close()
+
+            c = self.compressor
+            kept = sum(size for xref, size in self.raw.items() if xref not in c.duplicates)
+            levels = []
+            for i, tier in enumerate(c.TIERS):
+                level = i / (len(c.TIERS) - 1)
+                q, dpi = c._settings(level)
+                images = kept + sum(self._predict(xref, level) - self.raw[xref] for xref in candidates)
+                levels.append({'tier': tier['name'], 'level': level, 'quality': q, 'dpi': dpi,
+                               'size_kb': (floor + images) / 1024})
+            structural = (floor + kept) / 1024
+            candidate_bytes = sum(self.raw[xref] for xref in candidates)
+            return {
+                'success': True,
+                'original_size_kb': len(data) / 1024,
+                'structural_size_kb': structural,
+                'min_size_kb': min([structural] + [l['size_kb'] for l in levels]),
+                'levels': levels,
+                'images': len(self.raw) - len(c.duplicates),
+                'sampled_images': len(self.trials),
+                'sampled_share': (sum(self.raw[x] for x in self.trials) / candidate_bytes) if candidate_bytes else 1.0,
+                'elapsed_ms': (time.perf_counter() - start) * 1000
+            }
+        except governor.JobAborted:
+            raise
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    # --- index ---
+
+    def _index(self, doc):
+        """The compressor's image index (image_pages / image_info / duplicates / untouched), cheaply"""
+        c = self.compressor
+        pages, info, fixed = {}, {}, set()
+        for page in doc:
+            governor.check()
+            extents = {}
+            for item in page.get_image_info():
+                m = fitz.Matrix(item['transform'])
+                extents.setdefault((item['width'], item['height']), []).append(
+                    (math.hypot(m.a, m.b), math.hypot(m.c, m.d)))
+            for img in page.get_images(full=True):
+                xref, smask, width, height = img[0], img[1], img[2], img[3]
+                if xref not in self.raw:
+                    self.raw[xref] = c._stream_length(doc, xref)
+                    if not c._rewritable(doc, xref, smask):
+                        fixed.add(xref)
+                if xref in fixed:
+                    continue
+                info.setdefault(xref, PlacedImage(width, height, img[8], img[4]))
+                if page.number not in pages.setdefault(xref, []):
+                    pages[xref].append(page.number)
+                    for extent in extents.get((width, height), []):
+                        info[xref].place(*extent)
+
+        first = {}
+        for xref in sorted(pages):
+            try:
+                raw = doc.xref_stream_raw(xref)
+                digest = hashlib.sha256(doc.xref_object(xref, compressed=True).encode() + raw).digest()
+            except Exception:
+                continue
+            info[xref].raw_size = len(raw)
+            twin = first.setdefault(digest, xref)
+            if twin != xref:
+                # The compressor only merges duplicates it can repoint; close enough for a size estimate
+                c.duplicates[xref] = twin
+                if info[xref].placement:
+                    info[twin].place(*info[xref].placement)
+        c.image_pages, c.image_info = pages, info
+        c.untouched = c._small_images()
+
+    def _candidates(self):
+        """Images a pass may re-encode, largest first"""
+        c = self.compressor
+        xrefs = [x for x in c.image_pages
+                 if x not in c.duplicates and x not in c.untouched and c.image_info[x].raw_size]
+        return sorted(xrefs, key=lambda x: (-c.image_info[x].raw_size, x))
+
+    # --- trial encodes ---
+
+    def _sample(self, doc, candidates, deadline):
+        """Trial encodes until the deadline: every image at the cheapest level first, then the next level"""
+        c = self.compressor
+        failed = set()
+        for level in SAMPLE_LEVELS:
+            q, dpi = c._settings(level)
+            for xref in candidates:
+                if time.perf_counter() >= deadline:
+                    return
+                max_d = c._target_dim(xref, dpi)
+                if xref in failed or c._skips(xref, max_d):
+                    continue
+                governor.check()
+                self.images.prepare(doc, [(xref, max_d, q)])
+                encoded = self.images.cached(xref, max_d, q)
+                src = self.images.source(xref)
+                if encoded is None or src is None:
+                    failed.add(xref)  # Can't be decoded: the compressor leaves it as is too
+                    continue
+                if encoded.lossless:
+                    self.lossless.add(xref)
+                area = c._fit_area(src, max_d)
+                unit = encoded.size / (area * c._quality_bytes(None if encoded.lossless else q))
+                self.trials.setdefault(xref, {})[area / (src.width * src.height)] = unit
+
+    def _unit(self, xref, kept):
+        """
+        Bytes per fitted pixel and quality unit of xref when kept (a share)
+        of its pixels survive the fit: a power law in kept through the two
+        nearest trials, with the sampled images' exponent if xref had only
+        one, and the sampled images' unit at the same share if it had none.
+        Past the largest trial the power law flattens (EXTRAPOLATE).
+        """
+        trials = self.trials.get(xref)
+        if not trials:
+            return self._average(kept)
+        near = sorted(trials, key=lambda k: (abs(math.log(k / kept)), k))[:2]
+        if len(near) == 2:
+            slope = self._slope(*sorted(near), trials)
+        else:
+            slope = self._typical_slope()
+        if kept > max(trials):
+            slope *= EXTRAPOLATE  # Detail per pixel levels off as the fit nears the source
+        return trials[near[0]] * (kept / near[0]) ** slope
+
+    @staticmethod
+    def _slope(ka, kb, trials):
+        return max(-MAX_SLOPE, min(MAX_SLOPE, math.log(trials[kb] / trials[ka]) / math.log(kb / ka)))
+
+    def _typical_slope(self):
+        """Power-law exponent over the images with two or more trials, weighted by size"""
+        total = weight = 0.0
+        for xref, trials in self.trials.items():
+            if len(trials) >= 2 and xref not in self.lossless:
+                ka, kb = sorted(trials)[:2]
+                size = self.compressor.image_info[xref].raw_size
+                total += self._slope(ka, kb, trials) * size
+                weight += size
+        return total / weight if weight else DEFAULT_SLOPE
+
+    def _average(self, kept):
+        """Unit of the sampled JPEG-class images at kept, weighted by size"""
+        units = weight = 0.0
+        for xref in self.trials:
+            if xref in self.lossless:
+                continue
+            size = self.compressor.image_info[xref].raw_size
+            units += self._unit(xref, kept) * size
+            weight += size
+        if weight:
+            return units / weight
+        return Q95_BYTES_PER_PIXEL / self.compressor._quality_bytes(95)
+
+    def _predict(self, xref, level):
+        """Bytes of xref in a pass at level"""
+        c = self.compressor
+        info = c.image_info[xref]
+        q, dpi = c._settings(level)
+        max_d = c._target_dim(xref, dpi)
+        if c._skips(xref, max_d):
+            return self.raw[xref]
+        area = c._fit_area(info, max_d)
+        kept = area / (info.width * info.height)
+        size = self._unit(xref, kept) * area * c._quality_bytes(None if xref in self.lossless else q)
+        if xref not in self.trials:
+            # Unknown class (a text scan priced as a photo would be way off): no more per pixel than it has now
+            size = min(size, self.raw[xref] * kept)
+        return size if c._replaces(info, size, max_d) else self.raw[xref]
+
+    # --- structure ---
+
+    def _floor(self, doc):
+        """Bytes of the structural pass's output without any image data"""
+        for xref in self.raw:
+            doc.update_stream(xref, b'', compress=False)
+        self.compressor._strip(doc)
+        return len(doc.tobytes(garbage=4, deflate=True, clean=True, use_objstms=1))
@@ -0,0 +1,178 @@
+import os
+import signal
+import shutil
+import tempfile
+import threading
+import subprocess
+import time
+
+from core import governor
+
+DEFAULT_TIMEOUT = 120  # Seconds per gs run (PDF_ENGINE_GS_TIMEOUT), never past the job's own deadline
+# Scans with at least two images a page averaging under this go to gs (see choose())
+SMALL_IMAGE_KB = 64
+BACKENDS = ('auto', 'mupdf', 'ghostscript', 'race')
+
+class GhostscriptError(Exception):
+    pass
+
+def find_binary():
+    """Path of the gs executable (PDF_ENGINE_GS overrides the PATH lookup), None if missing"""
+    configured = os.environ.get('PDF_ENGINE_GS')
+    if configured:
+        return shutil.which(configured)
+    for name in ('gs', 'gswin64c', 'gswin32c'):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+def choose(analysis, requested='auto'):
+    """
+    Backend for one compress job: 'mupdf', 'ghostscript' (gs, with MuPDF
+    as the fallback) or 'race' (both at once, the smaller valid output kept;
+    only when asked for, as it takes a core from the image pool).
+    Without gs it is always 'mupdf'. With 'auto', PDFAnalyzer output picks
+    gs for the documents pdfwrite is known to shrink better - Type3 fonts,
+    and scans made of many small images - and MuPDF for everything else.
+    """
+    if requested not in BACKENDS:
+        raise Exception(f"Unknown compress backend {requested!r} (use {', '.join(BACKENDS)})")
+    if requested == 'mupdf' or find_binary() is None:
+        return 'mupdf'
+    if requested != 'auto':
+        return requested
+    if analysis:
+        if analysis.get('type3_fonts'):
+            return 'ghostscript'
+        sizes = analysis.get('image_sizes_kb') or []
+        pages = analysis.get('pages') or 1
+        if analysis.get('is_scanned') and len(sizes) >= 2 * pages and sum(sizes) / len(sizes) < SMALL_IMAGE_KB:
+            return 'ghostscript'
+    return 'mupdf'
+
+def _qfactor(q):
+    """Distiller /QFactor with the table scaling of libjpeg quality q"""
+    scale = 5000 / q if q < 50 else 200 - 2 * q
+    return round(max(scale, 1) / 100.0, 3)
+
+def command(binary, in_path, out_path, q, dpi):
+    """gs pdfwrite argv: images downsampled above dpi and JPEG-encoded at quality q, fonts subset"""
+    qf = _qfactor(q)
+    image_dict = f"<< /QFactor {qf} /Blend 1 /HSamples [2 1 1 2] /VSamples [2 1 1 2] >>"
+    return [
+        binary, '-q', '-dNOPAUSE', '-dBATCH', '-dSAFER', '-sDEVICE=pdfwrite',
+        '-dCompatibilityLevel=1.5', '-dDetectDuplicateImages=true',
+        '-dCompressFonts=true', '-dSubsetFonts=true',
+        '-dDownsampleColorImages=true', '-dColorImageDownsampleType=/Bicubic', f'-dColorImageResolution={dpi}',
+        '-dDownsampleGrayImages=true', '-dGrayImageDownsampleType=/Bicubic', f'-dGrayImageResolution={dpi}',
+        '-dDownsampleMonoImages=true', '-dMonoImageDownsampleType=/Subsample', f'-dMonoImageResolution={max(dpi * 2, 300)}',
+        '-dColorImageDownsampleThreshold=1.0', '-dGrayImageDownsampleThreshold=1.0',
+        '-dAutoFilterColorImages=false', '-dColorImageFilter=/DCTEncode',
+        '-dAutoFilterGrayImages=false', '-dGrayImageFilter=/DCTEncode',
+        f'-sOutputFile={out_path}',
+        '-c', f"<< /ColorImageDict {image_dict} /GrayImageDict {image_dict} >> setdistillerparams",
+        '-f', in_path
+    ]
+
+def _kill(proc):
+    try:
+        if os.name == 'posix':
+            os.killpg(proc.pid, signal.SIGKILL)  # gs may have children of its own
+        else:
+            proc.kill()
+    except OSError:
+        pass
+    proc.wait()
+
+class GhostscriptRun:
+    """
+    gs pdfwrite over the job's input as a managed subprocess, on a thread of
+    its own so it can run next to the MuPDF search. Settings are tried in
+    order, gentlest first, until one fits target_kb. Each run is killed when
+    it passes its timeout (PDF_ENGINE_GS_TIMEOUT, capped by the job's time
+    left) or when cancel() is called.
+
+    Only gs and file I/O happen on the thread: the caller checks the output
+    (valid PDF, same page count) with fitz on its own thread. A caller that
+    no longer needs gs cancels before waiting, and gets the runs that were
+    already over.
+    """
+
+    def __init__(self, data, settings, target_kb, timeout=None):
+        self.binary = find_binary()
+        self.data = data
+        self.settings = settings      # [(q, dpi)] gentlest first
+        self.target_kb = target_kb
+        self.timeout = float(timeout or os.environ.get('PDF_ENGINE_GS_TIMEOUT') or DEFAULT_TIMEOUT)
+        self.results = []             # (q, dpi, bytes) of every run that produced a file
+        self.errors = []
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ghostscript', daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self):
+        """Block until the runs are over (or killed, after cancel()); returns results (gentlest first)"""
+        if self._thread is not None:
+            self._thread.join()
+        return self.results
+
+    def _run(self):
+        if self.binary is None:
+            self.errors.append("Ghostscript is not installed")
+            return
+        try:
+            with tempfile.TemporaryDirectory(prefix='pdf-baba-gs-') as workdir:
+                in_path = os.path.join(workdir, 'in.pdf')
+                with open(in_path, 'wb') as f:
+                    f.write(self.data)
+                for i, (q, dpi) in enumerate(self.settings):
+                    if self._cancel.is_set():
+                        return
+                    out_path = os.path.join(workdir, f'out{i}.pdf')
+                    try:
+                        out = self._gs(command(self.binary, in_path, out_path, q, dpi), out_path, workdir)
+                    except GhostscriptError as e:
+                        self.errors.append(str(e))
+                        return  # A later setting would fail or time out the same way
+                    self.results.append((q, dpi, out))
+                    if self.target_kb is None or len(out) / 1024 <= self.target_kb:
+                        return
+        except OSError as e:
+            self.errors.append(str(e))
+
+    def _gs(self, argv, out_path, workdir):
+        timeout = self.timeout
+        left = governor.remaining()
+        if left is not None:
+            timeout = min(timeout, left)
+        with open(os.path.join(workdir, 'stderr.txt'), 'w+b') as err:
+            proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=err,
+                                    cwd=workdir, start_new_session=os.name == 'posix')
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    proc.wait(timeout=0.1)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                if self._cancel.is_set():
+                    _kill(proc)
+                    raise GhostscriptError("Ghostscript run cancelled")
+                if time.monotonic() >= deadline:
+                    _kill(proc)
+                    raise GhostscriptError(f"Ghostscript exceeded its {timeout:g}s time limit")
+            if proc.returncode != 0:
+                err.seek(0)
+                message = err.read().decode('utf-8', 'replace').strip().splitlines()
+                raise GhostscriptError(f"Ghostscript failed ({proc.returncode}): "
+                                       f"{message[-1] if message else 'no output'}")
+        with open(out_path, 'rb') as f:
+            return f.read()
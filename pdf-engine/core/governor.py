@@ -0,0 +1,230 @@
+import os
+import sys
+import signal
+import threading
+import time
+
+from core.utils import current_rss_mb
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Defaults when neither the job nor the environment sets a limit (None = unlimited)
+DEFAULT_TIMEOUT = 600   # Serve jobs only: a one-off CLI run has no time limit unless asked (--timeout / PDF_ENGINE_TIMEOUT)
+DEFAULT_MAX_PAGES = 5000
+DEFAULT_MAX_MEGAPIXELS = 250
+HARD_TIMEOUT_GRACE = 10
+
+# MuPDF's object store is emptied once RSS passes this share of the memory limit
+STORE_SHRINK_AT = 0.75
+# Address space runs ~4x RSS once numpy/pdf2docx are mapped; the RLIMIT_AS backstop leaves that room
+ADDRESS_SPACE_FACTOR = 4
+
+class JobAborted(Exception):
+    """Raised from a governor check; reason is timeout, memory, pages, pixels or cancelled"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    return float(value) if float(value) > 0 else None
+
+def _vm_size_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[0])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except Exception:
+        return None
+
+class Governor:
+    """
+    Per-job resource limits. Tool loops call check() between pages and images;
+    a check raises JobAborted once the wall-clock deadline has passed, RSS is
+    over the memory limit or the job was cancelled (SIGUSR1). Limits on page
+    count and image size are checked where the tool knows them.
+
+    Two backstops cover code that never reaches a check (e.g. inside pdf2docx):
+    SIGALRM raises JobAborted HARD_TIMEOUT_GRACE seconds after the deadline, and
+    RLIMIT_AS caps address-space growth at ADDRESS_SPACE_FACTOR x the memory
+    limit, so a runaway allocation fails with MemoryError instead of taking the
+    container down.
+    """
+
+    def __init__(self, timeout=None, mem_limit_mb=None, max_pages=None, max_megapixels=None):
+        self.timeout = timeout
+        self.mem_limit_mb = mem_limit_mb
+        self.max_pages = max_pages
+        self.max_pixels = max_megapixels * 1000000 if max_megapixels else None
+        self.reason = None
+        self.message = None
+        self._deadline = None
+        self._cancel = threading.Event()
+        self._saved = {}
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Job values (CLI flags / serve job keys) win over PDF_ENGINE_* environment
+        defaults. DEFAULT_TIMEOUT only applies to serve jobs (args.serve), where
+        a hung job would hold up every job queued behind it.
+        """
+        def pick(attr, env, default):
+            value = getattr(args, attr, None)
+            if value is not None:
+                return value if value > 0 else None
+            return _env_number(env, default)
+        return cls(
+            timeout=pick('timeout', 'PDF_ENGINE_TIMEOUT', DEFAULT_TIMEOUT if getattr(args, 'serve', False) else None),
+            mem_limit_mb=pick('mem_limit_mb', 'PDF_ENGINE_MEM_LIMIT_MB', None),
+            max_pages=pick('max_pages', 'PDF_ENGINE_MAX_PAGES', DEFAULT_MAX_PAGES),
+            max_megapixels=pick('max_megapixels', 'PDF_ENGINE_MAX_MEGAPIXELS', DEFAULT_MAX_MEGAPIXELS)
+        )
+
+    # --- lifecycle ---
+
+    def start(self):
+        if self.timeout:
+            self._deadline = time.monotonic() + self.timeout
+        if threading.current_thread() is not threading.main_thread():
+            return  # Signals and rlimits belong to the main thread's job only
+        if hasattr(signal, 'SIGUSR1'):
+            self._saved['usr1'] = signal.signal(signal.SIGUSR1, lambda signum, frame: self.cancel())
+        if self.timeout and hasattr(signal, 'setitimer'):
+            self._saved['alrm'] = signal.signal(signal.SIGALRM, self._hard_timeout)
+            signal.setitimer(signal.ITIMER_REAL, self.timeout + HARD_TIMEOUT_GRACE)
+        if self.mem_limit_mb and resource is not None:
+            vm = _vm_size_mb()
+            if vm is not None:
+                soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+                # Budget on top of what is already mapped (libraries, thread stacks)
+                limit = int((vm + self.mem_limit_mb * ADDRESS_SPACE_FACTOR) * 1024 * 1024)
+                if hard == resource.RLIM_INFINITY or limit <= hard:
+                    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+                    self._saved['as'] = (soft, hard)
+
+    def stop(self):
+        if 'alrm' in self._saved:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._saved['alrm'])
+        if 'usr1' in self._saved:
+            signal.signal(signal.SIGUSR1, self._saved['usr1'])
+        if 'as' in self._saved:
+            resource.setrlimit(resource.RLIMIT_AS, self._saved['as'])
+        self._saved = {}
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _hard_timeout(self, signum, frame):
+        self._abort('timeout', f"Job exceeded the {self.timeout:g}s time limit")
+
+    def _abort(self, reason, message):
+        if self.reason is None:
+            self.reason, self.message = reason, message
+        raise JobAborted(self.reason, self.message)
+
+    # --- checks ---
+
+    def check(self):
+        if self.reason is not None:
+            raise JobAborted(self.reason, self.message)
+        if self._cancel.is_set():
+            self._abort('cancelled', "Job was cancelled")
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            self._abort('timeout', f"Job exceeded the {self.timeout:g}s time limit")
+        if self.mem_limit_mb:
+            rss = current_rss_mb()
+            if rss > self.mem_limit_mb * STORE_SHRINK_AT:
+                _shrink_mupdf_store()
+                rss = current_rss_mb()
+            if rss > self.mem_limit_mb:
+                self._abort('memory', f"Job exceeded the {self.mem_limit_mb:g} MB memory limit ({rss:.0f} MB)")
+
+    def remaining(self):
+        """Seconds left before the deadline (None without a time limit)"""
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    def check_pages(self, count):
+        if self.max_pages and count > self.max_pages:
+            self._abort('pages', f"{count} pages exceeds the limit of {self.max_pages:g}")
+
+    def check_pixels(self, width, height):
+        if self.max_pixels and width * height > self.max_pixels:
+            self._abort('pixels', f"{int(width)}x{int(height)} image exceeds the "
+                                  f"{self.max_pixels / 1000000:g} megapixel limit")
+
+    def aborted_result(self, tool):
+        return {"status": "aborted", "tool": tool, "reason": self.reason, "message": self.message}
+
+def _shrink_mupdf_store():
+    # PyMuPDF can't cap the store size after startup, so empty it instead
+    fitz = sys.modules.get('fitz') or sys.modules.get('pymupdf')
+    if fitz is not None:
+        try:
+            fitz.TOOLS.store_shrink(100)
+        except Exception:
+            pass
+
+_active = None
+_cancel_pending = False
+
+def start(args):
+    global _active, _cancel_pending
+    _active = Governor.from_args(args)
+    if _cancel_pending:
+        _active.cancel()
+        _cancel_pending = False
+    _active.start()
+    return _active
+
+def finish():
+    global _active
+    governor, _active = _active, None
+    if governor is not None:
+        governor.stop()
+    return governor
+
+def defer_cancel():
+    """
+    Cancel the job in progress, or the one about to start: the serve worker's
+    SIGUSR1 handler calls this when a cancel lands before start() has put the
+    job's own handler in place.
+    """
+    global _cancel_pending
+    if _active is not None:
+        _active.cancel()
+    else:
+        _cancel_pending = True
+
+def discard_cancel():
+    """Drop a deferred cancel once the job it was meant for is over"""
+    global _cancel_pending
+    _cancel_pending = False
+
+# Module-level checks for tool loops; no-ops outside a governed job
+
+def check():
+    """Raise JobAborted if the job is over time, over memory or cancelled"""
+    if _active is not None:
+        _active.check()
+
+def remaining():
+    """Seconds the job has left, for work that runs outside check() (e.g. a subprocess); None if unlimited"""
+    return _active.remaining() if _active is not None else None
+
+def check_pages(count):
+    if _active is not None:
+        _active.check_pages(count)
+
+def check_pixels(width, height):
+    if _active is not None:
+        _active.check_pixels(width, height)
@@ -0,0 +1,195 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import as_completed
+
+from PIL import Image
+
+from core.image_codecs import MAX_COLORS, PALETTE, classify, encode
+from core.profiler import stage
+
+DEFAULT_MAX_MB = 256
+# Decode JPEGs at a DCT scale that still leaves this much oversampling for the final
+# resample. Pillow's thumbnail() uses 2.0; 1.5 keeps SSIM >= 0.985 against an exact
+# resize while halving decode+resize time on large photos (benchmarks/bench_image_decode.py)
+REDUCING_GAP = 1.5
+
+class SourceImage:
+    """What the compressor needs to know about an image before deciding to replace it"""
+
+    def __init__(self, raw_size, width, height, jpeg=False):
+        self.raw_size = raw_size
+        self.width = width
+        self.height = height
+        self.jpeg = jpeg   # Can be decoded at 1/2, 1/4 or 1/8 scale (draft)
+
+class ImageCache:
+    """
+    Decode-once cache for one compress job. The quality tiers all start from
+    the same input bytes, so an xref means the same image in every tier: it is
+    extracted once, decoded once per scale, each resampled size is made once
+    and each (size, quality) is encoded once. A tier then only pays for the
+    encodes it hasn't seen yet.
+
+    Each decode is classified (core/image_codecs.py) and encoded with the
+    codec of its class: gray images as 1-channel JPEG, black-and-white as
+    1-bit G4 / Flate, few-colour images as palette Flate. The lossless ones
+    don't depend on the quality, so they are encoded once per size.
+
+    JPEGs that will shrink a lot are decoded at reduced scale in the DCT
+    domain (draft()), as close to the target as REDUCING_GAP allows, and
+    only then resampled with LANCZOS. The scale depends only on the image and
+    the target, so the pixels don't depend on what happens to be cached.
+
+    Decoded pixels are held in an LRU bounded by max_mb (PDF_ENGINE_IMAGE_CACHE_MB);
+    an evicted image is simply decoded again if a later tier needs it.
+
+    prepare() is the only method that touches the fitz document (MuPDF isn't
+    thread-safe); decode/resize/encode can run on a thread pool, where Pillow
+    releases the GIL. Every step is deterministic, so the bytes are the same
+    whichever thread made them or whether the pixels came from the cache.
+    """
+
+    def __init__(self, max_mb=None):
+        self.max_bytes = int(float(max_mb or os.environ.get('PDF_ENGINE_IMAGE_CACHE_MB') or DEFAULT_MAX_MB) * 1024 * 1024)
+        self.sources = {}
+        self._pixels = OrderedDict()  # ('decoded', xref, scale) / ('fit', xref, max_d) -> PIL image
+        self._pixel_bytes = 0
+        self._kinds = {}              # (xref, scale) -> content class of that decode
+        self._encoded = {}            # (xref, max_d, q) -> EncodedImage; q is None if lossless
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # --- LRU of decoded pixels ---
+
+    @staticmethod
+    def _footprint(img):
+        return img.width * img.height * len(img.getbands())
+
+    def _get(self, key):
+        with self._lock:
+            img = self._pixels.get(key)
+            if img is not None:
+                self._pixels.move_to_end(key)
+                self.hits += 1
+            return img
+
+    def _put(self, key, img):
+        with self._lock:
+            self.misses += 1
+            self._pixels[key] = img
+            self._pixel_bytes += self._footprint(img)
+            while self._pixel_bytes > self.max_bytes and len(self._pixels) > 1:
+                _, old = self._pixels.popitem(last=False)
+                self._pixel_bytes -= self._footprint(old)
+        return img
+
+    # --- main thread ---
+
+    def prepare(self, doc, keys, pool=None, on_done=None):
+        """
+        Encode every (xref, max_d, q) in keys that isn't cached yet, on pool if
+        given. Raw image bytes are extracted here, before anything is handed
+        to a worker. An image that fails to decode or encode is left out;
+        cached() returns None for it. on_done(n) runs on this thread after
+        each finished image (n counts cached ones too).
+        """
+        jobs = []
+        done = 0
+        for key in dict.fromkeys(keys):
+            if self.cached(*key) is not None:
+                done += 1
+                continue
+            xref, max_d = key[0], key[1]
+            # Hold on to the decoded pixels so an eviction can't leave the worker without them
+            src = self.sources.get(xref)
+            decoded = self._get(('decoded', xref, self.scale(src, max_d))) if src else None
+            raw = None
+            if decoded is None:
+                try:
+                    with stage('image.extract'):
+                        raw = doc.extract_image(xref)["image"]
+                except Exception:
+                    continue
+            jobs.append((key, decoded, raw))
+        if not jobs and done and on_done:
+            on_done(done)  # All cached: still report them
+
+        if pool is None:
+            finished = (self._encode_job(*job) for job in jobs)
+        else:
+            finished = as_completed([pool.submit(self._encode_job, *job) for job in jobs])
+        for _ in finished:
+            done += 1
+            if on_done:
+                on_done(done)
+
+    def source(self, xref):
+        """Raw size and dimensions of the original image (None if it never decoded)"""
+        return self.sources.get(xref)
+
+    def cached(self, xref, max_d, q):
+        """EncodedImage if this (size, quality) was already made, else None"""
+        return self._encoded.get((xref, max_d, q)) or self._encoded.get((xref, max_d, None))
+
+    @staticmethod
+    def scale(src, max_d):
+        """DCT scale (1, 2, 4 or 8) to decode src at when it will be fitted to max_d"""
+        if not src.jpeg:
+            return 1
+        longest = max(src.width, src.height)
+        scale = 1
+        while scale < 8 and longest / (scale * 2) >= max_d * REDUCING_GAP:
+            scale *= 2
+        return scale
+
+    # --- workers ---
+
+    def _encode_job(self, key, decoded, raw):
+        try:
+            xref, max_d, q = key
+            if decoded is None:
+                decoded = self._decode(xref, raw, max_d)
+            kind = self._kinds[(xref, self.scale(self.sources[xref], max_d))]
+            colors = decoded.getcolors(MAX_COLORS) if kind == PALETTE else None
+            out = encode(self._fitted(xref, decoded, max_d), kind, q, colors)
+            with self._lock:
+                self._encoded[(xref, max_d, None) if out.lossless else key] = out
+        except Exception:
+            pass  # Left as is, like any image the compressor can't handle
+
+    def _decode(self, xref, raw, max_d):
+        with stage('image.decode'):
+            img = Image.open(io.BytesIO(raw))
+            src = SourceImage(len(raw), img.width, img.height, jpeg=img.format == 'JPEG')
+            scale = self.scale(src, max_d)
+            if scale > 1:
+                # libjpeg scales while decoding; keep L / RGB as they are, CMYK is converted below
+                img.draft(img.mode if img.mode in ('L', 'RGB') else None,
+                          (max(1, src.width // scale), max(1, src.height // scale)))
+            if img.mode == '1': img = img.convert('L')
+            if img.mode in ['P', 'RGBA', 'CMYK']: img = img.convert('RGB')
+            img.load()
+        with stage('image.classify'):
+            kind, mode = classify(img)
+            if img.mode != mode:
+                img = img.convert(mode)
+        with self._lock:
+            self.sources[xref] = src
+            self._kinds[(xref, scale)] = kind
+        return self._put(('decoded', xref, scale), img)
+
+    def _fitted(self, xref, decoded, max_d):
+        """The image scaled to fit max_d x max_d (the decode itself if it already fits)"""
+        if decoded.width <= max_d and decoded.height <= max_d:
+            return decoded
+        key = ('fit', xref, max_d)
+        img = self._get(key)
+        if img is not None:
+            return img
+        with stage('image.resize'):
+            img = decoded.copy()
+            img.thumbnail((max_d, max_d), Image.Resampling.LANCZOS)
+        return self._put(key, img)
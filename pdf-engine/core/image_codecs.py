@@ -0,0 +1,195 @@
+import io
+import zlib
+
+from PIL import Image, features
+
+from core.profiler import stage
+
+# Content classes, each with its own codec (see encode())
+COLOR = 'color'       # RGB JPEG
+GRAY = 'gray'         # 1-channel JPEG
+BILEVEL = 'bilevel'   # 1-bit CCITT G4 or Flate, whichever is smaller
+PALETTE = 'palette'   # Indexed Flate at 1/2/4/8 bits per pixel
+LOSSLESS = (BILEVEL, PALETTE)  # Same bytes at every JPEG quality
+
+SAMPLE_PIXELS = 256 * 256  # classify() looks at about this many pixels
+GRAY_SPREAD = 12           # Max channel difference of a pixel that still counts as gray
+GRAY_OUTLIERS = 0.001      # Share of coloured pixels a gray image may have (JPEG chroma noise)
+BILEVEL_DARK, BILEVEL_LIGHT = 80, 176
+BILEVEL_SHARE = 0.95       # Share of pixels at either extreme (antialiased text is ~0.97)
+BILEVEL_EDGES = 0.5        # Share of the rest that must sit on a black/white edge (text ~0.7, photos ~0)
+MAX_COLORS = 256           # Palette images: exact colour count, checked on every pixel
+MAX_GRAY_LEVELS = 16       # Gray images with this few levels are flat art, not photos
+
+G4 = features.check('libtiff')  # Pillow can only write CCITT G4 through libtiff
+
+def _sample(img):
+    """About SAMPLE_PIXELS pixels of img on a regular grid, as an array"""
+    import numpy as np  # Lazy: keeps numpy out of the cold start of jobs that never decode an image
+    step = max(1, int((img.width * img.height / SAMPLE_PIXELS) ** 0.5))
+    if step > 1:
+        img = img.resize((max(1, img.width // step), max(1, img.height // step)), Image.Resampling.NEAREST)
+    return np.asarray(img, dtype=np.int32)
+
+def classify(img):
+    """
+    (class, mode) of a decoded L or RGB image, from a pixel sample: BILEVEL
+    if (nearly) every pixel is black or white and the gray ones are edges
+    (_edge_grays), PALETTE if it has at most MAX_COLORS colours
+    (MAX_GRAY_LEVELS for gray), GRAY if every pixel has R = G = B give or
+    take JPEG noise, else COLOR. mode is what to hold the
+    pixels in from here on: 'L' for anything gray, else 'RGB'.
+    """
+    import numpy as np
+    s = _sample(img)
+    if s.ndim == 3:
+        spread = s.max(axis=2) - s.min(axis=2)
+        gray = np.count_nonzero(spread > GRAY_SPREAD) <= GRAY_OUTLIERS * spread.size
+        luma = (s[..., 0] * 299 + s[..., 1] * 587 + s[..., 2] * 114) // 1000
+    else:
+        gray, luma = True, s
+    if gray:
+        extremes = np.count_nonzero((luma <= BILEVEL_DARK) | (luma >= BILEVEL_LIGHT))
+        if extremes >= BILEVEL_SHARE * luma.size and _edge_grays(luma):
+            return BILEVEL, 'L'
+        if len(np.unique(luma)) <= MAX_GRAY_LEVELS and img.convert('L').getcolors(MAX_GRAY_LEVELS):
+            return PALETTE, 'L'
+        return GRAY, 'L'
+    packed = (s[..., 0] << 16) | (s[..., 1] << 8) | s[..., 2]
+    if len(np.unique(packed)) <= MAX_COLORS and img.getcolors(MAX_COLORS):
+        return PALETTE, 'RGB'
+    return COLOR, 'RGB'
+
+def _edge_grays(luma):
+    """
+    Whether the mid-gray pixels of a mostly black-and-white sample are the
+    antialiasing of edges (next to both a dark and a light pixel) rather
+    than midtones: a high-contrast photo can have BILEVEL_SHARE of its
+    pixels at the extremes, but its grays sit in smooth tonal transitions
+    that a 1-bit threshold would flatten.
+    """
+    import numpy as np
+    mid = (luma > BILEVEL_DARK) & (luma < BILEVEL_LIGHT)
+    grays = np.count_nonzero(mid)
+    if not grays:
+        return True
+    padded = np.pad(luma, 1, mode='edge')
+    height, width = luma.shape
+    shifted = [padded[y:y + height, x:x + width] for y in range(3) for x in range(3)]
+    edges = (np.minimum.reduce(shifted) <= BILEVEL_DARK) & (np.maximum.reduce(shifted) >= BILEVEL_LIGHT)
+    return np.count_nonzero(mid & edges) >= BILEVEL_EDGES * grays
+
+class EncodedImage:
+    """Stream bytes of a re-encoded image and the dictionary entries that describe them"""
+
+    def __init__(self, kind, data, width, height, filter_name, colorspace, bpc, decode_parms=None):
+        self.kind = kind
+        self.data = data
+        self.width = width
+        self.height = height
+        self.filter = filter_name
+        self.colorspace = colorspace
+        self.bpc = bpc
+        self.decode_parms = decode_parms
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def lossless(self):
+        return self.kind in LOSSLESS
+
+    def keys(self):
+        """(key, value) pairs for doc.xref_set_key after the stream is replaced"""
+        return (('Filter', self.filter), ('DecodeParms', self.decode_parms or 'null'),
+                ('ColorSpace', self.colorspace), ('BitsPerComponent', str(self.bpc)),
+                ('Width', str(self.width)), ('Height', str(self.height)))
+
+def encode(img, kind, q, colors=None):
+    """
+    Encode fitted pixels with the codec of their class. colors is the
+    source's colour list (getcolors(MAX_COLORS)) for PALETTE: resampling
+    blends neighbouring colours, so the pixels are mapped back onto it.
+    """
+    with stage('image.encode') as rec:
+        if kind == BILEVEL:
+            out = _bilevel(img)
+        elif kind == PALETTE:
+            out = _palette(img, colors)
+        else:
+            out = _jpeg(img, kind, q)
+        rec.add_bytes(out.size)
+    return out
+
+def _jpeg(img, kind, q):
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=q, optimize=True)
+    colorspace = '/DeviceGray' if img.mode == 'L' else '/DeviceRGB'
+    return EncodedImage(kind, buf.getvalue(), img.width, img.height, '/DCTDecode', colorspace, 8)
+
+def _bilevel(img):
+    bw = img.convert('L').point(lambda v: 255 if v >= 128 else 0, '1')
+    # Pillow packs mode '1' rows MSB first, padded to a byte, 1 = white: PDF's 1-bit DeviceGray
+    best = EncodedImage(BILEVEL, zlib.compress(bw.tobytes(), 9), bw.width, bw.height,
+                        '/FlateDecode', '/DeviceGray', 1)
+    if G4:
+        data = _g4(bw)
+        if data is not None and len(data) < best.size:
+            # libtiff codes the white (1) pixels as CCITT black runs; BlackIs1 maps them back to 1
+            parms = f'<</K -1/Columns {bw.width}/Rows {bw.height}/BlackIs1 true>>'
+            best = EncodedImage(BILEVEL, data, bw.width, bw.height, '/CCITTFaxDecode', '/DeviceGray', 1, parms)
+    return best
+
+def _g4(bw):
+    """Raw CCITT G4 data of a mode '1' image (the single strip of a G4 TIFF)"""
+    buf = io.BytesIO()
+    bw.save(buf, 'TIFF', compression='group4', tiffinfo={278: bw.height})  # RowsPerStrip: one strip
+    tiff = Image.open(io.BytesIO(buf.getvalue()))
+    offsets, counts = tiff.tag_v2.get(273), tiff.tag_v2.get(279)
+    if not offsets or len(offsets) != 1:
+        return None
+    return buf.getvalue()[offsets[0]:offsets[0] + counts[0]]
+
+def _palette(img, colors):
+    import numpy as np
+    table = np.array(sorted(c if isinstance(c, tuple) else (c, c, c) for _, c in colors), dtype=np.int32)[:, :3]
+    pixels = np.asarray(img.convert('RGB'), dtype=np.int32)
+    indices = _nearest(pixels.reshape(-1, 3), table).reshape(pixels.shape[:2])
+    bpc = next(b for b in (1, 2, 4, 8) if len(table) <= 1 << b)
+    hex_table = table.astype(np.uint8).tobytes().hex()
+    return EncodedImage(PALETTE, zlib.compress(_pack(indices, bpc), 9), img.width, img.height,
+                        '/FlateDecode', f'[/Indexed /DeviceRGB {len(table) - 1} <{hex_table}>]', bpc)
+
+def _nearest(pixels, table):
+    """Index into table (sorted, K x 3) of the closest colour of every pixel (N x 3)"""
+    import numpy as np
+    keys = (table[:, 0] << 16) | (table[:, 1] << 8) | table[:, 2]
+    packed = (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+    indices = np.minimum(np.searchsorted(keys, packed), len(keys) - 1)
+    missing = keys[indices] != packed
+    if missing.any():
+        # Colours the resample blended: nearest table entry to the centre of their
+        # 5-bit-per-channel cell, so the search is bounded by 32768 cells whatever the image
+        blends = pixels[missing] >> 3
+        cells, where = np.unique((blends[:, 0] << 10) | (blends[:, 1] << 5) | blends[:, 2], return_inverse=True)
+        centres = np.stack([cells >> 10, (cells >> 5) & 31, cells & 31], axis=1) * 8 + 4
+        nearest = np.empty(len(cells), dtype=indices.dtype)
+        for start in range(0, len(cells), 4096):
+            diff = centres[start:start + 4096, None, :] - table[None, :, :]
+            nearest[start:start + 4096] = (diff * diff).sum(axis=2).argmin(axis=1)
+        indices[missing] = nearest[where.ravel()]
+    return indices.astype(np.uint8)
+
+def _pack(indices, bpc):
+    """Rows of 8-bit palette indices packed to bpc bits each, every row padded to a byte"""
+    import numpy as np
+    if bpc == 8:
+        return indices.tobytes()
+    per_byte = 8 // bpc
+    height, width = indices.shape
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = indices
+    groups = padded.reshape(height, -1, per_byte)
+    shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * bpc
+    return np.bitwise_or.reduce(groups << shifts, axis=2).astype(np.uint8).tobytes()
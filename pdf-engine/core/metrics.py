@@ -0,0 +1,243 @@
+import os
+import json
+import math
+import time
+import tempfile
+
+from core.streams import input_size
+from core.utils import FileLock
+
+DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), 'pdf-baba-metrics')
+DEFAULT_MAX_MB = 10
+QUANTILES = (0.5, 0.95, 0.99)
+
+def metrics_enabled():
+    return os.environ.get('PDF_ENGINE_METRICS', '1').lower() not in ('0', 'off', 'false', 'no')
+
+class MetricsStore:
+    """
+    Rolling NDJSON log of finished jobs, one line per job, shared by every
+    engine process (CLI, batch workers, serve). When the file passes max_mb it
+    is rotated to metrics.ndjson.1, so at most two generations are kept.
+    Running totals since the store was created (jobs, seconds, bytes, pages,
+    cache hits, tiers) are kept in counters.json, which rotation never
+    touches: they back the Prometheus counters, which must never go down.
+    """
+
+    def __init__(self, metrics_dir=None, max_mb=None):
+        self.metrics_dir = metrics_dir or os.environ.get('PDF_ENGINE_METRICS_DIR') or DEFAULT_METRICS_DIR
+        self.max_bytes = int(float(max_mb or os.environ.get('PDF_ENGINE_METRICS_MAX_MB') or DEFAULT_MAX_MB) * 1024 * 1024)
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        self.path = os.path.join(self.metrics_dir, 'metrics.ndjson')
+        self.lock_path = os.path.join(self.metrics_dir, 'lock')
+        self.counters_path = os.path.join(self.metrics_dir, 'counters.json')
+
+    # --- write ---
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with FileLock(self.lock_path):
+            try:
+                if os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+            except OSError:
+                pass  # No log yet
+            with open(self.path, 'a') as f:
+                f.write(line)
+            totals = self.totals()
+            add_record(totals.setdefault(record.get('tool', 'unknown'), {}), record)
+            tmp = self.counters_path + f".{os.getpid()}"
+            with open(tmp, 'w') as f:
+                json.dump(totals, f)
+            os.replace(tmp, self.counters_path)
+
+    def record_job(self, tool, args, result, duration):
+        """Build and append the record for one finished job (result is None if the tool raised)"""
+        result = result if isinstance(result, dict) else {}
+        stats = result.get('stats') or {}
+        input_bytes = 0
+        for path in getattr(args, 'inputs', None) or []:
+            try:
+                input_bytes += input_size(path)
+            except OSError:
+                pass
+        cache = stats.get('cache') or {}
+        self.append({
+            'ts': round(time.time(), 3),
+            'tool': tool,
+            'status': job_status(result),
+            'durationMs': round(duration * 1000, 2),
+            'inputBytes': input_bytes,
+            'pages': stats.get('totalPages', stats.get('totalConverted')),
+            'tier': stats.get('tier'),
+            'cacheHit': cache.get('hit')
+        })
+
+    # --- read ---
+
+    def totals(self):
+        """Per-tool running totals (see add_record) of every job ever appended"""
+        try:
+            with open(self.counters_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def read(self, since=None):
+        """Records from both generations, oldest first; since: only ts >= since"""
+        records = []
+        for path in (self.path + '.1', self.path):
+            try:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # Torn line from a crashed writer
+                        if since is None or record.get('ts', 0) >= since:
+                            records.append(record)
+            except OSError:
+                continue
+        return records
+
+def job_status(result):
+    if not result:
+        return 'error'
+    status = result.get('status')
+    if status in ('success', 'ok') or result.get('success') is True:
+        return 'success'
+    return status or 'error'
+
+def record_job(tool, args, result, duration):
+    """Append a job to the default store; metrics must never fail the job itself"""
+    if not metrics_enabled():
+        return
+    try:
+        MetricsStore().record_job(tool, args, result, duration)
+    except OSError:
+        pass
+
+def add_record(totals, record):
+    """Add one job record to a tool's running totals (the counter fields of a summarize() tool entry)"""
+    status = record.get('status', 'error')
+    totals['count'] = totals.get('count', 0) + 1
+    totals['sumSeconds'] = round(totals.get('sumSeconds', 0.0) + record.get('durationMs', 0) / 1000.0, 6)
+    statuses = totals.setdefault('statuses', {})
+    statuses[status] = statuses.get(status, 0) + 1
+    if record.get('tier'):
+        tiers = totals.setdefault('tiers', {})
+        tiers[record['tier']] = tiers.get(record['tier'], 0) + 1
+    totals['inputBytes'] = totals.get('inputBytes', 0) + (record.get('inputBytes') or 0)
+    totals['pages'] = totals.get('pages', 0) + (record.get('pages') or 0)
+    totals['cacheHits'] = totals.get('cacheHits', 0) + (1 if record.get('cacheHit') else 0)
+    return totals
+
+# --- aggregation ---
+
+def quantile(sorted_values, q):
+    """Nearest-rank quantile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(records, window_seconds=None, now=None):
+    """Per-tool latency quantiles, counts and throughput"""
+    now = now or time.time()
+    by_tool = {}
+    for record in records:
+        by_tool.setdefault(record.get('tool', 'unknown'), []).append(record)
+
+    if window_seconds:
+        span = window_seconds
+    elif records:
+        span = max(now - min(r.get('ts', now) for r in records), 1.0)
+    else:
+        span = 1.0
+
+    tools = {}
+    for tool, items in sorted(by_tool.items()):
+        durations = sorted(r.get('durationMs', 0) / 1000.0 for r in items)
+        statuses = {}
+        tiers = {}
+        for r in items:
+            statuses[r.get('status', 'error')] = statuses.get(r.get('status', 'error'), 0) + 1
+            if r.get('tier'):
+                tiers[r['tier']] = tiers.get(r['tier'], 0) + 1
+        input_bytes = sum(r.get('inputBytes') or 0 for r in items)
+        tools[tool] = {
+            'count': len(items),
+            'sumSeconds': round(sum(durations), 6),
+            'quantiles': {str(q): round(quantile(durations, q), 6) for q in QUANTILES},
+            'statuses': statuses,
+            'tiers': tiers,
+            'inputBytes': input_bytes,
+            'pages': sum(r.get('pages') or 0 for r in items),
+            'cacheHits': sum(1 for r in items if r.get('cacheHit')),
+            'jobsPerSecond': round(len(items) / span, 6),
+            'inputBytesPerSecond': round(input_bytes / span, 2)
+        }
+    return {'windowSeconds': round(span, 3), 'jobs': len(records), 'tools': tools}
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+def render_prometheus(summary, totals):
+    """
+    Prometheus text exposition format (0.0.4): quantiles and throughput from
+    a summarize() result (the log's window), counters and the summary's
+    _sum / _count from MetricsStore.totals(), so they only ever go up.
+    """
+    tools = summary['tools']
+    totals = {tool: totals[tool] for tool in sorted(totals)}
+    lines = [
+        '# HELP pdf_engine_job_duration_seconds Job wall time per tool.',
+        '# TYPE pdf_engine_job_duration_seconds summary'
+    ]
+    for tool in sorted(set(tools) | set(totals)):
+        for q, value in tools.get(tool, {}).get('quantiles', {}).items():
+            lines.append(f"pdf_engine_job_duration_seconds{_labels(tool=tool, quantile=q)} {value}")
+        if tool in totals:
+            t = totals[tool]
+            lines.append(f"pdf_engine_job_duration_seconds_sum{_labels(tool=tool)} {t.get('sumSeconds', 0)}")
+            lines.append(f"pdf_engine_job_duration_seconds_count{_labels(tool=tool)} {t.get('count', 0)}")
+
+    lines += ['# HELP pdf_engine_jobs_total Finished jobs per tool and outcome.',
+              '# TYPE pdf_engine_jobs_total counter']
+    for tool, s in totals.items():
+        for status, n in sorted(s.get('statuses', {}).items()):
+            lines.append(f"pdf_engine_jobs_total{_labels(tool=tool, status=status)} {n}")
+
+    lines += ['# HELP pdf_engine_throughput_jobs_per_second Jobs per second over the stats window.',
+              '# TYPE pdf_engine_throughput_jobs_per_second gauge']
+    for tool, s in tools.items():
+        lines.append(f"pdf_engine_throughput_jobs_per_second{_labels(tool=tool)} {s['jobsPerSecond']}")
+
+    lines += ['# HELP pdf_engine_throughput_input_bytes_per_second Input bytes per second over the stats window.',
+              '# TYPE pdf_engine_throughput_input_bytes_per_second gauge']
+    for tool, s in tools.items():
+        lines.append(f"pdf_engine_throughput_input_bytes_per_second{_labels(tool=tool)} {s['inputBytesPerSecond']}")
+
+    lines += ['# HELP pdf_engine_input_bytes_total Input bytes processed per tool.',
+              '# TYPE pdf_engine_input_bytes_total counter']
+    for tool, s in totals.items():
+        lines.append(f"pdf_engine_input_bytes_total{_labels(tool=tool)} {s.get('inputBytes', 0)}")
+
+    lines += ['# HELP pdf_engine_pages_total Pages processed per tool.',
+              '# TYPE pdf_engine_pages_total counter']
+    for tool, s in totals.items():
+        lines.append(f"pdf_engine_pages_total{_labels(tool=tool)} {s.get('pages', 0)}")
+
+    lines += ['# HELP pdf_engine_cache_hits_total Jobs served from the result cache.',
+              '# TYPE pdf_engine_cache_hits_total counter']
+    for tool, s in totals.items():
+        lines.append(f"pdf_engine_cache_hits_total{_labels(tool=tool)} {s.get('cacheHits', 0)}")
+
+    lines += ['# HELP pdf_engine_compress_tier_total Compression tier chosen per job.',
+              '# TYPE pdf_engine_compress_tier_total counter']
+    for tool, s in totals.items():
+        for tier, n in sorted(s.get('tiers', {}).items()):
+            lines.append(f"pdf_engine_compress_tier_total{_labels(tool=tool, tier=tier)} {n}")
+
+    lines.append(f"pdf_engine_stats_window_seconds {summary['windowSeconds']}")
+    return '\n'.join(lines) + '\n'
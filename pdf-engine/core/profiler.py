@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from core.utils import current_rss_mb, peak_rss_mb
+
+class _StageRecord:
+    """Totals for one stage name (a stage can run many times, e.g. once per image)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_rss = 0.0
+        self.bytes_written = 0
+
+    def add_bytes(self, n):
+        self.bytes_written += int(n)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "wallMs": round(self.wall * 1000, 2),
+            "cpuMs": round(self.cpu * 1000, 2),
+            "peakRssMB": round(self.peak_rss, 1),
+            "bytesWritten": self.bytes_written
+        }
+
+class _NullRecord:
+    def add_bytes(self, n):
+        pass
+
+_NULL_RECORD = _NullRecord()
+
+class Profiler:
+    """
+    Per-stage wall time, CPU time, peak RSS and bytes written for one job.
+    A background thread samples RSS every few ms so each open stage sees the
+    real peak reached while it ran, not just the value at its edges.
+    """
+
+    SAMPLE_INTERVAL = 0.005
+
+    def __init__(self):
+        self.records = {}
+        self._open = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.SAMPLE_INTERVAL):
+            self._note_rss(current_rss_mb())
+
+    def _note_rss(self, rss):
+        with self._lock:
+            for record in self._open:
+                if rss > record.peak_rss:
+                    record.peak_rss = rss
+
+    @contextmanager
+    def stage(self, name, output_path=None):
+        with self._lock:
+            record = self.records.get(name)
+            if record is None:
+                record = self.records[name] = _StageRecord(name)
+            self._open.append(record)
+        self._note_rss(current_rss_mb())
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.process_time() - cpu0
+            if output_path and os.path.isfile(output_path):
+                record.add_bytes(os.path.getsize(output_path))
+            self._note_rss(current_rss_mb())
+            # Stages also run on image worker threads: totals add up across threads
+            # (and CPU time is process-wide, so concurrent stages each count all of it)
+            with self._lock:
+                record.wall += wall
+                record.cpu += cpu
+                record.calls += 1
+                self._open.remove(record)
+
+    def report(self):
+        self._stop.set()
+        return {
+            "wallMs": round((time.perf_counter() - self._start_wall) * 1000, 2),
+            "cpuMs": round((time.process_time() - self._start_cpu) * 1000, 2),
+            "peakRssMB": round(peak_rss_mb(), 1),
+            "stages": [r.to_dict() for r in self.records.values()]
+        }
+
+_active = None
+
+def start():
+    global _active
+    _active = Profiler()
+    return _active
+
+def finish():
+    """Stop the active profiler and return its report (None if profiling was off)"""
+    global _active
+    profiler, _active = _active, None
+    return profiler.report() if profiler else None
+
+def detach():
+    """In a forked child: drop the inherited profiler (its lock may have been held at fork time)"""
+    global _active
+    _active = None
+
+@contextmanager
+def _noop():
+    yield _NULL_RECORD
+
+def stage(name, output_path=None):
+    """
+    Time a block as a named stage of the active profile. A no-op when
+    --profile is off. output_path: count that file's size as bytes written.
+    The yielded record's add_bytes() counts in-memory output (encoded images).
+    """
+    if _active is None:
+        return _noop()
+    return _active.stage(name, output_path)
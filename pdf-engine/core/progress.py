@@ -0,0 +1,137 @@
+import os
+import json
+import time
+
+class ProgressReporter:
+    """
+    Newline-delimited JSON progress events for one job, written to stderr or
+    another file descriptor (never stdout, which carries the final result).
+    Every event is a full snapshot of the job's state so a consumer can drop
+    any of them:
+
+        {"event": "progress", "tool": "pdf-to-image", "phase": "render",
+         "unit": "pages", "done": 12, "total": 300, "bytesWritten": 1843200,
+         "elapsedMs": 950.2, "etaSeconds": 22.8}
+
+    etaSeconds extrapolates the current phase from its own rate so far.
+    Step events are throttled to MIN_INTERVAL; phase/tier changes and the last
+    step of a phase always go out.
+    """
+
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, fd, tool, job_id=None, input_path=None):
+        self.fd = fd
+        self.base = {"tool": tool}
+        if job_id is not None:
+            self.base["id"] = job_id
+        if input_path:
+            self.base["input"] = os.path.basename(input_path)
+        self.state = {"phase": None, "unit": None, "done": 0, "total": None, "bytesWritten": 0}
+        self._start = time.perf_counter()
+        self._phase_start = self._start
+        self._last_emit = 0.0
+
+    def _write(self, event, fields):
+        line = json.dumps(dict({"event": event}, **self.base, **fields), separators=(',', ':')) + '\n'
+        try:
+            # One write per line keeps events from concurrent batch workers whole
+            os.write(self.fd, line.encode('utf-8'))
+        except OSError:
+            pass  # Reader went away; progress is best-effort
+        self._last_emit = time.perf_counter()
+
+    def emit(self):
+        now = time.perf_counter()
+        fields = dict(self.state, elapsedMs=round((now - self._start) * 1000, 1))
+        done, total = self.state['done'], self.state['total']
+        if done and total:
+            fields['etaSeconds'] = round((now - self._phase_start) / done * (total - done), 2)
+        self._write("progress", fields)
+
+    def begin(self):
+        self._write("start", {})
+
+    def end(self, status):
+        self._write("end", {"status": status, "bytesWritten": self.state['bytesWritten'],
+                            "elapsedMs": round((time.perf_counter() - self._start) * 1000, 1)})
+
+    def phase(self, name, total=None, unit='pages'):
+        self.state.update(phase=name, unit=unit if total is not None else None, done=0, total=total)
+        self._phase_start = time.perf_counter()
+        self.emit()
+
+    def step(self, done, total=None):
+        self.state['done'] = done
+        if total is not None:
+            self.state['total'] = total
+        self.maybe_emit(force=done == self.state['total'])
+
+    def maybe_emit(self, force=False):
+        if force or time.perf_counter() - self._last_emit >= self.MIN_INTERVAL:
+            self.emit()
+
+    def tier(self, name, index, count):
+        self.state.update(tier=name, tierIndex=index, tierCount=count, phase=None, unit=None, done=0, total=None)
+        self.emit()
+
+    def add_bytes(self, n):
+        self.state['bytesWritten'] += int(n)
+
+def parse_target(target):
+    """'stderr' or 'fd:N' -> file descriptor"""
+    if target in (True, 'stderr', '2', 'fd:2'):
+        return 2
+    if isinstance(target, str) and target.startswith('fd:'):
+        try:
+            fd = int(target[3:])
+            os.fstat(fd)
+            return fd
+        except (ValueError, OSError):
+            pass
+    raise Exception(f"Invalid progress target {target!r} (use 'stderr' or 'fd:N')")
+
+_active = None
+
+def start(target, tool, job_id=None, input_path=None):
+    global _active
+    _active = ProgressReporter(parse_target(target), tool, job_id, input_path)
+    _active.begin()
+    return _active
+
+def finish(status):
+    global _active
+    reporter, _active = _active, None
+    if reporter is not None:
+        reporter.end(status)
+
+def detach():
+    """In a forked child: drop the inherited reporter so only the parent reports"""
+    global _active
+    _active = None
+
+# Module-level helpers for tool loops; all are no-ops unless --progress is on
+
+def phase(name, total=None, unit='pages'):
+    """Start a phase of work (render, tier, save...) with total steps if known"""
+    if _active is not None:
+        _active.phase(name, total, unit)
+
+def step(done, total=None):
+    """done of the current phase's steps are finished"""
+    if _active is not None:
+        _active.step(done, total)
+
+def tier(name, index, count):
+    """Compression tier index (1-based) of count is being tried"""
+    if _active is not None:
+        _active.tier(name, index, count)
+
+def written(path=None, nbytes=0):
+    """Count an output file (or nbytes) towards bytesWritten"""
+    if _active is None:
+        return
+    if path and os.path.isfile(path):
+        nbytes += os.path.getsize(path)
+    _active.add_bytes(nbytes)
+    _active.maybe_emit()
@@ -0,0 +1,233 @@
+import multiprocessing
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from core import governor, profiler, progress
+from core.image_codecs import BILEVEL, COLOR, GRAY, MAX_COLORS, PALETTE, classify, encode
+from core.profiler import stage
+
+STRATEGIES = ('auto', 'images', 'rasterize')
+COLOR_MODES = {'auto': None, 'color': COLOR, 'gray': GRAY, 'bilevel': BILEVEL}  # color_mode -> forced class
+SCAN_COVERAGE = 0.8  # A page is a scan if one image covers at least this share of it
+MAX_DPI = 300        # Pages are classified once at this dpi (text turns gray when coarse); bilevel
+                     # pages render at twice the level's dpi, up to this
+
+def choose(analysis, doc, requested='auto'):
+    """
+    Strategy for one compress job: 'images' (re-encode image xrefs) or
+    'rasterize' (one rendered image per page). With 'auto' only documents
+    PDFAnalyzer reports as scanned, with every page covered by an image,
+    are rasterized; OCR'd scans have a text layer, so ask for 'rasterize'.
+    """
+    if requested not in STRATEGIES:
+        raise Exception(f"Unknown compress strategy {requested!r} (use {', '.join(STRATEGIES)})")
+    if requested != 'auto':
+        return requested
+    if not analysis or not analysis.get('is_scanned'):
+        return 'images'
+    return 'rasterize' if is_scan(doc) else 'images'
+
+def is_scan(doc):
+    """Every page mostly covered by a single image"""
+    for page in doc:
+        bounds = fitz.Rect(0, 0, page.cropbox.width, page.cropbox.height)  # Image bboxes ignore /Rotate
+        area = abs(bounds)
+        covered = max((abs(fitz.Rect(info['bbox']) & bounds) for info in page.get_image_info()), default=0)
+        if not area or covered < SCAN_COVERAGE * area:
+            return False
+    return True
+
+class PageRasterizer:
+    """
+    Scans stored as one image per page: each page is rendered at the level's
+    dpi, classified (core/image_codecs.py) and encoded with the codec of its
+    class, then drawn under what's left of the page once its images and line
+    art are removed. Page boxes, rotation, text, annotations, links and
+    outlines are those of the input; the text is made invisible (render
+    mode 3, as an OCR layer is), since the image already shows it.
+
+    Pages render in worker processes (MuPDF isn't thread-safe), each with its
+    own copy of the document; with one worker they render in this process.
+    Either way the bytes are the same.
+    """
+
+    def __init__(self, data, workers=1, color_mode='auto'):
+        if color_mode not in COLOR_MODES:
+            raise Exception(f"Unknown color mode {color_mode!r} (use {', '.join(COLOR_MODES)})")
+        self.data = data
+        self.workers = workers
+        self.color_mode = color_mode
+        self.kinds = {}   # Page number -> content class, from its first render (or color_mode)
+        if COLOR_MODES[color_mode]:
+            with fitz.open(stream=data, filetype='pdf') as doc:
+                self.kinds = dict.fromkeys(range(len(doc)), COLOR_MODES[color_mode])
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def render(self, q, dpi, fixed_dpi=False):
+        """PDF bytes with every page replaced by its render at (q, dpi); bilevel pages get more dpi unless fixed_dpi"""
+        with fitz.open(stream=self.data, filetype='pdf') as doc:
+            jobs = [(pno, q, dpi, fixed_dpi, self.kinds.get(pno)) for pno in range(len(doc))]
+            progress.phase('rasterize', total=len(jobs), unit='pages')
+            pages = {}
+            for done, (pno, kind, out) in enumerate(self._map(jobs), 1):
+                governor.check()
+                pages[pno] = out
+                if kind is not None:
+                    self.kinds.setdefault(pno, kind)
+                progress.step(done)
+            with stage('rasterize.rebuild'):
+                for pno, page in enumerate(doc):
+                    if pages.get(pno) is not None:
+                        self._replace(doc, page, pages[pno])
+                return doc.tobytes(garbage=4, deflate=True, clean=True, use_objstms=1)
+
+    def _map(self, jobs):
+        if self.workers <= 1 or len(jobs) <= 1:
+            _init_worker(self.data, detach=False)
+            try:
+                for job in jobs:
+                    yield _render_page(job)
+            finally:
+                _init_worker(None, detach=False)
+            return
+        if self._pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+            self._pool = ctx.Pool(min(self.workers, len(jobs)), initializer=_init_worker, initargs=(self.data,))
+        yield from self._pool.imap_unordered(_render_page, jobs)
+
+    @staticmethod
+    def _replace(doc, page, out):
+        rotation = page.rotation
+        page.set_rotation(0)  # Render and placement both in unrotated page space
+        links = page.get_links()  # Redaction drops the links it covers
+        page.add_redact_annot(page.rect)
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_REMOVE,
+                              graphics=fitz.PDF_REDACT_LINE_ART_REMOVE_IF_TOUCHED,
+                              text=fitz.PDF_REDACT_TEXT_NONE)
+        for i, contents in enumerate(page.get_contents()):
+            # Text state carries over from stream to stream: one 3 Tr up front covers them all
+            doc.update_stream(contents, hide_text(doc.xref_stream(contents), first=i == 0))
+        xref = doc.get_new_xref()
+        doc.update_object(xref, '<</Type/XObject/Subtype/Image>>')
+        doc.update_stream(xref, out.data, compress=False)
+        for key, value in out.keys():
+            doc.xref_set_key(xref, key, value)
+        page.insert_image(page.rect, xref=xref, keep_proportion=False, overlay=False)
+        for link in links:
+            page.insert_link(link)
+        page.set_rotation(rotation)
+
+# --- content streams ---
+
+_SPACE = b' \t\r\n\f\x00'
+_DELIMITERS = b'()<>[]{}/%'
+
+def hide_text(stream, first=True):
+    """
+    A content stream with every text render mode set to 3 (invisible):
+    each Tr operand becomes 3, and with first a 3 Tr goes in front, for
+    text that never sets a mode (Tr is graphics state, so q / Q and forms
+    drawn from here inherit it). Searchable and selectable, never drawn.
+    """
+    out = bytearray(b'3 Tr\n' if first else b'')
+    i, n, done = 0, len(stream), 0
+    operand = None  # (start, end) of the last token, if a number
+    while i < n:
+        c = stream[i]
+        if c in _SPACE:
+            i += 1
+            continue
+        start = i
+        if c == 0x25:    # % comment
+            while i < n and stream[i] not in b'\r\n':
+                i += 1
+        elif c == 0x28:  # (string), balanced parentheses, backslash escapes
+            depth = 0
+            while i < n:
+                if stream[i] == 0x5c:
+                    i += 2
+                    continue
+                depth += {0x28: 1, 0x29: -1}.get(stream[i], 0)
+                i += 1
+                if depth == 0:
+                    break
+        elif stream.startswith(b'<<', i) or stream.startswith(b'>>', i):
+            i += 2
+        elif c == 0x3c:  # <hex string>
+            end = stream.find(b'>', i)
+            i = n if end < 0 else end + 1
+        elif c in b'[]{})>':
+            i += 1
+        else:            # /name, number or operator
+            i += 1
+            while i < n and stream[i] not in _SPACE and stream[i] not in _DELIMITERS:
+                i += 1
+            token = stream[start:i]
+            if token == b'Tr' and operand is not None:
+                out += stream[done:operand[0]] + b'3'
+                done = operand[1]
+            elif token == b'BI':
+                # Inline image: its data is binary, skip to the EI after ID
+                data = stream.find(b'ID', i)
+                end = stream.find(b'EI', data + 3) if data >= 0 else -1
+                while end >= 0 and not (stream[end - 1] in _SPACE and (end + 2 == n or stream[end + 2] in _SPACE)):
+                    end = stream.find(b'EI', end + 2)
+                i = n if end < 0 else end + 2
+            operand = (start, i) if token[:1] in b'+-.0123456789' else None
+            continue
+        operand = None
+    return bytes(out + stream[done:])
+
+# --- worker processes ---
+
+_doc = None  # The worker's own copy of the document
+
+def _init_worker(data, detach=True):
+    global _doc
+    if detach:
+        # Reporting and profiling belong to the parent; a forked copy would write into the same stream
+        progress.detach()
+        profiler.detach()
+    if _doc is not None:
+        _doc.close()
+    _doc = fitz.open(stream=data, filetype='pdf') if data is not None else None
+
+def _pixels(page, dpi, mode):
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if mode == 'L' else fitz.csRGB, alpha=False, annots=False)
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+def _render_page(job):
+    """(page number, class, EncodedImage) of one page at (q, dpi); classified first if kind is None"""
+    pno, q, dpi, fixed_dpi, kind = job
+    try:
+        page = _doc[pno]
+        page.set_rotation(0)
+        with stage('rasterize.render'):
+            img = None
+            if kind is None:
+                img = _pixels(page, MAX_DPI, 'RGB')
+                kind = classify(img)[0]
+            mode = 'RGB' if kind in (COLOR, PALETTE) else 'L'
+            if kind == BILEVEL and not fixed_dpi:
+                # Text scans lose legibility long before they gain bytes: 1-bit pixels are cheap
+                dpi = max(dpi, min(dpi * 2, MAX_DPI))
+            if img is None or dpi != MAX_DPI:
+                img = _pixels(page, dpi, mode)
+            elif img.mode != mode:
+                img = img.convert(mode)
+        colors = None
+        if kind == PALETTE:
+            colors = img.getcolors(MAX_COLORS)
+            if colors is None:
+                kind = COLOR  # Classified at MAX_DPI; more colours at this one
+        return pno, kind, encode(img, kind, q, colors)
+    except Exception:
+        return pno, None, None
@@ -0,0 +1,238 @@
+import os
+import time
+import importlib
+
+class ToolSpec:
+    """
+    One engine tool. The entry point is a 'module:function' string that is only
+    imported when the tool actually runs, so `analyze` never pays for pdf2docx.
+
+    params maps a --params key to (type, default). Declared keys are coerced and
+    defaulted before the entry point sees them; a value that can't be coerced
+    gets the default, as main.py treated bad params before the registry.
+    Undeclared keys pass through.
+
+    batch is the per-file output extension used by --batch ('.pdf', '.docx'),
+    '/' for tools that write a directory, or None if the tool can't be batched.
+
+    cache=False keeps a tool out of the result cache (core/cache.py); metrics=False
+    keeps its jobs out of the metrics store (core/metrics.py).
+    """
+
+    def __init__(self, name, entry, usage=None, inputs=False, output=False, params=None, description='', batch=None, cache=True, metrics=True):
+        self.name = name
+        self.entry = entry
+        self.usage = usage
+        self.inputs = inputs
+        self.output = output
+        self.params = params or {}
+        self.description = description
+        self.batch = batch
+        self.cache = cache
+        self.metrics = metrics
+        self._func = None
+
+    def load(self):
+        if self._func is None:
+            module_name, func_name = self.entry.split(':')
+            self._func = getattr(importlib.import_module(module_name), func_name)
+        return self._func
+
+    def check_args(self, args):
+        if (self.inputs and not args.inputs) or (self.output and not args.output):
+            raise Exception(self.usage or f"{self.name} is missing required arguments")
+
+    def resolve_params(self, raw):
+        params = dict(raw or {})
+        for key, (kind, default) in self.params.items():
+            value = params.get(key)
+            if value is None:
+                params[key] = default
+                continue
+            try:
+                if kind is bool and isinstance(value, str):
+                    value = value.strip().lower() in ('1', 'true', 'yes', 'on')
+                elif kind in (list, dict):
+                    if not isinstance(value, kind):
+                        raise TypeError
+                else:
+                    value = kind(value)
+            except (TypeError, ValueError):
+                value = default
+            params[key] = value
+        return params
+
+    def execute(self, args, params):
+        """
+        Call the entry point with resolved params under the job's resource limits
+        (core/governor.py), profiled with --profile and recorded in the metrics store.
+        A tripped limit turns the result into {"status": "aborted", "reason": ...}.
+        """
+        from core import governor
+        start = time.perf_counter()
+        started_at = time.time()
+        result = None
+        reporter = self._start_progress(args)
+        limits = governor.start(args)
+        try:
+            try:
+                result = self._profiled(args, params)
+            finally:
+                governor.finish()
+            if limits.reason is not None:
+                # The tool caught the JobAborted itself and reported a plain error
+                result = self._aborted(limits, args, started_at)
+        except MemoryError:
+            if not limits.mem_limit_mb:
+                raise
+            limits.reason = 'memory'
+            limits.message = f"Job ran out of memory under the {limits.mem_limit_mb:g} MB limit"
+            result = self._aborted(limits, args, started_at)
+        except Exception:
+            if limits.reason is None:
+                raise
+            result = self._aborted(limits, args, started_at)
+        finally:
+            from core.metrics import job_status, record_job
+            if reporter is not None:
+                from core import progress
+                progress.finish(job_status(result))
+            if self.metrics:
+                record_job(self.name, args, result, time.perf_counter() - start)
+        return result
+
+    def _aborted(self, limits, args, started_at):
+        """Aborted-job result; drops the partial output file this job wrote"""
+        output = getattr(args, 'output', None)
+        try:
+            if output and os.path.isfile(output) and os.path.getmtime(output) >= started_at:
+                os.remove(output)
+        except OSError:
+            pass
+        return limits.aborted_result(self.name)
+
+    def _start_progress(self, args):
+        """Begin NDJSON progress events if --progress is set (see core/progress.py)"""
+        target = getattr(args, 'progress', None)
+        if not target:
+            return None
+        from core import progress
+        inputs = getattr(args, 'inputs', None) or []
+        return progress.start(target, self.name, job_id=getattr(args, 'job_id', None),
+                              input_path=inputs[0] if len(inputs) == 1 else None)
+
+    def _profiled(self, args, params):
+        if not getattr(args, 'profile', False):
+            return self._call(args, params)
+
+        from core import profiler
+        profiler.start()
+        try:
+            result = self._call(args, params)
+        finally:
+            report = profiler.finish()
+        result['profile'] = report
+        return result
+
+    def _call(self, args, params):
+        """Entry point call, going through the result cache if enabled"""
+        func = self.load()
+        if self.cache:
+            from core.cache import ResultCache, cache_enabled
+            if cache_enabled(args):
+                try:
+                    cache = ResultCache(getattr(args, 'cache_dir', None), debug=args.debug)
+                except OSError:
+                    cache = None  # Unwritable cache dir: run uncached
+                if cache is not None:
+                    return cache.run(self, args, params, func)
+        return func(args, params)
+
+    def run(self, args, raw_params=None):
+        self.check_args(args)
+        from core.streams import check_streams
+        # Tools that write a directory of files can't send them down one pipe
+        check_streams(args, allow_output=self.batch != '/')
+        return self.execute(args, self.resolve_params(raw_params))
+
+TOOLS = {}
+
+def register(name, entry, **kwargs):
+    TOOLS[name] = ToolSpec(name, entry, **kwargs)
+    return TOOLS[name]
+
+def get_tool(name):
+    return TOOLS.get(name)
+
+register('test', 'core.entrypoints:run_test',
+         description='Health check', cache=False, metrics=False)
+
+register('stats', 'core.entrypoints:run_stats',
+         params={'format': (str, 'prometheus'), 'window_minutes': (float, None)},
+         description='Latency/throughput per tool from the metrics store',
+         cache=False, metrics=False)
+
+register('analyze', 'core.entrypoints:run_analyze',
+         usage="Analyze requires --inputs", inputs=True,
+         description='Page count of a PDF')
+
+register('preview', 'core.entrypoints:run_preview',
+         usage="Preview requires --inputs", inputs=True,
+         params={'page': (int, 0), 'width': (int, 300)},
+         description='Base64 PNG thumbnail of one page')
+
+register('merge', 'core.entrypoints:run_merge',
+         usage="Merge requires --inputs and --output", inputs=True, output=True,
+         params={'order': (list, None), 'normalize': (bool, False), 'paperSize': (str, 'a4'),
+                 'orientation': (str, 'portrait'), 'blankPage': (bool, False),
+                 'pageNumbers': (bool, False), 'toc': (bool, False)},
+         description='Merge PDFs in order')
+
+register('split', 'core.entrypoints:run_split',
+         usage="Split requires --inputs and --output", inputs=True, output=True,
+         params={'range': (str, '1-end'), 'pageNumbers': (bool, False)},
+         description='Extract a page range',
+         batch='.pdf')
+
+register('compress', 'core.entrypoints:run_compress',
+         usage="Compress requires --inputs and --output", inputs=True, output=True,
+         params={'target_size_kb': (float, None), 'quality': (str, 'medium'), 'image_workers': (int, None),
+                 'concurrent_tiers': (bool, False), 'backend': (str, 'auto'), 'strategy': (str, 'auto'),
+                 'raster_dpi': (int, None), 'color_mode': (str, 'auto')},
+         description='Reduce file size to a target',
+         batch='.pdf')
+
+register('estimate', 'core.entrypoints:run_estimate',
+         usage="Estimate requires --inputs", inputs=True,
+         params={'budget_ms': (float, None)},
+         description='Predicted compressed size per quality level')
+
+register('pipeline', 'core.entrypoints:run_pipeline',
+         usage="Pipeline requires --inputs, --output and params.steps", inputs=True, output=True,
+         params={'steps': (list, None)},
+         description='Chain imageToPdf/merge/split/pageNumbers/compress/protect in memory')
+
+register('image-to-pdf', 'core.entrypoints:run_image_to_pdf',
+         usage="Image-to-PDF requires --inputs and --output", inputs=True, output=True,
+         params={'pages': (list, None), 'pageSize': (str, 'a4'), 'orientation': (str, 'portrait'),
+                 'fit': (str, 'fit')},
+         description='Build a PDF from images')
+
+register('pdf-to-image', 'core.entrypoints:run_pdf_to_image',
+         usage="Pdf-to-Image requires --inputs and --output (directory)", inputs=True, output=True,
+         params={'format': (str, 'jpg'), 'dpi': (int, 150), 'color': (str, 'color'), 'pages': (str, 'all')},
+         description='Render pages to image files',
+         batch='/')
+
+register('pdf-to-word', 'core.entrypoints:run_pdf_to_word',
+         usage="Pdf-to-Word requires --inputs and --output", inputs=True, output=True,
+         params={'pages': (str, 'all')},
+         description='Convert to DOCX with pdf2docx',
+         batch='.docx')
+
+register('protect', 'core.entrypoints:run_protect',
+         usage="Protect requires --inputs and --output", inputs=True, output=True,
+         params={'user_password': (str, None), 'owner_password': (str, None),
+                 'permissions': (dict, None), 'encryption': (str, 'AES-256')},
+         description='Encrypt with passwords and permissions',
+         batch='.pdf')
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+
+from core.utils import FileLock
+
+DEFAULT_SCRATCH_DIR = os.path.join(tempfile.gettempdir(), 'pdf-baba-scratch')
+DEFAULT_MEMORY_MB = 256
+DEFAULT_QUOTA_MB = 2048
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # Exists but belongs to someone else
+    return True
+
+class Scratch:
+    """
+    Intermediate candidates of one job (e.g. the PDF bytes of each compress
+    pass). A candidate stays in memory while the job holds less than
+    memory_mb (PDF_ENGINE_SCRATCH_MEM_MB); beyond that it is spilled to a
+    file in a per-job directory under PDF_ENGINE_SCRATCH_DIR. Spill files of
+    all jobs together are kept under quota_mb (PDF_ENGINE_SCRATCH_QUOTA_MB).
+
+    close() - or leaving the with block, exception or not - deletes whatever
+    the job spilled. Directories left behind by a process that died are swept
+    the next time any job spills.
+    """
+
+    def __init__(self, memory_mb=None, quota_mb=None, scratch_dir=None):
+        self.memory_bytes = int(float(memory_mb or os.environ.get('PDF_ENGINE_SCRATCH_MEM_MB') or DEFAULT_MEMORY_MB) * 1024 * 1024)
+        self.quota_bytes = int(float(quota_mb or os.environ.get('PDF_ENGINE_SCRATCH_QUOTA_MB') or DEFAULT_QUOTA_MB) * 1024 * 1024)
+        self.scratch_dir = scratch_dir or os.environ.get('PDF_ENGINE_SCRATCH_DIR') or DEFAULT_SCRATCH_DIR
+        self.job_dir = None
+        self._items = {}   # key -> bytes (in memory) or file path (spilled)
+        self._sizes = {}
+        self._in_memory = 0
+        self._next = 0
+        self.spilled = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- candidates ---
+
+    def put(self, data):
+        """Keep data; returns a key for get() / drop()"""
+        key = self._next
+        self._next += 1
+        if self._in_memory + len(data) <= self.memory_bytes:
+            self._items[key] = data
+            self._in_memory += len(data)
+        else:
+            self._items[key] = self._spill(key, data)
+        self._sizes[key] = len(data)
+        return key
+
+    def get(self, key):
+        item = self._items[key]
+        if isinstance(item, str):
+            with open(item, 'rb') as f:
+                return f.read()
+        return item
+
+    def drop(self, key):
+        item = self._items.pop(key, None)
+        size = self._sizes.pop(key, 0)
+        if isinstance(item, str):
+            try:
+                os.remove(item)
+            except OSError:
+                pass
+        elif item is not None:
+            self._in_memory -= size
+
+    def close(self):
+        self._items.clear()
+        self._sizes.clear()
+        self._in_memory = 0
+        if self.job_dir:
+            shutil.rmtree(self.job_dir, ignore_errors=True)
+            self.job_dir = None
+
+    # --- spill area ---
+
+    def _spill(self, key, data):
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        with FileLock(os.path.join(self.scratch_dir, 'lock')):
+            if self.job_dir is None:
+                self._sweep()
+                self.job_dir = tempfile.mkdtemp(prefix=f'job_{os.getpid()}_', dir=self.scratch_dir)
+            used = self._usage()
+            if used + len(data) > self.quota_bytes:
+                raise Exception(f"Scratch space quota of {self.quota_bytes / (1024 * 1024):g} MB "
+                                f"exceeded ({used / (1024 * 1024):.0f} MB in use)")
+            path = os.path.join(self.job_dir, f'{key}.bin')
+            with open(path, 'wb') as f:
+                f.write(data)
+        self.spilled += 1
+        return path
+
+    def _usage(self):
+        total = 0
+        for root, _, files in os.walk(self.scratch_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _sweep(self):
+        """Remove job directories whose process is gone (caller holds the lock)"""
+        for name in os.listdir(self.scratch_dir):
+            parts = name.split('_')
+            if len(parts) < 3 or parts[0] != 'job' or not parts[1].isdigit():
+                continue
+            if not _pid_alive(int(parts[1])):
+                shutil.rmtree(os.path.join(self.scratch_dir, name), ignore_errors=True)
@@ -0,0 +1,354 @@
+import os
+import sys
+import json
+import queue
+import signal
+import importlib
+import threading
+import multiprocessing
+
+from core.utils import current_rss_mb
+
+# Modules the worker imports once at startup so jobs don't pay for them.
+# Missing optional ones (e.g. pdf2docx on a dev box) are simply skipped.
+PRELOAD_MODULES = [
+    'fitz',
+    'PIL.Image',
+    'pypdf',
+    'core.analyzer',
+    'core.compressor',
+    'tools.merge.merger',
+    'tools.merge.preview',
+    'tools.split.splitter',
+    'tools.convert.image_to_pdf',
+    'tools.convert.pdf_to_image',
+    'tools.convert.pdf_to_word',
+    'tools.security.protector',
+    'tools.pipeline.pipeline',
+]
+
+def _worker_loop(conn, job_runner, debug=False, cancelled=None):
+    """
+    Worker process: preload modules, then run jobs until told to stop. Jobs
+    arrive as (seq, job); cancelled holds the seq of the last job the
+    supervisor cancelled, so a SIGUSR1 is only acted on for the job it was
+    meant for, however early or late it lands.
+    """
+    # stdout belongs to the protocol in stdio mode, stray prints go to stderr
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    from core import governor
+    current = None  # seq of the job in hand
+
+    def on_cancel(signum, frame):
+        # The running job's governor takes SIGUSR1 itself (core/governor.py); until it is up
+        # the cancel is deferred to it
+        if current is not None and cancelled is not None and cancelled.value == current:
+            governor.defer_cancel()
+
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, on_cancel)
+        # Blocked by the supervisor from before the fork until the handler is in place
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGUSR1})
+
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            if debug:
+                print(f"[serve] preload {name} failed: {e}", file=sys.stderr)
+
+    fitz = sys.modules.get('fitz')
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        current, job = message
+        if cancelled is not None and cancelled.value == current:
+            governor.defer_cancel()  # Signalled while the job was still in the pipe
+        try:
+            result = job_runner(job)
+        finally:
+            current = None
+            governor.discard_cancel()
+
+        # Drop MuPDF's cached objects between jobs so the store doesn't creep up
+        if fitz is not None:
+            try:
+                fitz.TOOLS.store_shrink(100)
+            except Exception:
+                pass
+
+        conn.send((result, current_rss_mb()))
+
+    conn.close()
+
+def _parse(line):
+    """The JSON object on a request line, None if it isn't one"""
+    try:
+        job = json.loads(line)
+    except ValueError:
+        return None
+    return job if isinstance(job, dict) else None
+
+class EngineServer:
+    """
+    Long-lived engine. A supervisor reads newline-delimited JSON jobs and hands
+    them to a single pre-warmed worker process. The worker is replaced after
+    max_jobs jobs or once its RSS passes max_rss_mb, so MuPDF heap growth
+    never accumulates for long.
+    """
+
+    def __init__(self, job_runner, max_jobs=200, max_rss_mb=1024, debug=False):
+        self.job_runner = job_runner
+        self.max_jobs = max(1, int(max_jobs))
+        self.max_rss_mb = max_rss_mb
+        self.debug = debug
+
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        self._lock = threading.Lock()
+        self._worker = None
+        self._conn = None
+        self._jobs_done = 0
+        self._seq = 0
+        self._current = None      # (id, seq) of the job on the worker
+        self._cancelled = None    # Shared with the worker: seq of the last cancelled job
+        self._pending_lock = threading.Lock()
+        self._queued = set()      # Ids of jobs read but not yet on the worker
+        self._cancel_queued = set()  # ... and those of them cancelled before they started
+        self.recycled = 0
+
+    def _log(self, message):
+        if self.debug:
+            print(f"[serve] {message}", file=sys.stderr)
+
+    def _start_worker(self):
+        # Not a daemon process: batch jobs need to start their own process pool
+        parent_conn, child_conn = self._ctx.Pipe()
+        self._cancelled = self._ctx.Value('q', 0, lock=False)
+        worker = self._ctx.Process(
+            target=_worker_loop,
+            args=(child_conn, self.job_runner, self.debug, self._cancelled)
+        )
+        # A cancel can follow the first job at once: the worker starts with SIGUSR1
+        # blocked and unblocks it once its handler is installed
+        block = hasattr(signal, 'pthread_sigmask') and hasattr(signal, 'SIGUSR1')
+        if block:
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+        try:
+            worker.start()
+        finally:
+            if block:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGUSR1})
+        child_conn.close()
+        self._worker = worker
+        self._conn = parent_conn
+        self._jobs_done = 0
+        self._log(f"worker {worker.pid} started")
+
+    def _stop_worker(self, kill=False):
+        if self._worker is None:
+            return
+        try:
+            if not kill:
+                self._conn.send(None)
+            self._worker.join(timeout=0 if kill else 10)
+        except Exception:
+            pass
+        if self._worker.is_alive():
+            self._worker.kill()
+            self._worker.join()
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._log(f"worker {self._worker.pid} stopped")
+        self._worker = None
+        self._conn = None
+
+    def submit(self, job):
+        """Run one job on the worker and return its result dict"""
+        if not isinstance(job, dict):
+            return {"status": "error", "message": "Job must be a JSON object"}
+
+        self.enqueue(job)
+        with self._lock:
+            if self._start(job):
+                return {"status": "aborted", "tool": job.get('tool'), "reason": "cancelled",
+                        "message": "Job was cancelled", "id": job['id']}
+            if self._worker is None:
+                self._start_worker()
+            self._seq += 1
+            self._current = (job.get('id'), self._seq)
+            try:
+                self._conn.send((self._seq, job))
+                result, rss_mb = self._conn.recv()
+            except (EOFError, OSError):
+                # Worker died mid-job (segfault, OOM kill) - report it and start fresh next time
+                if self._worker is not None:
+                    self._worker.join(timeout=1)  # Reap it, or there is no exit code yet
+                code = self._worker.exitcode if self._worker else None
+                self._stop_worker(kill=True)
+                result, rss_mb = {"status": "error", "message": f"Engine worker crashed (exit code {code})"}, 0
+            finally:
+                self._current = None
+
+            if self._worker is not None:
+                self._jobs_done += 1
+                if self._jobs_done >= self.max_jobs or (self.max_rss_mb and rss_mb >= self.max_rss_mb):
+                    self._log(f"recycling after {self._jobs_done} jobs, rss {rss_mb:.0f} MB")
+                    self._stop_worker()
+                    self.recycled += 1
+                    # Warm the replacement now rather than on the next request
+                    self._start_worker()
+
+        if 'id' in job:
+            result = dict(result, id=job['id'])
+        return result
+
+    def enqueue(self, job):
+        """Note a job read but not started yet, so a cancel that overtakes it still applies"""
+        if isinstance(job, dict) and job.get('id') is not None:
+            with self._pending_lock:
+                self._queued.add(job['id'])
+
+    def _start(self, job):
+        """Take job off the queue; True if it was cancelled while waiting"""
+        job_id = job.get('id')
+        with self._pending_lock:
+            self._queued.discard(job_id)
+            if job_id in self._cancel_queued:
+                self._cancel_queued.discard(job_id)
+                return True
+        return False
+
+    def cancel(self, job_id):
+        """
+        Abort the running job if its id matches, or drop a queued one before
+        it starts. Doesn't take the job lock, so another socket connection can
+        cancel a job in flight; the job then returns {"status": "aborted",
+        "reason": "cancelled"}.
+        """
+        with self._pending_lock:
+            if job_id is not None and job_id in self._queued:
+                self._cancel_queued.add(job_id)
+                return {"status": "success", "cancelled": True, "id": job_id}
+        worker, current, cancelled = self._worker, self._current, self._cancelled
+        if (job_id is None or current is None or job_id != current[0] or worker is None
+                or not hasattr(signal, 'SIGUSR1')):
+            return {"status": "error", "message": f"No running job with id {job_id!r}", "id": job_id}
+        cancelled.value = current[1]
+        try:
+            os.kill(worker.pid, signal.SIGUSR1)
+        except OSError as e:
+            return {"status": "error", "message": str(e), "id": job_id}
+        return {"status": "success", "cancelled": True, "id": job_id}
+
+    def handle_line(self, line):
+        """Decode one NDJSON request line and return the encoded response (or None for blank lines)"""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            return json.dumps({"status": "error", "message": f"Invalid job JSON: {e}"})
+        if isinstance(job, dict) and 'cancel' in job:
+            return json.dumps(self.cancel(job['cancel']))
+        return json.dumps(self.submit(job))
+
+    def close(self):
+        with self._lock:
+            self._stop_worker()
+
+    def _exit_on_sigterm(self):
+        # The API stops us with SIGTERM; unwind normally so the worker and socket get cleaned up
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    def serve_stdio(self):
+        """
+        One job per stdin line, one result per stdout line, until EOF. Jobs
+        run in order on a thread of their own, so stdin is still read while
+        one runs: a cancel line is answered (and the job aborted) at once, its
+        response written ahead of the job's.
+        """
+        self._exit_on_sigterm()
+        with self._lock:
+            self._start_worker()
+        lines = queue.Queue()
+        write_lock = threading.Lock()
+
+        def write(response):
+            if response is not None:
+                with write_lock:
+                    sys.stdout.write(response + "\n")
+                    sys.stdout.flush()
+
+        def run_jobs():
+            for line in iter(lines.get, None):
+                write(self.handle_line(line))
+
+        runner = threading.Thread(target=run_jobs, name='serve-jobs', daemon=True)
+        runner.start()
+        finished = False
+        try:
+            for line in sys.stdin:
+                job = _parse(line)
+                if job is not None and 'cancel' in job:
+                    write(self.handle_line(line))
+                else:
+                    self.enqueue(job)
+                    lines.put(line)
+            finished = True
+        except KeyboardInterrupt:
+            pass
+        finally:
+            lines.put(None)
+            if finished:
+                # EOF: answer every job already read, then stop the worker cleanly
+                runner.join()
+                self.close()
+            else:
+                # Interrupted mid-job: the runner holds the job lock, so don't wait for it
+                self._stop_worker(kill=True)
+
+    def serve_socket(self, socket_path):
+        """Same protocol over a Unix socket; connections share the one worker"""
+        import socketserver
+
+        server = self
+        self._exit_on_sigterm()
+
+        class JobHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    response = server.handle_line(raw.decode('utf-8', errors='replace'))
+                    if response is not None:
+                        self.wfile.write((response + "\n").encode('utf-8'))
+                        self.wfile.flush()
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        # Warm up before accepting connections
+        with self._lock:
+            self._start_worker()
+
+        listener = socketserver.ThreadingUnixStreamServer(socket_path, JobHandler)
+        listener.daemon_threads = True
+        self._log(f"listening on {socket_path}")
+        try:
+            listener.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.server_close()
+            self.close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
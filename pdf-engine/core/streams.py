@@ -0,0 +1,128 @@
+"""
+Pipe I/O for --inputs / --output. Besides file paths the engine accepts '-'
+(stdin for inputs, stdout for the output) and 'fd:N' (an inherited file
+descriptor), so the API can stream documents through the engine without
+writing them to uploads/ and reading them back.
+
+Tools open and save through the helpers here instead of calling fitz.open()
+or doc.save() on the path directly; for plain paths they behave exactly like
+those calls.
+"""
+import io
+import os
+import sys
+from contextlib import contextmanager
+
+_inputs = {}
+_stdout_fd = None
+
+def is_stream(path):
+    return isinstance(path, str) and (path == '-' or path.startswith('fd:'))
+
+def _fd(spec, default):
+    if spec == '-':
+        return default
+    try:
+        return int(spec[3:])
+    except ValueError:
+        raise Exception(f"Invalid stream {spec!r} (use '-' or 'fd:N')")
+
+def claim_stdout():
+    """
+    Reserve the real stdout for document bytes. Anything else that prints to
+    stdout (debug output, library warnings, the result JSON) goes to stderr.
+    """
+    global _stdout_fd
+    if _stdout_fd is None:
+        sys.stdout.flush()
+        _stdout_fd = os.dup(1)
+        os.dup2(2, 1)
+        sys.stdout = sys.stderr
+    return _stdout_fd
+
+# --- inputs ---
+
+def read_input(path):
+    """All bytes of a stream input; read once per process, later calls reuse them"""
+    if path not in _inputs:
+        fd = _fd(path, 0)
+        chunks = []
+        while True:
+            chunk = os.read(fd, 1024 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        _inputs[path] = b''.join(chunks)
+    return _inputs[path]
+
+def read_bytes(path):
+    """Whole input as bytes, from a file or a stream"""
+    if is_stream(path):
+        return read_input(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+def input_size(path):
+    return len(read_input(path)) if is_stream(path) else os.path.getsize(path)
+
+def open_pdf(path, filetype='pdf'):
+    """fitz.open() for a path or a stream input"""
+    import fitz
+    if is_stream(path):
+        return fitz.open(stream=read_input(path), filetype=filetype)
+    return fitz.open(path)
+
+def open_binary(path):
+    """Something PdfReader / PIL can read: the path itself, or a BytesIO over the stream"""
+    return io.BytesIO(read_input(path)) if is_stream(path) else path
+
+# --- output ---
+
+def write_output(path, data):
+    """Write bytes to a file path or an output stream; returns the byte count"""
+    if is_stream(path):
+        fd = _fd(path, None)
+        if fd is None or fd == 1:
+            fd = claim_stdout()
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    else:
+        with atomic(path) as partial:
+            with open(partial, 'wb') as f:
+                f.write(data)
+    return len(data)
+
+def save_pdf(doc, path, **options):
+    """doc.save(path, **options), or doc.tobytes(**options) into an output stream; returns the size"""
+    if is_stream(path):
+        return write_output(path, doc.tobytes(**options))
+    with atomic(path) as partial:
+        doc.save(partial, **options)
+    return os.path.getsize(path)
+
+@contextmanager
+def atomic(path):
+    """
+    Write to a hidden partial file next to path and rename it into place, so
+    readers never see a half-written output; the partial file is removed if
+    the write fails.
+    """
+    partial = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{os.getpid()}.part')
+    try:
+        yield partial
+        os.replace(partial, path)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+
+def check_streams(args, allow_output=True):
+    """Reject stream specs where they can't work (stdin twice, a directory output)"""
+    inputs = [p for p in (getattr(args, 'inputs', None) or []) if is_stream(p)]
+    if len(inputs) != len(set(inputs)):
+        raise Exception("Each input stream can only be read once")
+    if not allow_output and is_stream(getattr(args, 'output', None)):
+        raise Exception(f"{args.tool} writes a directory and can't use an output stream")
@@ -1,7 +1,18 @@
 import os
+import sys
 import shutil
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: no cross-process locking
+    fcntl = None
+
 def format_file_size(size_bytes):
     """Format file size in human readable format"""
     for unit in ['B', 'KB', 'MB', 'GB']:
@@ -27,3 +38,45 @@ def get_file_info(file_path):
         'created': stat.st_ctime,
         'modified': stat.st_mtime
     }
+
+def current_rss_mb():
+    """Resident set size of this process in MB (peak RSS if /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except Exception:
+        return peak_rss_mb()
+
+def usable_cpus():
+    """Cores this process may run on (respects container CPU affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def peak_rss_mb():
+    """High-water mark of this process's RSS in MB (0 where getrusage is unavailable)"""
+    if resource is None:
+        return 0.0
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class FileLock:
+    """Exclusive flock on path, shared by every engine process (no-op where fcntl is missing)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
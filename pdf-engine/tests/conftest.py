@@ -0,0 +1,66 @@
+"""
+Smoke tests for the engine. Documents are generated into tmp_path with the
+benchmark sample builder, and CLI runs go through main.py in a subprocess,
+the way the API calls the engine.
+
+    python -m pytest -q tests [--cold-start]
+"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ENGINE_DIR)
+
+from benchmarks.samples import make_sample_pdf
+
+def pytest_addoption(parser):
+    # Timings depend on the machine, so the cold-start budgets only run on request
+    parser.addoption('--cold-start', action='store_true', help='Check tool cold starts against their budgets')
+    parser.addoption('--cold-start-scale', type=float, default=1.0, help='Multiply the budgets (slow machines)')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'cold_start: timed cold-start budget (run with --cold-start)')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--cold-start'):
+        return
+    skip = pytest.mark.skip(reason='needs --cold-start')
+    for item in items:
+        if 'cold_start' in item.keywords:
+            item.add_marker(skip)
+
+@pytest.fixture(autouse=True)
+def engine_env(tmp_path, monkeypatch):
+    """Keep metrics and the result cache of every test inside its tmp_path"""
+    monkeypatch.setenv('PDF_ENGINE_METRICS', '0')
+    monkeypatch.setenv('PDF_ENGINE_CACHE_DIR', str(tmp_path / 'cache'))
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+    """Two pages of text and one photo each, big enough that compress has work to do"""
+    return make_sample_pdf(str(tmp_path / 'sample.pdf'), pages=2, image_size=(1200, 800))
+
+@pytest.fixture
+def text_pdf(tmp_path):
+    return make_sample_pdf(str(tmp_path / 'text.pdf'), pages=3, images=False)
+
+@pytest.fixture
+def run_engine():
+    """
+    run_engine(*argv, stdin=None, env=None, pass_fds=()) -> (CompletedProcess,
+    result dict): main.py with argv, the result being the last JSON line of
+    stdout, or of stderr when stdout carries the document.
+    """
+    def run(*argv, stdin=None, env=None, pass_fds=()):
+        proc = subprocess.run([sys.executable, os.path.join(ENGINE_DIR, 'main.py'), *argv],
+                              input=stdin, capture_output=True, cwd=ENGINE_DIR,
+                              env={**os.environ, **(env or {})}, pass_fds=pass_fds, timeout=120)
+        piped = '--output' in argv and argv[argv.index('--output') + 1] in ('-', 'fd:1')
+        stream = proc.stderr if piped else proc.stdout
+        lines = [line for line in stream.decode(errors='replace').splitlines() if line.startswith('{')]
+        return proc, json.loads(lines[-1]) if lines else None
+    return run
@@ -0,0 +1,40 @@
+import os
+import shutil
+
+import fitz  # PyMuPDF
+
+def test_batch_reports_each_input(run_engine, sample_pdf, text_pdf, tmp_path):
+    broken = tmp_path / 'broken.pdf'
+    broken.write_bytes(b'%PDF-1.4 not really')
+    other = tmp_path / 'other'
+    other.mkdir()
+    same_name = other / os.path.basename(text_pdf)
+    shutil.copy(text_pdf, same_name)
+    out_dir = tmp_path / 'out'
+
+    proc, result = run_engine('split', '--batch', '--workers', '2', '--inputs', text_pdf, str(broken), str(same_name),
+                              sample_pdf, '--output', str(out_dir), '--params', '{"range": "1-2"}')
+    assert proc.returncode == 0, proc.stderr.decode()
+    assert result['status'] == 'success' and result['batch']
+    assert result['stats']['total'] == 4 and result['stats']['succeeded'] == 3 and result['stats']['failed'] == 1
+    # Results in input order, each with its own output; the same name twice gets a suffix
+    assert [r['input'] for r in result['results']] == [text_pdf, str(same_name), sample_pdf]
+    stem = os.path.splitext(os.path.basename(text_pdf))[0]
+    assert [os.path.basename(r['output']) for r in result['results'][:2]] == [f'{stem}_pdfbaba.pdf', f'{stem}_2_pdfbaba.pdf']
+    for r in result['results']:
+        assert r['durationMs'] >= 0
+        with fitz.open(r['output']) as doc:
+            assert len(doc) == 2
+    assert result['failures'][0]['input'] == str(broken) and result['failures'][0]['message']
+
+def test_batch_with_every_input_failing(run_engine, tmp_path):
+    broken = tmp_path / 'broken.pdf'
+    broken.write_bytes(b'not a pdf')
+    proc, result = run_engine('split', '--batch', '--inputs', str(broken), '--output', str(tmp_path / 'out'))
+    assert result['status'] == 'error' and result['stats']['failed'] == 1
+    assert proc.returncode == 0  # Per-file failures are in the JSON, like any tool error
+
+def test_batch_needs_a_batch_tool(run_engine, text_pdf, tmp_path):
+    proc, result = run_engine('merge', '--batch', '--inputs', text_pdf, '--output', str(tmp_path / 'out'))
+    assert proc.returncode == 1
+    assert result['status'] == 'error' and 'does not support --batch' in result['message']
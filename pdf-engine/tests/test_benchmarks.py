@@ -0,0 +1,31 @@
+import os
+import sys
+import json
+import subprocess
+
+from conftest import ENGINE_DIR
+from benchmarks.bench_rate_distortion import compare
+from benchmarks.samples import make_sample_pdf
+
+def test_rate_distortion_on_a_tiny_sample(tmp_path):
+    corpus = tmp_path / 'corpus'
+    corpus.mkdir()
+    make_sample_pdf(str(corpus / 'tiny.pdf'), pages=1, image_size=(300, 200))
+    report = str(tmp_path / 'report.json')
+    proc = subprocess.run([sys.executable, os.path.join(ENGINE_DIR, 'benchmarks', 'bench_rate_distortion.py'),
+                           '--corpus', str(corpus), '--strategies', 'engine,legacy', '--dpi', '36', '--save', report],
+                          capture_output=True, cwd=ENGINE_DIR, timeout=300)
+    assert proc.returncode == 0, proc.stderr.decode()
+    assert 'corpus (1 files)' in proc.stdout.decode()
+
+    with open(report) as f:
+        records = json.load(f)['records']
+    assert {r['strategy'] for r in records} == {'engine', 'legacy'}
+    assert {r['file'] for r in records} == {'tiny.pdf', '(corpus)'}
+    assert all(0 < r['ssim'] <= 1 and r['bytes'] > 0 for r in records)
+    assert any(r['pareto'] for r in records if r['file'] == 'tiny.pdf')
+
+    # Against itself nothing regressed; against a baseline half the size everything did
+    assert compare(records, records) == []
+    smaller = [{**r, 'bytes': r['bytes'] // 2} for r in records]
+    assert len(compare(records, smaller)) == len(records)
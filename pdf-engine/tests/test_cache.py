@@ -0,0 +1,83 @@
+import os
+import json
+from types import SimpleNamespace
+
+from core.cache import ResultCache
+
+COMPRESS = SimpleNamespace(name='compress')
+
+def _args(inputs, output, target_size=60):
+    return SimpleNamespace(inputs=inputs, output=output, target_size=target_size, quality=None)
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+def _store(cache, tmp_path, name, size):
+    """Store a result whose output file is size bytes; returns its key"""
+    source = _write(tmp_path / f'{name}.pdf', name.encode())
+    output = _write(tmp_path / f'{name}_out.pdf', os.urandom(size))
+    key = cache.make_key(COMPRESS, _args([source], output), {})
+    cache.store(key, _args([source], output), {'status': 'success', 'output': output})
+    return key
+
+def test_key_follows_content_and_params(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    a = _write(tmp_path / 'a.pdf', b'one')
+    b = _write(tmp_path / 'b.pdf', b'one')
+    c = _write(tmp_path / 'c.pdf', b'two')
+    key = cache.make_key(COMPRESS, _args([a], 'out.pdf'), {'quality': 'medium'})
+    assert cache.make_key(COMPRESS, _args([b], 'elsewhere.pdf'), {'quality': 'medium'}) == key
+    assert cache.make_key(COMPRESS, _args([c], 'out.pdf'), {'quality': 'medium'}) != key
+    assert cache.make_key(COMPRESS, _args([a], 'out.pdf'), {'quality': 'high'}) != key
+    assert cache.make_key(COMPRESS, _args([a], 'out.pdf', target_size=90), {'quality': 'medium'}) != key
+
+def test_store_and_restore(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    source = _write(tmp_path / 'in.pdf', b'input')
+    output = _write(tmp_path / 'out.pdf', b'compressed bytes')
+    key = cache.make_key(COMPRESS, _args([source], output), {})
+    assert cache.lookup(key, _args([source], output)) is None
+    cache.store(key, _args([source], output), {'status': 'success', 'output': output, 'stats': {'x': 1}})
+
+    restore_dir = tmp_path / 'restore'
+    restore_dir.mkdir()
+    target = str(restore_dir / 'again.pdf')
+    result = cache.lookup(key, _args([source], target))
+    assert result['output'] == target
+    assert result['stats'] == {'x': 1}
+    with open(target, 'rb') as f:
+        assert f.read() == b'compressed bytes'
+    assert os.listdir(restore_dir) == ['again.pdf']  # No partial file left next to it
+
+def test_evicts_least_recently_used_over_the_cap(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_mb=0.25)
+    old = _store(cache, tmp_path, 'old', 100 * 1024)
+    new = _store(cache, tmp_path, 'new', 100 * 1024)
+    assert os.path.isdir(cache._entry_dir(old)) and os.path.isdir(cache._entry_dir(new))
+    newest = _store(cache, tmp_path, 'newest', 100 * 1024)
+    assert not os.path.exists(cache._entry_dir(old))
+    assert os.path.isdir(cache._entry_dir(new)) and os.path.isdir(cache._entry_dir(newest))
+    with open(cache.stats_path) as f:
+        assert json.load(f)['bytes'] <= cache.max_bytes
+
+def test_no_walk_under_the_cap(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / 'cache'), max_mb=10)
+    _store(cache, tmp_path, 'first', 1024)  # No recorded total yet: walks once
+    walks = []
+    monkeypatch.setattr(cache, 'evict', lambda: walks.append(1))
+    _store(cache, tmp_path, 'second', 1024)
+    _store(cache, tmp_path, 'third', 1024)
+    assert walks == []
+
+def test_compress_hit(run_engine, sample_pdf, tmp_path):
+    first, second = str(tmp_path / 'first.pdf'), str(tmp_path / 'second.pdf')
+    _, result = run_engine('compress', '--inputs', sample_pdf, '--output', first, '--target-size', '60')
+    assert result['status'] == 'success'
+    assert result['stats']['cache']['hit'] is False
+    _, result = run_engine('compress', '--inputs', sample_pdf, '--output', second, '--target-size', '60')
+    assert result['stats']['cache']['hit'] is True
+    assert result['output'] == second
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
@@ -0,0 +1,26 @@
+"""
+benchmarks/bench_cold_start.py as a test: forbidden imports on every run,
+import-time budgets with --cold-start (and --cold-start-scale on slow machines).
+"""
+import pytest
+
+from benchmarks.bench_cold_start import BUDGET_MS, FORBIDDEN, _tool_args, measure
+from benchmarks.samples import ensure_samples
+
+@pytest.fixture(scope='module')
+def samples(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('samples'))
+    ensure_samples(directory, names=('mixed.pdf', 'text_only.pdf'))
+    return directory
+
+@pytest.mark.parametrize('tool', sorted(FORBIDDEN))
+def test_no_forbidden_imports(tool, samples, tmp_path):
+    _, modules = measure(tool, _tool_args(tool, samples, str(tmp_path)), runs=1)
+    assert 'core.registry' in modules  # The tool actually ran
+    assert [m for m in FORBIDDEN[tool] if m in modules] == []
+
+@pytest.mark.cold_start
+@pytest.mark.parametrize('tool', sorted(BUDGET_MS))
+def test_cold_start_budget(tool, samples, tmp_path, request):
+    ms, _ = measure(tool, _tool_args(tool, samples, str(tmp_path)), runs=3)
+    assert ms <= BUDGET_MS[tool] * request.config.getoption('--cold-start-scale')
@@ -0,0 +1,207 @@
+import io
+import os
+import re
+
+import fitz  # PyMuPDF
+import numpy as np
+import pytest
+
+from benchmarks.samples import _photo, make_sample_pdf
+from core.compressor import PDFCompressor
+from core.image_cache import ImageCache
+
+@pytest.fixture
+def repeated_image():
+    """Three pages with the same photo, each page drawing its own byte-identical copy"""
+    buf = io.BytesIO()
+    _photo(600, 400).save(buf, 'JPEG', quality=90)
+    doc = fitz.open()
+    # Copies of an image on a scratch page, which is then dropped
+    xref = doc.new_page().insert_image(fitz.Rect(0, 0, 300, 200), stream=buf.getvalue())
+    for i in range(3):
+        copy = doc.get_new_xref()
+        doc.update_object(copy, '<<>>')
+        doc.xref_copy(xref, copy)
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(72, 72, 372, 272), xref=copy)
+        page.insert_text((72, 400), f"Page {i + 1}")
+    doc.delete_page(0)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+@pytest.fixture
+def shared_resources():
+    """Two pages drawing byte-identical images through one indirect /Resources dictionary"""
+    buf = io.BytesIO()
+    _photo(600, 400).save(buf, 'JPEG', quality=90)
+    doc = fitz.open()
+    xref = doc.new_page().insert_image(fitz.Rect(0, 0, 300, 200), stream=buf.getvalue())
+    copies = []
+    for _ in range(2):
+        copies.append(doc.get_new_xref())
+        doc.update_object(copies[-1], '<<>>')
+        doc.xref_copy(xref, copies[-1])
+    doc.delete_page(0)
+    resources = doc.get_new_xref()
+    doc.update_object(resources, f'<</XObject<</Im0 {copies[0]} 0 R/Im1 {copies[1]} 0 R>>>>')
+    for i in range(2):
+        page = doc.new_page()
+        contents = doc.get_new_xref()
+        doc.update_object(contents, '<<>>')
+        doc.update_stream(contents, f'q 300 0 0 200 72 400 cm /Im{i} Do Q'.encode())
+        doc.xref_set_key(page.xref, 'Resources', f'{resources} 0 R')
+        doc.xref_set_key(page.xref, 'Contents', f'{contents} 0 R')
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def test_compress_meets_target(sample_pdf):
+    with open(sample_pdf, 'rb') as f:
+        data = f.read()
+    result = PDFCompressor(workers=1).compress_data(data, 60)
+    assert result['success'], result.get('error')
+    assert result['compressed_size_kb'] <= 60
+    assert len(result['data']) / 1024 == pytest.approx(result['compressed_size_kb'])
+    assert result['backend'] == 'mupdf' and result['strategy'] == 'images'
+    with fitz.open(stream=result['data'], filetype='pdf') as doc:
+        assert len(doc) == 2
+        assert 'Sample page 2' in doc[1].get_text()
+
+def test_small_input_is_returned_as_is(text_pdf):
+    with open(text_pdf, 'rb') as f:
+        data = f.read()
+    result = PDFCompressor(workers=1).compress_data(data, 500)
+    assert result['tier'] == 'Original' and result['data'] == data
+
+def test_duplicate_images_are_indexed_once(repeated_image):
+    compressor = PDFCompressor(workers=1)
+    with fitz.open(stream=repeated_image, filetype='pdf') as doc:
+        xrefs = [page.get_images()[0][0] for page in doc]
+        compressor._index_images(doc)
+    first = min(xrefs)
+    assert compressor.duplicates == {xref: first for xref in xrefs if xref != first}
+    assert compressor.image_pages[first] == [0, 1, 2]
+    assert compressor._image_stats()['unique_images'] == 1
+
+def test_duplicates_behind_indirect_resources_still_draw(shared_resources):
+    # Straight to the image pass: compress_data's structural pass would merge the copies first
+    compressor = PDFCompressor(workers=1)
+    compressor.images = ImageCache()
+    out = compressor._process(shared_resources, 60, 72)
+    assert len(compressor.duplicates) == 1
+    with fitz.open(stream=out, filetype='pdf') as doc:
+        for page in doc:
+            assert len(page.get_images()) == 1
+            pix = page.get_pixmap(dpi=20, clip=fitz.Rect(72, 400, 372, 600))
+            assert len(set(pix.samples)) > 1  # Not a blank area
+
+def test_duplicate_images_share_one_xref(repeated_image):
+    result = PDFCompressor(workers=1).compress_data(repeated_image, 30)
+    assert result['success'], result.get('error')
+    assert result['unique_images'] == 1 and result['shared_image_refs'] == 2
+    with fitz.open(stream=result['data'], filetype='pdf') as doc:
+        assert len({page.get_images()[0][0] for page in doc}) == 1
+
+def test_raced_tiers_report_image_counts(repeated_image):
+    result = PDFCompressor(workers=2, concurrent_tiers=True).compress_data(repeated_image, 30)
+    assert result['success'], result.get('error')
+    assert result['compressed_size_kb'] <= 30
+    assert result['unique_images'] == 1 and result['shared_image_refs'] == 2
+
+def test_images_under_the_dpi_are_skipped():
+    doc = fitz.open()
+    page = doc.new_page()
+    xrefs = {}
+    for mode, x in (('1', 72), ('RGB', 300)):
+        buf = io.BytesIO()
+        _photo(200, 200).convert(mode).save(buf, 'PNG')
+        # 200 px over 200 pt: 72 dpi, under every tier's dpi
+        xrefs[mode] = page.insert_image(fitz.Rect(x, 72, x + 200, 272), stream=buf.getvalue())
+    data = doc.tobytes()
+    doc.close()
+
+    compressor = PDFCompressor(workers=1)
+    with fitz.open(stream=data, filetype='pdf') as doc:
+        compressor._index_images(doc)
+    skips = {mode: compressor._skips(xref, compressor._target_dim(xref, 120)) for mode, xref in xrefs.items()}
+    # 8-bit pixels in a lossless stream are the exception: the codec of their class can still shrink them
+    assert skips == {'1': True, 'RGB': False}
+
+def test_parallel_encodes_match_serial(tmp_path):
+    path = make_sample_pdf(str(tmp_path / 'photos.pdf'), pages=4, image_size=(1200, 800), text=False)
+    with open(path, 'rb') as f:
+        data = f.read()
+    serial = PDFCompressor(workers=1).compress_data(data, 80)
+    parallel = PDFCompressor(workers=4).compress_data(data, 80)
+    assert serial['success'] and parallel['success']
+    # MuPDF gives every save a fresh second /ID; everything else must match byte for byte
+    unique_id = re.compile(rb'/ID\[<[0-9A-F]+><[0-9A-F]+>\]')
+    assert unique_id.sub(b'', parallel['data']) == unique_id.sub(b'', serial['data'])
+    assert parallel['attempts'] == serial['attempts']
+
+@pytest.mark.parametrize('target', [50, 100, 200])
+def test_search_fits_the_target_in_a_few_saves(sample_pdf, target):
+    with open(sample_pdf, 'rb') as f:
+        data = f.read()
+    result = PDFCompressor(workers=1).compress_data(data, target)
+    assert result['success'], result.get('error')
+    assert result['compressed_size_kb'] <= target
+    # The structural pass, then MAX_SAVES passes and one last at Aggressive at most
+    assert len(result['attempts']) <= 1 + PDFCompressor.MAX_SAVES + 1
+
+def test_failed_search_still_reports_attempts(sample_pdf, monkeypatch):
+    with open(sample_pdf, 'rb') as f:
+        data = f.read()
+    monkeypatch.setattr(PDFCompressor, '_search', lambda self, data, target: None)
+    result = PDFCompressor(workers=1).compress_data(data, 40)
+    assert result['tier'] in ('Structural', 'Original')
+    assert len(result['attempts']) == 1 and result['attempts'][0]['quality'] is None
+
+def test_structural_pass_merges_duplicates_and_drops_unused_fonts():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Structural pass")
+    page.insert_font(fontname='F9', fontbuffer=fitz.Font('tiro').buffer)  # Embedded, never drawn
+    blob, copies = os.urandom(20000), []
+    for _ in range(3):
+        copies.append(doc.get_new_xref())
+        doc.update_object(copies[-1], '<<>>')
+        doc.update_stream(copies[-1], blob, compress=False)
+    doc.xref_set_key(doc.pdf_catalog(), 'Blobs', '[' + ' '.join(f'{xref} 0 R' for xref in copies) + ']')
+    data = doc.tobytes()
+    doc.close()
+
+    out, image_bytes = PDFCompressor(workers=1)._structural(data)
+    assert image_bytes == 0
+    assert len(out) < len(data) / 3
+    with fitz.open(stream=out, filetype='pdf') as doc:
+        assert [font[4] for font in doc[0].get_fonts()] == ['helv']
+        assert 'Structural pass' in doc[0].get_text()
+        kind, blobs = doc.xref_get_key(doc.pdf_catalog(), 'Blobs')
+        assert len(set(re.findall(r'(\d+) 0 R', blobs))) == 1
+
+def test_allocation_shares_out_the_byte_budget():
+    compressor = PDFCompressor(workers=1)
+    steps = PDFCompressor.ALLOC_STEPS
+    # Predicted bytes per image at each allocation step: a big photo, a medium one, an icon
+    falloff = [1 - 0.8 * i / steps for i in range(steps + 1)]
+    compressor.curves = np.array([[400000 * f for f in falloff], [100000 * f for f in falloff], [2000] * (steps + 1)])
+    compressor.curve_xrefs = [10, 11, 12]
+    allocated = lambda pressure: compressor.curves[np.arange(3), compressor._steps(pressure)]
+
+    assert list(compressor._steps(0.0)) == [0, 0, 0] and list(compressor._steps(1.0)) == [steps] * 3
+    # One with a quarter of the savings of the biggest is at 0.25 when that is at 0.5; the icon has none
+    assert list(compressor._steps(0.5)) == [steps // 2, round(steps / 4), 0]
+    assert compressor._headline(0.5) == 0.5
+
+    budget = 300000
+    lo, hi = 0.0, 1.0
+    for _ in range(30):
+        mid = (lo + hi) / 2
+        lo, hi = (mid, hi) if allocated(mid).sum() > budget else (lo, mid)
+    shares = allocated(hi)
+    # The per-image shares add up to the budget, short of it by less than one allocation step
+    assert budget - shares.sum() < 0.8 * 400000 / steps
+    assert shares.sum() <= budget
+    assert shares[2] == 2000
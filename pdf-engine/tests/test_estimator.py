@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks.samples import make_sample_pdf
+from core.estimator import SizeEstimator
+
+@pytest.fixture
+def photos_pdf(tmp_path):
+    return make_sample_pdf(str(tmp_path / 'photos.pdf'), pages=3, image_size=(1600, 1000))
+
+def test_levels_shrink_down_the_ladder(photos_pdf):
+    with open(photos_pdf, 'rb') as f:
+        result = SizeEstimator(budget_ms=2000).estimate(f.read())
+    assert result['success'], result.get('error')
+    sizes = [level['size_kb'] for level in result['levels']]
+    assert sizes == sorted(sizes, reverse=True)
+    assert result['min_size_kb'] <= result['structural_size_kb'] <= result['original_size_kb'] * 1.01
+    assert result['min_size_kb'] == pytest.approx(min(sizes))
+    assert result['images'] == 3 and result['sampled_images'] == 3
+
+def test_estimate_tracks_compress(run_engine, photos_pdf, tmp_path):
+    _, estimate = run_engine('estimate', '--inputs', photos_pdf)
+    assert estimate['status'] == 'success'
+    levels = {level['tier']: level['sizeKB'] for level in estimate['stats']['levels']}
+    _, result = run_engine('compress', '--inputs', photos_pdf, '--output', str(tmp_path / 'out.pdf'),
+                           '--target-size', str(round(levels['Medium'])))
+    assert result['status'] == 'success'
+    # The estimate's Medium size is reachable, give or take the model's error
+    assert result['stats']['compressedSize'] <= levels['Medium'] * 1.25
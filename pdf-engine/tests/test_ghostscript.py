@@ -0,0 +1,26 @@
+import pytest
+
+from core import ghostscript
+from core.compressor import PDFCompressor
+
+@pytest.fixture
+def no_gs(monkeypatch):
+    monkeypatch.setenv('PDF_ENGINE_GS', 'no-such-gs-binary')
+    assert ghostscript.find_binary() is None
+
+@pytest.mark.parametrize('requested', ['auto', 'mupdf', 'ghostscript', 'race'])
+def test_choose_without_gs_is_mupdf(no_gs, requested):
+    # Even for the documents 'auto' would give to gs
+    assert ghostscript.choose({'type3_fonts': True}, requested) == 'mupdf'
+
+def test_unknown_backend():
+    with pytest.raises(Exception, match='Unknown compress backend'):
+        ghostscript.choose(None, 'qpdf')
+
+def test_compress_falls_back_to_mupdf(no_gs, sample_pdf):
+    with open(sample_pdf, 'rb') as f:
+        data = f.read()
+    result = PDFCompressor(workers=1, backend='ghostscript').compress_data(data, 60)
+    assert result['success'], result.get('error')
+    assert result['backend'] == 'mupdf' and result['compressed_size_kb'] <= 60
+    assert all('backend' not in attempt for attempt in result['attempts'])
@@ -0,0 +1,101 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core import governor
+from core.governor import Governor, JobAborted
+
+def _reason(check, *args):
+    with pytest.raises(JobAborted) as aborted:
+        check(*args)
+    return aborted.value.reason
+
+def test_timeout():
+    limits = Governor(timeout=0.05)
+    limits.start()
+    try:
+        limits.check()
+        time.sleep(0.1)
+        assert _reason(limits.check) == 'timeout'
+        assert limits.remaining() == 0
+    finally:
+        limits.stop()
+
+def test_cancel_sticks():
+    limits = Governor()
+    limits.cancel()
+    assert _reason(limits.check) == 'cancelled'
+    assert _reason(limits.check) == 'cancelled'
+    assert limits.aborted_result('compress')['reason'] == 'cancelled'
+
+def test_page_and_pixel_limits():
+    limits = Governor(max_pages=10, max_megapixels=1)
+    limits.check_pages(10)
+    limits.check_pixels(1000, 1000)
+    assert _reason(limits.check_pages, 11) == 'pages'
+    assert _reason(limits.check_pixels, 1001, 1000) == 'pages'  # The first reason stays the job's reason
+
+def test_module_checks_without_a_job():
+    governor.check()
+    governor.check_pages(10 ** 9)
+    assert governor.remaining() is None
+
+def test_image_pass_lets_aborts_out(sample_pdf, monkeypatch):
+    from core.compressor import PDFCompressor
+    from core.image_cache import ImageCache
+    limits = Governor()
+    limits.cancel()
+    monkeypatch.setattr(governor, '_active', limits)
+    compressor = PDFCompressor(workers=1)
+    compressor.images = ImageCache()
+    with open(sample_pdf, 'rb') as f:
+        data = f.read()
+    with pytest.raises(JobAborted):
+        compressor._process(data, 60, 120)
+
+def test_compress_timeout_aborts(run_engine, sample_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    proc, result = run_engine('compress', '--inputs', sample_pdf, '--output', output,
+                              '--target-size', '60', '--timeout', '0.05', '--no-cache')
+    assert result['status'] == 'aborted', proc.stderr.decode()
+    assert result['reason'] == 'timeout'
+    assert not os.path.exists(output)
+
+def test_compress_page_limit_aborts(run_engine, sample_pdf, tmp_path):
+    proc, result = run_engine('compress', '--inputs', sample_pdf, '--output', str(tmp_path / 'out.pdf'),
+                              '--target-size', '60', '--max-pages', '1', '--no-cache')
+    assert result['status'] == 'aborted', proc.stderr.decode()
+    assert result['reason'] == 'pages'
+
+def test_default_time_limit_is_for_serve_jobs(monkeypatch):
+    monkeypatch.delenv('PDF_ENGINE_TIMEOUT', raising=False)
+    assert Governor.from_args(SimpleNamespace()).timeout is None
+    assert Governor.from_args(SimpleNamespace(serve=True)).timeout == governor.DEFAULT_TIMEOUT
+    assert Governor.from_args(SimpleNamespace(serve=True, timeout=5)).timeout == 5
+    monkeypatch.setenv('PDF_ENGINE_TIMEOUT', '30')
+    assert Governor.from_args(SimpleNamespace()).timeout == 30
+
+def test_cancel_before_the_job_starts():
+    governor.defer_cancel()
+    limits = governor.start(SimpleNamespace())
+    try:
+        assert _reason(limits.check) == 'cancelled'
+    finally:
+        governor.finish()
+    # Used up by that job; the next one runs
+    limits = governor.start(SimpleNamespace())
+    try:
+        limits.check()
+    finally:
+        governor.finish()
+
+def test_discarded_cancel():
+    governor.defer_cancel()
+    governor.discard_cancel()
+    limits = governor.start(SimpleNamespace())
+    try:
+        limits.check()
+    finally:
+        governor.finish()
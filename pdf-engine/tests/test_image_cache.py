@@ -0,0 +1,80 @@
+import io
+
+import fitz  # PyMuPDF
+import pytest
+
+from benchmarks.samples import _photo
+from core.image_cache import REDUCING_GAP, ImageCache, SourceImage
+
+def _jpeg(width, height):
+    buf = io.BytesIO()
+    _photo(width, height).save(buf, 'JPEG', quality=90)
+    return buf.getvalue()
+
+@pytest.mark.parametrize('max_d', [200, 400, 700, 1500, 3000])
+def test_draft_decode_keeps_enough_pixels(max_d):
+    raw = _jpeg(2400, 1600)
+    cache = ImageCache()
+    decoded = cache._decode(1, raw, max_d)
+    scale = cache.scale(cache.source(1), max_d)
+    assert decoded.size == (-(-2400 // scale), -(-1600 // scale))
+    # Never decoded under the size it will be fitted to, and oversampled by REDUCING_GAP where it shrinks
+    assert max(decoded.size) >= min(max_d * REDUCING_GAP, 2400)
+    assert max(cache._fitted(1, decoded, max_d).size) == min(max_d, 2400)
+
+def test_only_jpegs_are_drafted():
+    assert ImageCache.scale(SourceImage(0, 4000, 3000, jpeg=True), 100) == 8
+    assert ImageCache.scale(SourceImage(0, 4000, 3000, jpeg=True), 2000) == 1
+    assert ImageCache.scale(SourceImage(0, 4000, 3000), 100) == 1
+
+@pytest.fixture
+def photo_doc():
+    doc = fitz.open()
+    xref = doc.new_page().insert_image(fitz.Rect(0, 0, 300, 200), stream=_jpeg(600, 400))
+    yield doc, xref
+    doc.close()
+
+def test_cached_images_are_reported_done(photo_doc):
+    doc, xref = photo_doc
+    cache = ImageCache()
+    done = []
+    cache.prepare(doc, [(xref, 300, 60)], on_done=done.append)
+    # Nothing left to encode the second time, but the image still counts
+    cache.prepare(doc, [(xref, 300, 60)], on_done=done.append)
+    assert done == [1, 1]
+
+def _counting(monkeypatch, name):
+    calls = []
+    method = getattr(ImageCache, name)
+    monkeypatch.setattr(ImageCache, name, lambda self, *args: calls.append(args[0]) or method(self, *args))
+    return calls
+
+def test_each_image_is_decoded_once(photo_doc, monkeypatch):
+    doc, xref = photo_doc
+    decodes = _counting(monkeypatch, '_decode')
+    cache = ImageCache()
+    # One key per image and call, as each compress pass asks; 300 and 250 px share a decode scale
+    keys = [(xref, 300, 60), (xref, 300, 40), (xref, 250, 60)]
+    for key in keys:
+        cache.prepare(doc, [key])
+    assert decodes == [xref]
+    encoded = [cache.cached(*key) for key in keys]
+    assert all(e is not None for e in encoded)
+    assert encoded[0].size > encoded[1].size and max(encoded[2].width, encoded[2].height) == 250
+
+    cache.prepare(doc, keys[:1])
+    assert decodes == [xref] and cache.cached(*keys[0]) is encoded[0]
+
+def test_evicted_pixels_give_the_same_bytes(photo_doc, monkeypatch):
+    doc, xref = photo_doc
+    decodes = _counting(monkeypatch, '_decode')
+    keys = [(xref, 300, 60), (xref, 250, 60), (xref, 300, 40), (xref, 250, 40)]
+    roomy, tight = ImageCache(), ImageCache(max_mb=0.1)
+    for key in keys:
+        roomy.prepare(doc, [key])
+    assert len(decodes) == 1
+    for key in keys:
+        tight.prepare(doc, [key])
+    assert len(decodes) > 2  # Too small to hold a decode: evicted, then decoded again
+    for key in keys:
+        assert tight.cached(*key).data == roomy.cached(*key).data
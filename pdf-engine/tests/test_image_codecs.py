@@ -0,0 +1,62 @@
+import fitz  # PyMuPDF
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from benchmarks.samples import _photo
+from core.image_codecs import BILEVEL, BILEVEL_DARK, BILEVEL_LIGHT, BILEVEL_SHARE, COLOR, GRAY, PALETTE, classify, encode
+
+@pytest.fixture
+def text_scan():
+    """A page of antialiased text rendered at 150 dpi"""
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "Lorem ipsum dolor sit amet. " * 150, fontsize=9)
+        pix = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+        return Image.frombytes('L', (pix.width, pix.height), pix.samples)
+
+@pytest.fixture
+def high_contrast_photo():
+    """Smooth tones pushed through a steep curve: nearly all pixels black or white, no edges"""
+    y, x = np.mgrid[0:800, 0:1200].astype(float)
+    luma = 255 / (1 + np.exp(-127 * np.sin(x / 150) * np.cos(y / 120) / 2))
+    return Image.fromarray(luma.astype('uint8'), 'L')
+
+@pytest.fixture
+def flat_art():
+    img = Image.new('RGB', (400, 300), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((40, 40, 200, 160), fill=(200, 30, 30))
+    draw.ellipse((220, 80, 360, 240), fill=(20, 60, 180))
+    return img
+
+def test_text_is_bilevel(text_scan):
+    assert classify(text_scan) == (BILEVEL, 'L')
+
+def test_high_contrast_photo_is_gray(high_contrast_photo):
+    luma = np.asarray(high_contrast_photo)
+    # Past the share of extremes alone; the midtones between them keep it gray
+    assert np.mean((luma <= BILEVEL_DARK) | (luma >= BILEVEL_LIGHT)) >= BILEVEL_SHARE
+    assert classify(high_contrast_photo) == (GRAY, 'L')
+
+def test_photos():
+    photo = _photo(600, 400)
+    assert classify(photo) == (COLOR, 'RGB')
+    assert classify(photo.convert('L')) == (GRAY, 'L')
+    assert classify(photo.convert('L').convert('RGB')) == (GRAY, 'L')
+
+def test_flat_art_is_palette(flat_art):
+    assert classify(flat_art) == (PALETTE, 'RGB')
+
+def test_encode(text_scan, flat_art):
+    bilevel = encode(text_scan, BILEVEL, 60)
+    assert bilevel.bpc == 1 and bilevel.lossless
+    assert bilevel.filter in ('/CCITTFaxDecode', '/FlateDecode')
+    assert bilevel.size < len(encode(text_scan, GRAY, 60).data)
+
+    palette = encode(flat_art, PALETTE, 60, flat_art.getcolors(256))
+    assert palette.bpc == 2 and palette.colorspace.startswith('[/Indexed /DeviceRGB 2 ')
+
+    jpeg = encode(_photo(600, 400), COLOR, 60)
+    assert jpeg.filter == '/DCTDecode' and jpeg.colorspace == '/DeviceRGB' and not jpeg.lossless
+    assert (jpeg.width, jpeg.height) == (600, 400)
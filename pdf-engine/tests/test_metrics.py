@@ -0,0 +1,53 @@
+import re
+
+from core.metrics import MetricsStore, add_record, quantile, render_prometheus, summarize
+
+def _record(tool, ms, status='success', tier=None, ts=1000.0):
+    return {'ts': ts, 'tool': tool, 'status': status, 'durationMs': ms, 'inputBytes': 2048,
+            'pages': 2, 'tier': tier, 'cacheHit': False}
+
+def test_quantile():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert quantile(values, 0.5) == 5 and quantile(values, 0.95) == 10 and quantile([], 0.5) == 0.0
+
+def test_rotation_keeps_the_counters(tmp_path):
+    store = MetricsStore(metrics_dir=str(tmp_path), max_mb=0.0005)  # About 500 bytes a generation
+    for i in range(20):
+        store.append(_record('compress', 100 + i, tier='Strong'))
+    assert 0 < len(store.read()) < 20
+    totals = store.totals()['compress']
+    assert totals['count'] == 20 and totals['tiers'] == {'Strong': 20}
+    assert totals['sumSeconds'] == sum(100 + i for i in range(20)) / 1000
+
+def test_summarize_and_render():
+    records = [_record('compress', ms, tier='Strong') for ms in (100, 200, 300, 400)]
+    records.append(_record('split', 50, status='error'))
+    summary = summarize(records, window_seconds=60)
+    assert summary['jobs'] == 5 and summary['windowSeconds'] == 60
+    assert summary['tools']['compress']['quantiles'] == {'0.5': 0.2, '0.95': 0.4, '0.99': 0.4}
+    assert summary['tools']['split']['statuses'] == {'error': 1}
+
+    totals = {}
+    for record in records:
+        add_record(totals.setdefault(record['tool'], {}), record)
+    text = render_prometheus(summary, totals)
+    assert text.endswith('\n')
+    sample = re.compile(r'^[a-z_]+(\{[a-z]+="[^"]*"(,[a-z]+="[^"]*")*\})? -?[0-9.e+-]+$')
+    for line in text.splitlines():
+        assert line.startswith('# HELP ') or line.startswith('# TYPE ') or sample.match(line), line
+    assert 'pdf_engine_job_duration_seconds{tool="compress",quantile="0.95"} 0.4' in text
+    assert 'pdf_engine_job_duration_seconds_count{tool="compress"} 4' in text
+    assert 'pdf_engine_jobs_total{tool="split",status="error"} 1' in text
+    assert 'pdf_engine_compress_tier_total{tool="compress",tier="Strong"} 4' in text
+
+def test_stats_tool(run_engine, text_pdf, tmp_path):
+    env = {'PDF_ENGINE_METRICS': '1', 'PDF_ENGINE_METRICS_DIR': str(tmp_path)}
+    for _ in range(2):
+        run_engine('split', '--inputs', text_pdf, '--output', str(tmp_path / 'out.pdf'), env=env)
+    proc, result = run_engine('stats', '--params', '{"format": "json"}', env=env)
+    assert result['status'] == 'success', proc.stderr.decode()
+    assert result['stats']['jobs'] == 2 and result['stats']['totals']['split']['count'] == 2
+
+    # Prometheus text by default, for scrapers
+    proc, _ = run_engine('stats', env=env)
+    assert 'pdf_engine_jobs_total{tool="split",status="success"} 2' in proc.stdout.decode()
@@ -0,0 +1,42 @@
+import json
+
+import fitz  # PyMuPDF
+import pytest
+
+from tools.pipeline.pipeline import PDFPipeline
+
+def _pipeline(run_engine, inputs, output, steps):
+    return run_engine('pipeline', '--inputs', *inputs, '--output', output, '--params', json.dumps({'steps': steps}))
+
+def test_merge_split_number_compress(run_engine, sample_pdf, text_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    proc, result = _pipeline(run_engine, [sample_pdf, text_pdf], output, [
+        {'op': 'merge'}, {'op': 'split', 'range': '1-4'}, {'op': 'pageNumbers'},
+        {'op': 'compress', 'target_size_kb': 60}])
+    assert result['status'] == 'success', proc.stderr.decode()
+    assert [s['op'] for s in result['stats']['steps']] == ['merge', 'split', 'pageNumbers', 'compress']
+    assert result['stats']['steps'][0]['pages'] == 5
+    with fitz.open(output) as doc:
+        assert len(doc) == 4
+        assert 'Page 4 of 4' in doc[3].get_text()
+
+def test_protect_last(run_engine, text_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    proc, result = _pipeline(run_engine, [text_pdf], output, [
+        {'op': 'pageNumbers', 'style': 'number'}, {'op': 'protect', 'user_password': 'secret'}])
+    assert result['status'] == 'success', proc.stderr.decode()
+    with fitz.open(output) as doc:
+        assert doc.needs_pass
+        assert doc.authenticate('secret')
+        assert len(doc) == 3
+
+@pytest.mark.parametrize('inputs, steps, message', [
+    (1, [], 'at least one step'),
+    (1, [{'op': 'rotate'}], 'Unknown pipeline step'),
+    (1, [{'op': 'split'}, {'op': 'merge'}], 'must be the first'),
+    (1, [{'op': 'protect'}, {'op': 'compress'}], 'must be the last'),
+    (2, [{'op': 'compress'}], 'must start with merge'),
+])
+def test_invalid_steps(inputs, steps, message):
+    with pytest.raises(Exception, match=message):
+        PDFPipeline().validate(['in.pdf'] * inputs, steps)
@@ -0,0 +1,42 @@
+import os
+
+from core import profiler
+
+STAGE_KEYS = {'name', 'calls', 'wallMs', 'cpuMs', 'peakRssMB', 'bytesWritten'}
+
+def test_stages_add_up():
+    profiler.start()
+    try:
+        for _ in range(3):
+            with profiler.stage('outer'):
+                with profiler.stage('inner') as rec:
+                    rec.add_bytes(10)
+    finally:
+        report = profiler.finish()
+    stages = {s['name']: s for s in report['stages']}
+    assert list(stages) == ['outer', 'inner']
+    assert stages['outer']['calls'] == stages['inner']['calls'] == 3
+    assert stages['inner']['bytesWritten'] == 30 and stages['outer']['bytesWritten'] == 0
+    assert stages['outer']['wallMs'] >= stages['inner']['wallMs']
+    assert profiler.finish() is None
+
+def test_stage_without_a_profile():
+    with profiler.stage('anything') as rec:
+        rec.add_bytes(10)
+
+def test_compress_profile(run_engine, sample_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    proc, result = run_engine('compress', '--inputs', sample_pdf, '--output', output, '--target-size', '60',
+                              '--no-cache', '--profile')
+    assert result['status'] == 'success', proc.stderr.decode()
+    profile = result['profile']
+    assert set(profile) == {'wallMs', 'cpuMs', 'peakRssMB', 'stages'}
+    assert profile['wallMs'] > 0 and profile['peakRssMB'] > 0
+    stages = {s['name']: s for s in profile['stages']}
+    assert all(set(s) == STAGE_KEYS for s in stages.values())
+    assert {'read', 'compress.structure', 'image.decode', 'image.encode', 'write'} <= set(stages)
+    assert stages['write']['bytesWritten'] == os.path.getsize(output)
+    assert sum(s['wallMs'] for s in stages.values() if '.' not in s['name']) <= profile['wallMs']
+
+    _, plain = run_engine('compress', '--inputs', sample_pdf, '--output', output, '--target-size', '60', '--no-cache')
+    assert 'profile' not in plain
@@ -0,0 +1,59 @@
+import os
+import json
+
+import pytest
+
+from core.progress import ProgressReporter, parse_target
+
+def _events(text):
+    return [json.loads(line) for line in text.splitlines() if line.startswith('{"event"')]
+
+def test_compress_event_stream(run_engine, sample_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    proc, result = run_engine('compress', '--inputs', sample_pdf, '--output', output, '--target-size', '60',
+                              '--no-cache', '--progress')
+    assert result['status'] == 'success', proc.stderr.decode()
+    events = _events(proc.stderr.decode())
+    assert events[0] == {'event': 'start', 'tool': 'compress', 'input': os.path.basename(sample_pdf)}
+    assert events[-1]['event'] == 'end' and events[-1]['status'] == 'success'
+    assert events[-1]['bytesWritten'] == os.path.getsize(output)
+
+    progress = [e for e in events if e['event'] == 'progress']
+    assert {'structure', 'images', 'save'} <= {e['phase'] for e in progress}
+    elapsed = [e['elapsedMs'] for e in progress]
+    assert elapsed == sorted(elapsed)
+    for e in progress:
+        assert e['total'] is None or 0 <= e['done'] <= e['total']
+        assert 'tier' not in e or 1 <= e['tierIndex'] <= e['tierCount']
+    # The last step of every phase is always reported
+    images = [e for e in progress if e['phase'] == 'images']
+    assert images[-1]['done'] == images[-1]['total']
+
+def test_progress_to_a_fd(run_engine, text_pdf, tmp_path):
+    read_fd, write_fd = os.pipe()
+    try:
+        proc, result = run_engine('split', '--inputs', text_pdf, '--output', str(tmp_path / 'out.pdf'),
+                                  '--progress', f'fd:{write_fd}', pass_fds=(write_fd,))
+    finally:
+        os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        events = _events(f.read())
+    assert result['status'] == 'success', proc.stderr.decode()
+    assert [events[0]['event'], events[-1]['event']] == ['start', 'end']
+    assert not _events(proc.stderr.decode())
+
+def test_steps_are_throttled():
+    read_fd, write_fd = os.pipe()
+    reporter = ProgressReporter(write_fd, 'test')
+    reporter.phase('render', total=1000)
+    for done in range(1, 1001):
+        reporter.step(done)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        events = _events(f.read())
+    assert len(events) < 50
+    assert events[-1]['done'] == 1000 and events[-1]['etaSeconds'] == 0.0
+
+def test_invalid_target():
+    with pytest.raises(Exception, match='Invalid progress target'):
+        parse_target('stdout')
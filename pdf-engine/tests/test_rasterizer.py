@@ -0,0 +1,33 @@
+import io
+
+import fitz  # PyMuPDF
+
+from benchmarks.samples import _photo
+from core.rasterizer import PageRasterizer, hide_text
+
+def test_hide_text():
+    assert hide_text(b'BT 0 Tr (a) Tj ET') == b'3 Tr\nBT 3 Tr (a) Tj ET'
+    assert hide_text(b'BT 2 Tr ET', first=False) == b'BT 3 Tr ET'
+    # Tr inside strings, comments and inline image data is not an operator
+    stream = b'BT (1 Tr) Tj ET % 1 Tr\nBI /W 1 /H 1 ID 1 Tr EI Q'
+    assert hide_text(stream, first=False) == stream
+
+def test_rasterized_text_is_invisible(tmp_path):
+    buf = io.BytesIO()
+    _photo(600, 800).save(buf, 'JPEG', quality=90)
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=buf.getvalue())
+        page.insert_text((72, 72), "Scanned words", fontsize=14, render_mode=0)
+        data = doc.tobytes()
+
+    rasterizer = PageRasterizer(data)
+    try:
+        out = rasterizer.render(60, 72)
+    finally:
+        rasterizer.close()
+    with fitz.open(stream=out, filetype='pdf') as doc:
+        page = doc[0]
+        assert 'Scanned words' in page.get_text()
+        assert {span['type'] for span in page.get_texttrace()} == {3}
+        assert len(page.get_images()) == 1
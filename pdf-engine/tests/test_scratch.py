@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from core.compressor import PDFCompressor
+from core.governor import JobAborted
+from core.scratch import Scratch
+
+def _job_dirs(scratch_dir):
+    return [name for name in os.listdir(scratch_dir) if name.startswith('job_')] if os.path.isdir(scratch_dir) else []
+
+def test_spills_past_the_memory_limit(tmp_path):
+    with Scratch(memory_mb=0.001, scratch_dir=str(tmp_path)) as scratch:
+        small = scratch.put(b'x' * 100)
+        big = scratch.put(b'y' * 5000)
+        assert scratch.spilled == 1 and len(_job_dirs(tmp_path)) == 1
+        assert scratch.get(small) == b'x' * 100 and scratch.get(big) == b'y' * 5000
+        scratch.drop(big)
+        assert os.listdir(scratch.job_dir) == []
+    assert _job_dirs(tmp_path) == []
+
+def test_quota(tmp_path):
+    with Scratch(memory_mb=0.001, quota_mb=0.01, scratch_dir=str(tmp_path)) as scratch:
+        scratch.put(b'x' * 5000)
+        with pytest.raises(Exception, match='quota'):
+            scratch.put(b'x' * 10000)
+
+def test_aborted_compress_leaves_no_scratch(sample_pdf, tmp_path, monkeypatch):
+    scratch_dir = str(tmp_path / 'scratch')
+    monkeypatch.setenv('PDF_ENGINE_SCRATCH_DIR', scratch_dir)
+    monkeypatch.setenv('PDF_ENGINE_SCRATCH_MEM_MB', '0.001')
+    spilled = []
+    keep = PDFCompressor._keep
+
+    def keep_then_abort(self, *args):
+        # The first pass goes to disk, then the job is cancelled
+        keep(self, *args)
+        spilled.append(len(_job_dirs(scratch_dir)))
+        raise JobAborted('cancelled', 'Job was cancelled')
+
+    monkeypatch.setattr(PDFCompressor, '_keep', keep_then_abort)
+    with open(sample_pdf, 'rb') as f:
+        data = f.read()
+    result = PDFCompressor(workers=1).compress_data(data, 60)
+    assert not result['success'] and spilled == [1]
+    assert _job_dirs(scratch_dir) == []
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import subprocess
+
+import pytest
+
+from conftest import ENGINE_DIR
+
+def _serve(lines, *argv, pause=None):
+    """Results of `main.py serve` for request lines; pause=(index, seconds) waits before sending line index"""
+    proc = subprocess.Popen([sys.executable, os.path.join(ENGINE_DIR, 'main.py'), 'serve', *argv],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=ENGINE_DIR)
+    try:
+        for i, line in enumerate(lines):
+            if pause and pause[0] == i:
+                time.sleep(pause[1])
+            proc.stdin.write((json.dumps(line) + '\n').encode())
+            proc.stdin.flush()
+        out, _ = proc.communicate(timeout=120)
+    finally:
+        proc.kill()
+    return [json.loads(line) for line in out.decode().splitlines()]
+
+def _compress(job_id, sample_pdf, tmp_path):
+    return {'id': job_id, 'tool': 'compress', 'inputs': [sample_pdf], 'output': str(tmp_path / f'{job_id}.pdf'),
+            'params': {'target_size_kb': 60}, 'cache': False}
+
+@pytest.mark.parametrize('delay', [0, 0.3])
+def test_cancel_a_job(sample_pdf, tmp_path, delay):
+    # At once (the job is still queued or in the pipe) and once it runs
+    results = _serve([_compress('a', sample_pdf, tmp_path), {'cancel': 'a'}, {'id': 'b', 'tool': 'test'}],
+                     pause=(1, delay))
+    assert results[0] == {'status': 'success', 'cancelled': True, 'id': 'a'}
+    assert results[1]['id'] == 'a' and results[1]['status'] == 'aborted' and results[1]['reason'] == 'cancelled'
+    assert results[2] == {'status': 'ok', 'message': 'Engine is ready', 'id': 'b'}
+
+def test_cancel_unknown_job():
+    results = _serve([{'cancel': 'nope'}])
+    assert results[0]['status'] == 'error' and results[0]['id'] == 'nope'
+
+def _pid(job):
+    return {'status': 'ok', 'pid': os.getpid()}
+
+def _crash(job):
+    os._exit(3)
+
+def test_worker_is_recycled_after_max_jobs():
+    from core.server import EngineServer
+    server = EngineServer(_pid, max_jobs=2, max_rss_mb=0)
+    try:
+        pids = [server.submit({'id': i})['pid'] for i in range(5)]
+    finally:
+        server.close()
+    assert server.recycled == 2
+    assert pids[0] == pids[1] != pids[2] == pids[3] != pids[4]
+    assert os.getpid() not in pids
+
+def test_crashed_worker_is_replaced():
+    from core.server import EngineServer
+    server = EngineServer(_crash, max_jobs=10, max_rss_mb=0)
+    try:
+        result = server.submit({'id': 'a'})
+        assert result['status'] == 'error' and 'exit code 3' in result['message']
+        server.job_runner = _pid
+        assert server.submit({'id': 'b'})['status'] == 'ok'
+    finally:
+        server.close()
+
+def test_serve_replies_in_order(sample_pdf, tmp_path):
+    results = _serve([{'id': 1, 'tool': 'test'}, 'not json', _compress('c', sample_pdf, tmp_path)], '--max-jobs', '1')
+    assert results[0] == {'status': 'ok', 'message': 'Engine is ready', 'id': 1}
+    assert results[1]['status'] == 'error'
+    assert results[2]['status'] == 'success' and results[2]['id'] == 'c'
+    assert os.path.getsize(tmp_path / 'c.pdf') <= 60 * 1024
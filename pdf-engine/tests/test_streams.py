@@ -0,0 +1,69 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from core import streams
+
+@pytest.fixture(autouse=True)
+def fresh_inputs(monkeypatch):
+    # Stream inputs are read once per process; each test reads its own
+    monkeypatch.setattr(streams, '_inputs', {})
+
+def test_is_stream():
+    assert streams.is_stream('-') and streams.is_stream('fd:3')
+    assert not streams.is_stream('in.pdf') and not streams.is_stream(None)
+
+def test_fd_round_trip():
+    read_fd, write_fd = os.pipe()
+    try:
+        assert streams.write_output(f'fd:{write_fd}', b'%PDF-1.7 bytes') == 14
+        os.close(write_fd)
+        write_fd = None
+        assert streams.read_bytes(f'fd:{read_fd}') == b'%PDF-1.7 bytes'
+        assert streams.input_size(f'fd:{read_fd}') == 14  # Read once, then reused
+    finally:
+        os.close(read_fd)
+        if write_fd is not None:
+            os.close(write_fd)
+
+def test_invalid_stream():
+    with pytest.raises(Exception, match='Invalid stream'):
+        streams.read_bytes('fd:stdin')
+
+def test_file_output_is_atomic(tmp_path):
+    path = str(tmp_path / 'out.pdf')
+    with pytest.raises(RuntimeError):
+        with streams.atomic(path) as partial:
+            with open(partial, 'wb') as f:
+                f.write(b'half')
+            raise RuntimeError
+    assert os.listdir(tmp_path) == []
+    streams.write_output(path, b'whole')
+    assert os.listdir(tmp_path) == ['out.pdf']
+
+def test_check_streams():
+    with pytest.raises(Exception, match='only be read once'):
+        streams.check_streams(SimpleNamespace(inputs=['-', '-'], output='out.pdf'))
+    with pytest.raises(Exception, match='directory'):
+        streams.check_streams(SimpleNamespace(tool='split', inputs=['in.pdf'], output='-'), allow_output=False)
+    streams.check_streams(SimpleNamespace(inputs=['-', 'fd:3'], output='-'))
+
+def test_compress_stdin_to_stdout(run_engine, sample_pdf):
+    with open(sample_pdf, 'rb') as f:
+        data = f.read()
+    proc, result = run_engine('compress', '--inputs', '-', '--output', '-', '--target-size', '60', stdin=data)
+    assert result['status'] == 'success', proc.stderr.decode()
+    assert proc.stdout.startswith(b'%PDF')
+    assert len(proc.stdout) < len(data)
+
+def test_compress_fd_input(run_engine, sample_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    fd = os.open(sample_pdf, os.O_RDONLY)
+    try:
+        proc, result = run_engine('compress', '--inputs', f'fd:{fd}', '--output', output,
+                                  '--target-size', '60', pass_fds=(fd,))
+    finally:
+        os.close(fd)
+    assert result['status'] == 'success', proc.stderr.decode()
+    assert os.path.getsize(output) < os.path.getsize(sample_pdf)
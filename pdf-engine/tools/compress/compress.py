@@ -7,6 +7,20 @@ from PIL import Image
 import io
 
 class PDFCompressor:
+    LADDER = (
+        # High Quality Tiers (try these first)
+        {"quality": 95, "dpi": 300},
+        {"quality": 90, "dpi": 200},
+
+        # Medium Tiers
+        {"quality": 80, "dpi": 150},
+        {"quality": 75, "dpi": 144},
+
+        # Aggressive Tiers (only if needed)
+        {"quality": 60, "dpi": 120},
+        {"quality": 50, "dpi": 96},
+    )
+
     def __init__(self):
         self.temp_files = []
 
@@ -175,19 +189,7 @@ class PDFCompressor:
             # We pick the FIRST one that is <= target_kb.
             # This ensures we maximize quality while meeting the size constraint.
             
-            attempts = []
-            
-            # High Quality Tiers (try these first)
-            attempts.append({"quality": 95, "dpi": 300})
-            attempts.append({"quality": 90, "dpi": 200})
-            
-            # Medium Tiers
-            attempts.append({"quality": 80, "dpi": 150})
-            attempts.append({"quality": 75, "dpi": 144})
-            
-            # Aggressive Tiers (only if needed)
-            attempts.append({"quality": 60, "dpi": 120})
-            attempts.append({"quality": 50, "dpi": 96})
+            attempts = self.LADDER
 
             # Check if we need extreme reduction (>80%), if so, maybe skip the very high quality ones to save time?
             # actually, let's keep them but maybe skip 300dpi if original size is massive?
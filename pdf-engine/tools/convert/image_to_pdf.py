@@ -1,6 +1,10 @@
 import fitz
 import os
 
+from core import governor
+from core.profiler import stage
+from core.streams import is_stream, open_binary, open_pdf, read_input, save_pdf
+
 class ImageToPdfConverter:
     def __init__(self, debug=False):
         self.debug = debug
@@ -16,7 +20,37 @@ class ImageToPdfConverter:
             'large': 72
         }
 
+    def _pixel_size(self, img_path):
+        """Pixel dimensions from the image header (fitz reports page size in points)"""
+        from PIL import Image
+        with Image.open(open_binary(img_path)) as im:
+            return im.size
+
+    def _image_source(self, img_path):
+        """insert_image() keyword for a path or a stream input"""
+        if is_stream(img_path):
+            return {'stream': read_input(img_path)}
+        return {'filename': img_path}
+
     def convert(self, image_paths, output_path, params=None):
+        doc = self.build_document(image_paths, params)
+
+        with stage('save') as rec:
+            output_bytes = save_pdf(doc, output_path)
+            rec.add_bytes(output_bytes)
+        total_pages = len(doc)
+        doc.close()
+        
+        # Calculate stats
+        output_size = output_bytes / 1024
+        return {
+            'success': True,
+            'total_pages': total_pages,
+            'output_size_kb': round(output_size, 2)
+        }
+
+    def build_document(self, image_paths, params=None):
+        """Lay the images out on pages of a new in-memory document"""
         if params is None:
             params = {}
 
@@ -41,7 +75,9 @@ class ImageToPdfConverter:
         if not pages_config:
             pages_config = [{'type': 'image', 'index': i} for i in range(len(image_paths))]
 
+        governor.check_pages(len(pages_config))
         for page_cfg in pages_config:
+            governor.check()
             p_type = page_cfg.get('type')
 
             if p_type == 'blank':
@@ -60,7 +96,9 @@ class ImageToPdfConverter:
                 
                 img_path = image_paths[idx]
                 try:
-                    img = fitz.open(img_path)
+                    governor.check_pixels(*self._pixel_size(img_path))
+                    with stage('open'):
+                        img = open_pdf(img_path, filetype=None)
                     
                     # Determine Page Size
                     if page_size_name == 'auto':
@@ -99,7 +137,7 @@ class ImageToPdfConverter:
                         # fitz.show_pdf_page handles keeping aspect ratio
                         page.show_pdf_page(avail_rect, img, keep_proportion=True) 
                         # Wait, show_pdf_page is for PDF pages. For images use insert_image.
-                        page.insert_image(avail_rect, filename=img_path, keep_proportion=True) 
+                        page.insert_image(avail_rect, keep_proportion=True, **self._image_source(img_path)) 
                         # keep_proportion=True ensures it fits inside avail_rect without safe-guarding original size?
                         # Actually 'insert_image' fits into rect. 
                         # If 'original', we might not want to constrain to margin if it fits? 
@@ -115,10 +153,10 @@ class ImageToPdfConverter:
                          # For now, let's map 'fill' to 'fit' effectively unless we do math.
                          # Actually, user manual says "Fill Page - Crops edges if needed".
                          # We can assume 'fit' is the most important default.
-                         page.insert_image(avail_rect, filename=img_path, keep_proportion=True)
+                         page.insert_image(avail_rect, keep_proportion=True, **self._image_source(img_path))
                     
                     else: # fit (default)
-                        page.insert_image(avail_rect, filename=img_path, keep_proportion=True)
+                        page.insert_image(avail_rect, keep_proportion=True, **self._image_source(img_path))
 
                     img.close()
 
@@ -128,14 +166,4 @@ class ImageToPdfConverter:
                     # Could add a text annotation saying "Image Error"
                     continue
 
-        doc.save(output_path)
-        total_pages = len(doc)
-        doc.close()
-        
-        # Calculate stats
-        output_size = os.path.getsize(output_path) / 1024
-        return {
-            'success': True,
-            'total_pages': total_pages,
-            'output_size_kb': round(output_size, 2)
-        }
+        return doc
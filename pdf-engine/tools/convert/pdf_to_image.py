@@ -5,6 +5,24 @@ import argparse
 import fitz # PyMuPDF
 import json
 
+try:
+    from core import governor, progress
+    from core.profiler import stage
+    from core.streams import open_pdf
+except ImportError:  # run as a standalone script
+    from contextlib import contextmanager
+    from types import SimpleNamespace
+
+    @contextmanager
+    def stage(name, output_path=None):
+        yield None
+
+    progress = SimpleNamespace(phase=lambda *a, **k: None, step=lambda *a, **k: None,
+                               written=lambda *a, **k: None)
+    governor = SimpleNamespace(check=lambda: None, check_pages=lambda n: None,
+                               check_pixels=lambda w, h: None)
+    open_pdf = fitz.open
+
 def parse_page_range(range_str, total_pages):
     """
     Parses a page range string (e.g., "1-3,5,8-") into a list of 0-based indices.
@@ -50,7 +68,8 @@ def convert_pdf_to_images(input_path, output_dir, fmt='jpg', dpi=150, color_mode
     Converts PDF pages to images.
     """
     try:
-        doc = fitz.open(input_path)
+        with stage('open'):
+            doc = open_pdf(input_path)
     except Exception as e:
         return {'success': False, 'error': f"Could not open PDF: {str(e)}"}
 
@@ -80,11 +99,16 @@ def convert_pdf_to_images(input_path, output_dir, fmt='jpg', dpi=150, color_mode
     try:
         base_name = os.path.splitext(os.path.basename(input_path))[0]
         
-        for page_num in pages_to_convert:
+        governor.check_pages(len(pages_to_convert))
+        progress.phase('render', total=len(pages_to_convert))
+        for done, page_num in enumerate(pages_to_convert, 1):
+            governor.check()
             page = doc.load_page(page_num)
+            governor.check_pixels(page.rect.width * zoom, page.rect.height * zoom)
             
             # Render page
-            pix = page.get_pixmap(matrix=mat, colorspace=colorspace, alpha=alpha)
+            with stage('render'):
+                pix = page.get_pixmap(matrix=mat, colorspace=colorspace, alpha=alpha)
             
             # Handle B&W thresholding if needed, but 'gray' is usually sufficient for simple request.
             # Sticking to standard rendering.
@@ -97,8 +121,11 @@ def convert_pdf_to_images(input_path, output_dir, fmt='jpg', dpi=150, color_mode
             out_filename = f"{base_name}_page-{page_num + 1}_pdfbaba.{fmt}"
             out_path = os.path.join(output_dir, out_filename)
             
-            pix.save(out_path)
+            with stage('image.encode', out_path):
+                pix.save(out_path)
             generated_files.append(out_path)
+            progress.written(out_path)
+            progress.step(done)
             
         doc.close()
         
@@ -1,9 +1,36 @@
 
+import io
 import sys
 import os
+import re
 import json
+import logging
 from pdf2docx import Converter
 
+try:
+    from core import governor, progress
+    from core.streams import is_stream, read_input, write_output
+except ImportError:  # run as a standalone script
+    governor = progress = None
+    is_stream = lambda path: False
+
+class _Pdf2DocxProgress(logging.Handler):
+    """
+    pdf2docx has no progress callback, but it logs '[3/4] Parsing pages...'
+    for each phase and '(i/n) Page p' for each page; turn those into events.
+    """
+    PHASE = re.compile(r'\[(\d)/4\] (\w+)')
+
+    def emit(self, record):
+        if record.msg == '(%d/%d) Page %d' and record.args:
+            # Raising here propagates out of pdf2docx's page loop, so this is also the cancel point
+            governor.check()
+            progress.step(record.args[0], record.args[1])
+            return
+        match = self.PHASE.search(str(record.msg))
+        if match:
+            progress.phase(match.group(2).lower())
+
 def convert_pdf_to_word(input_path, output_path, pages=None):
     """
     Convert PDF to Word using pdf2docx.
@@ -12,7 +39,9 @@ def convert_pdf_to_word(input_path, output_path, pages=None):
     pages: Optional list of page indices (0-based) or 'all'
     """
     try:
-        cv = Converter(input_path)
+        cv = Converter(stream=read_input(input_path)) if is_stream(input_path) else Converter(input_path)
+        if governor is not None:
+            governor.check_pages(len(cv.fitz_doc))
         
         # Handle page selection
         # pdf2docx allows passing a list of page numbers to `pages` arg
@@ -38,8 +67,21 @@ def convert_pdf_to_word(input_path, output_path, pages=None):
 
         # Convert
         # If target_pages is None, it converts all.
-        cv.convert(output_path, pages=target_pages)
+        handler = None
+        if progress is not None:
+            handler = _Pdf2DocxProgress(logging.INFO)
+            logging.getLogger().addHandler(handler)
+        try:
+            target = io.BytesIO() if is_stream(output_path) else output_path
+            cv.convert(target, pages=target_pages)
+        finally:
+            if handler is not None:
+                logging.getLogger().removeHandler(handler)
         cv.close()
+        if target is not output_path:
+            write_output(output_path, target.getvalue())
+        if progress is not None:
+            progress.written(output_path, nbytes=target.tell() if target is not output_path else 0)
         
         return {
             "success": True,
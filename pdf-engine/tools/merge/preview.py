@@ -1,7 +1,19 @@
 import fitz  # PyMuPDF
-import io
 import base64
-from PIL import Image
+
+try:
+    from core import governor
+    from core.profiler import stage
+    from core.streams import open_pdf
+except ImportError:  # run as a standalone script
+    from contextlib import contextmanager
+
+    @contextmanager
+    def stage(name, output_path=None):
+        yield None
+
+    governor = None
+    open_pdf = fitz.open
 
 class PDFPreviewGenerator:
     def __init__(self):
@@ -13,7 +25,8 @@ class PDFPreviewGenerator:
         Returns a base64 encoded PNG string.
         """
         try:
-            doc = fitz.open(pdf_path)
+            with stage('open'):
+                doc = open_pdf(pdf_path)
             if page_num >= len(doc):
                 page_num = 0
                 
@@ -23,17 +36,15 @@ class PDFPreviewGenerator:
             # Standard PDF page is approx 595 points wide (A4)
             zoom = width / page.rect.width
             matrix = fitz.Matrix(zoom, zoom)
+            if governor is not None:
+                governor.check_pixels(width, page.rect.height * zoom)
             
-            pix = page.get_pixmap(matrix=matrix, alpha=False)
-            
-            # Convert to PIL Image for high-quality saving
-            img_data = pix.tobytes("ppm")
-            img = Image.open(io.BytesIO(img_data))
+            with stage('render'):
+                pix = page.get_pixmap(matrix=matrix, alpha=False)
             
-            # Convert to base64
-            buffered = io.BytesIO()
-            img.save(buffered, format="PNG", optimize=True)
-            img_str = base64.b64encode(buffered.getvalue()).decode()
+            # Encode PNG straight from the pixmap (no PIL round-trip, keeps preview imports light)
+            with stage('image.encode'):
+                img_str = base64.b64encode(pix.tobytes("png")).decode()
             
             doc.close()
             return {'success': True, 'image': f"data:image/png;base64,{img_str}"}
@@ -1,5 +1,5 @@
 import os
-from PyPDF2 import PdfReader
+from pypdf import PdfReader
 import fitz
 
 def validate_pdf_files(file_paths):
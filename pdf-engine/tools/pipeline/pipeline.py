@@ -0,0 +1,215 @@
+import io
+import time
+import fitz  # PyMuPDF
+
+from core import progress
+from core.profiler import stage
+from core.streams import open_pdf, save_pdf, write_output
+
+class PDFPipeline:
+    """
+    Chains imageToPdf / merge / split / pageNumbers / compress / protect in one process.
+    The working document is handed from step to step as an open fitz.Document
+    (or as PDF bytes after compress) and only the final result is written.
+
+    steps: [{"op": "merge", "toc": true}, {"op": "compress", "target_size_kb": 500}, ...]
+    Step options are the same keys the standalone tool takes in --params.
+    """
+
+    OPS = ('imageToPdf', 'merge', 'split', 'pageNumbers', 'compress', 'protect')
+    # Steps that build the document from all the inputs
+    SOURCE_OPS = ('imageToPdf', 'merge')
+
+    def __init__(self, debug=False):
+        self.debug = debug
+        self.doc = None    # Current document as an open fitz.Document ...
+        self.data = None   # ... or as PDF bytes (whichever the last step produced)
+
+    # --- working document ---
+
+    def _as_doc(self):
+        if self.doc is None:
+            self.doc = fitz.open(stream=self.data, filetype='pdf')
+            self.data = None
+        return self.doc
+
+    def _as_bytes(self):
+        if self.data is None:
+            self.data = self.doc.tobytes(garbage=4, deflate=True)
+            self.doc.close()
+            self.doc = None
+        return self.data
+
+    def _set_doc(self, doc):
+        if self.doc is not None and self.doc is not doc:
+            self.doc.close()
+        self.doc, self.data = doc, None
+
+    def _set_bytes(self, data):
+        if self.doc is not None:
+            self.doc.close()
+        self.doc, self.data = None, data
+
+    # --- validation ---
+
+    def validate(self, input_paths, steps):
+        if not steps:
+            raise Exception("Pipeline needs at least one step")
+        for i, step in enumerate(steps):
+            op = step.get('op') if isinstance(step, dict) else None
+            if op not in self.OPS:
+                raise Exception(f"Unknown pipeline step {op!r} (use {', '.join(self.OPS)})")
+            if op in self.SOURCE_OPS and i != 0:
+                raise Exception(f"{op} must be the first pipeline step")
+            if op == 'protect' and i != len(steps) - 1:
+                raise Exception("protect must be the last pipeline step")
+        if len(input_paths) > 1 and steps[0]['op'] not in self.SOURCE_OPS:
+            raise Exception("A pipeline with several inputs must start with merge or imageToPdf")
+
+    # --- run ---
+
+    def run(self, input_paths, output_path, steps, resolve=None):
+        """
+        resolve(op, options) -> options with the tool's defaults applied
+        (run_pipeline passes the registry's params schema). Returns per-step stats.
+        """
+        try:
+            self.validate(input_paths, steps)
+            if steps[0]['op'] not in self.SOURCE_OPS:
+                with stage('open'):
+                    self.doc = open_pdf(input_paths[0])
+
+            step_stats = []
+            for step in steps:
+                op = step['op']
+                options = {k: v for k, v in step.items() if k != 'op'}
+                if resolve:
+                    options = resolve(op, options)
+                start = time.perf_counter()
+                progress.phase(f"pipeline.{op}")
+                with stage(f"pipeline.{op}"):
+                    info = getattr(self, f"_step_{op}")(input_paths, output_path, options)
+                info = dict(info or {}, op=op, durationMs=round((time.perf_counter() - start) * 1000, 1))
+                step_stats.append(info)
+
+            if steps[-1]['op'] != 'protect':
+                output_bytes = self._write(output_path)
+            else:
+                output_bytes = step_stats[-1].pop('bytes')
+
+            output_size = output_bytes / 1024
+            return {
+                'success': True,
+                'steps': step_stats,
+                'total_pages': step_stats[-1].get('pages'),
+                'output_size_kb': round(output_size, 2)
+            }
+
+        except Exception as e:
+            if self.debug:
+                print(f"Pipeline Error: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            if self.doc is not None:
+                self.doc.close()
+            self.doc = self.data = None
+
+    def _write(self, output_path):
+        progress.phase('save')
+        with stage('save') as rec:
+            if self.data is not None:
+                output_bytes = write_output(output_path, self.data)
+            else:
+                output_bytes = save_pdf(self.doc, output_path, garbage=4, deflate=True)
+            rec.add_bytes(output_bytes)
+        progress.written(nbytes=output_bytes)
+        return output_bytes
+
+    # --- steps ---
+
+    def _step_imageToPdf(self, input_paths, output_path, options):
+        from tools.convert.image_to_pdf import ImageToPdfConverter
+
+        converter = ImageToPdfConverter(debug=self.debug)
+        doc = converter.build_document(input_paths, options)
+        self._set_doc(doc)
+        return {'images': len(input_paths), 'pages': len(doc)}
+
+    def _step_merge(self, input_paths, output_path, options):
+        from tools.merge.merger import AdvancedPDFMerger
+
+        merger = AdvancedPDFMerger(debug=self.debug)
+        doc, pages = merger.merge_documents(input_paths, options.get('order'), options)
+        self._set_doc(doc)
+        return {'files': len(input_paths), 'pages': pages}
+
+    def _step_split(self, input_paths, output_path, options):
+        from tools.split.splitter import PDFSplitter
+
+        splitter = PDFSplitter(debug=self.debug)
+        out_doc = splitter.split_document(self._as_doc(), options.get('range', '1-end'), options)
+        self._set_doc(out_doc)
+        return {'pages': len(out_doc)}
+
+    def _step_pageNumbers(self, input_paths, output_path, options):
+        # "Page 1 of 9" like merge, or the bare "1" split uses
+        doc = self._as_doc()
+        if options.get('style') == 'number':
+            from tools.split.splitter import PDFSplitter
+            PDFSplitter(debug=self.debug)._add_page_numbers(doc)
+        else:
+            from tools.merge.merger import AdvancedPDFMerger
+            AdvancedPDFMerger(debug=self.debug)._add_page_numbers(doc)
+        return {'pages': len(doc)}
+
+    def _step_compress(self, input_paths, output_path, options):
+        from core.compressor import PDFCompressor
+
+        pages = len(self._as_doc())
+        data = self._as_bytes()
+        compressor = PDFCompressor(debug=self.debug, workers=options.get('image_workers'),
+                                   concurrent_tiers=options.get('concurrent_tiers', False),
+                                   backend=options.get('backend', 'auto'),
+                                   strategy=options.get('strategy', 'auto'),
+                                   raster_dpi=options.get('raster_dpi'),
+                                   color_mode=options.get('color_mode', 'auto'))
+        result = compressor.compress_data(
+            data, options.get('target_size_kb'), options.get('quality', 'medium'))
+        if not result['success']:
+            raise Exception(result.get('error', 'Compression failed'))
+        self._set_bytes(result['data'])
+        return {
+            'pages': pages,
+            'originalSizeKB': round(len(data) / 1024, 2),
+            'compressedSizeKB': round(result['compressed_size_kb'], 2),
+            'tier': result.get('tier'),
+            'backend': result.get('backend'),
+            'strategy': result.get('strategy'),
+            'quality': result.get('quality'),
+            'dpi': result.get('dpi'),
+            'attempts': len(result.get('attempts') or []),
+            'duplicateImages': result.get('duplicate_images')
+        }
+
+    def _step_protect(self, input_paths, output_path, options):
+        from tools.security.protector import PDFProtector
+
+        if not options.get('user_password'):
+            raise Exception("User password is required")
+        pages = len(self._as_doc())
+        data = self._as_bytes()
+        out = io.BytesIO()
+        result = PDFProtector(debug=self.debug).protect(
+            input_path=io.BytesIO(data),
+            output_path=out,
+            user_password=options['user_password'],
+            owner_password=options.get('owner_password'),
+            permissions=options.get('permissions'),
+            encryption_level=options.get('encryption', 'AES-256')
+        )
+        if not result['success']:
+            raise Exception(result.get('error', 'Protection failed'))
+        output_bytes = write_output(output_path, out.getvalue())
+        progress.written(nbytes=output_bytes)
+        # 'bytes' is the final output size; run() takes it out of the step stats
+        return {'pages': pages, 'bytes': output_bytes}
@@ -1,8 +1,12 @@
 
+import io
 import os
 from pypdf import PdfReader, PdfWriter
 from pypdf.constants import UserAccessPermissions
 
+from core.profiler import stage
+from core.streams import is_stream, open_binary, write_output
+
 class PDFProtector:
     def __init__(self, debug=False):
         self.debug = debug
@@ -13,15 +17,16 @@ class PDFProtector:
         Protects a PDF with password and permissions.
         
         Args:
-            input_path (str): Path to input PDF
-            output_path (str): Path to output PDF
+            input_path (str): Path to input PDF (or a binary stream)
+            output_path (str): Path to output PDF (or a writable binary stream)
             user_password (str): Password to open the PDF
             owner_password (str): Password to change permissions (defaults to user_password if None)
             permissions (dict): Dictionary of permissions flags
             encryption_level (str): "AES-256", "AES-128", "RC4-128"
         """
         try:
-            reader = PdfReader(input_path)
+            with stage('open'):
+                reader = PdfReader(open_binary(input_path))
             writer = PdfWriter()
 
             # Copy all pages
@@ -39,8 +44,9 @@ class PDFProtector:
             
             # Simplified mapping from user specs to pypdf permissions
             # Using valid pypdf permission flags logic
+            # (pypdf names the bits after the spec: EXTRACT is copy, ADD_OR_MODIFY is annotate)
             
-            perms_flag = UserAccessPermissions.PRINT | UserAccessPermissions.MODIFY | UserAccessPermissions.COPY | UserAccessPermissions.ANNOTATE | UserAccessPermissions.FILL_FORMS | UserAccessPermissions.EXTRACT | UserAccessPermissions.ASSEMBLE | UserAccessPermissions.PRINT_TO_REPRESENTATION
+            perms_flag = UserAccessPermissions.PRINT | UserAccessPermissions.MODIFY | UserAccessPermissions.EXTRACT | UserAccessPermissions.ADD_OR_MODIFY | UserAccessPermissions.FILL_FORM_FIELDS | UserAccessPermissions.EXTRACT_TEXT_AND_GRAPHICS | UserAccessPermissions.ASSEMBLE_DOC | UserAccessPermissions.PRINT_TO_REPRESENTATION
             
             # If user passed explicit permissions, we might need to restrict them
             # However, pypdf's expected `permissions_flag` argument is a bitmask of ALLOWED actions.
@@ -61,27 +67,27 @@ class PDFProtector:
                 mod_perm = permissions.get('modifying', 'all') # none, minimal, all
                 if mod_perm == 'all':
                     perms_flag |= UserAccessPermissions.MODIFY
-                    perms_flag |= UserAccessPermissions.ASSEMBLE
-                    perms_flag |= UserAccessPermissions.ANNOTATE
-                    perms_flag |= UserAccessPermissions.FILL_FORMS
+                    perms_flag |= UserAccessPermissions.ASSEMBLE_DOC
+                    perms_flag |= UserAccessPermissions.ADD_OR_MODIFY
+                    perms_flag |= UserAccessPermissions.FILL_FORM_FIELDS
                 elif mod_perm == 'minimal':
                     # "Insert, delete, rotate pages" -> ASSEMBLE
                     # "fill forms" -> FILL_FORMS
-                    perms_flag |= UserAccessPermissions.ASSEMBLE
-                    perms_flag |= UserAccessPermissions.FILL_FORMS
-                    perms_flag |= UserAccessPermissions.ANNOTATE # often grouped
+                    perms_flag |= UserAccessPermissions.ASSEMBLE_DOC
+                    perms_flag |= UserAccessPermissions.FILL_FORM_FIELDS
+                    perms_flag |= UserAccessPermissions.ADD_OR_MODIFY # often grouped
                 
                 # Copying
                 copy_perm = permissions.get('copying', True)
                 if copy_perm:
-                     perms_flag |= UserAccessPermissions.COPY
                      perms_flag |= UserAccessPermissions.EXTRACT
+                     perms_flag |= UserAccessPermissions.EXTRACT_TEXT_AND_GRAPHICS
                 
                 # Annotating (if separate)
                 annot_perm = permissions.get('annotating', True)
                 if annot_perm:
-                    perms_flag |= UserAccessPermissions.ANNOTATE
-                    perms_flag |= UserAccessPermissions.FILL_FORMS
+                    perms_flag |= UserAccessPermissions.ADD_OR_MODIFY
+                    perms_flag |= UserAccessPermissions.FILL_FORM_FIELDS
 
             # --- Encryption Algorithm ---
             algo = encryption_level
@@ -100,8 +106,18 @@ class PDFProtector:
             )
 
             # Write output
-            with open(output_path, "wb") as f:
-                writer.write(f)
+            if hasattr(output_path, 'write'):
+                with stage('save'):
+                    writer.write(output_path)
+            elif is_stream(output_path):
+                with stage('save'):
+                    buf = io.BytesIO()
+                    writer.write(buf)
+                    write_output(output_path, buf.getvalue())
+            else:
+                with stage('save', output_path):
+                    with open(output_path, "wb") as f:
+                        writer.write(f)
 
             return {
                 "success": True,
@@ -2,6 +2,10 @@ import os
 import fitz  # PyMuPDF
 from typing import List, Dict
 
+from core import governor, progress
+from core.profiler import stage
+from core.streams import open_pdf, save_pdf
+
 class PDFSplitter:
     def __init__(self, debug=False):
         self.debug = debug
@@ -74,38 +78,24 @@ class PDFSplitter:
 
     def split_by_range(self, input_path: str, output_path: str, range_str: str, properties: dict = None) -> dict:
         try:
-            if properties is None:
-                properties = {}
-                
-            doc = fitz.open(input_path)
-            total_pages = len(doc)
-            
-            selected_pages = self.parse_range(range_str, total_pages)
-            
-            if not selected_pages:
-                return {'success': False, 'error': 'No valid pages selected'}
-            
-            # Create new document
-            out_doc = fitz.open()
-            
-            # Copy ONLY selected pages
-            # insert_pdf(src, from_page=start, to_page=end) matches 0-based indices inclusive
-            for page_idx in selected_pages:
-                 out_doc.insert_pdf(doc, from_page=page_idx, to_page=page_idx)
-            
-            # Add page numbers if requested
-            if properties.get('pageNumbers', False):
-                self._add_page_numbers(out_doc)
-                
-            out_doc.save(output_path, garbage=4, deflate=True)
+            with stage('open'):
+                doc = open_pdf(input_path)
+            out_doc = self.split_document(doc, range_str, properties)
+            selected_count = len(out_doc)
+
+            progress.phase('save')
+            with stage('save') as rec:
+                output_bytes = save_pdf(out_doc, output_path, garbage=4, deflate=True)
+                rec.add_bytes(output_bytes)
+            progress.written(nbytes=output_bytes)
             out_doc.close()
             doc.close()
             
-            output_size = os.path.getsize(output_path) / 1024
+            output_size = output_bytes / 1024
             
             return {
                 'success': True,
-                'total_pages': len(selected_pages),
+                'total_pages': selected_count,
                 'output_size_kb': round(output_size, 2)
             }
             
@@ -113,3 +103,33 @@ class PDFSplitter:
             if self.debug:
                 print(f"Split Error: {e}")
             return {'success': False, 'error': str(e)}
+
+    def split_document(self, doc, range_str: str, properties: dict = None):
+        """Copy the selected pages of an open document into a new in-memory one"""
+        if properties is None:
+            properties = {}
+
+        total_pages = len(doc)
+        selected_pages = self.parse_range(range_str, total_pages)
+        
+        if not selected_pages:
+            raise Exception('No valid pages selected')
+        
+        # Create new document
+        out_doc = fitz.open()
+        
+        # Copy ONLY selected pages
+        # insert_pdf(src, from_page=start, to_page=end) matches 0-based indices inclusive
+        governor.check_pages(len(selected_pages))
+        progress.phase('copy', total=len(selected_pages))
+        with stage('insert_pdf'):
+            for done, page_idx in enumerate(selected_pages, 1):
+                 governor.check()
+                 out_doc.insert_pdf(doc, from_page=page_idx, to_page=page_idx)
+                 progress.step(done)
+        
+        # Add page numbers if requested
+        if properties.get('pageNumbers', False):
+            self._add_page_numbers(out_doc)
+
+        return out_doc